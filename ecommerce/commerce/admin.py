@@ -1,18 +1,86 @@
 from django.contrib import admin
 
 from django.contrib.auth.models import Permission
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import CharField, Q, TextField
 from django.template.response import TemplateResponse
 from django.utils.html import mark_safe
 from .models import *
 from django import forms
 from ckeditor_uploader.widgets import CKEditorUploadingWidget
 from django.urls import path
-from django.db.models.functions import TruncMonth, TruncQuarter, TruncYear, ExtractMonth, ExtractQuarter, ExtractYear
-from django.db.models import Count, Sum, Q, F
+from django.http import HttpResponseRedirect
+from django.utils.text import smart_split, unescape_string_literal
+from .category_tree import CYCLE_MESSAGE, creates_cycle
+from .dashboard import latest_stats_snapshot, refresh_stats_snapshot
+from .exports import ORDER_COLUMNS, ORDER_DETAIL_COLUMNS, export_response
+from .paginators import ApproximateCountPaginator
+
+
+class LargeTableAdminMixin:
+    """
+    Changelist cho bảng lớn: không COUNT(*) cả bảng (ApproximateCountPaginator), tự select_related các cột
+    ForeignKey/OneToOne trong list_display và tìm kiếm theo tiền tố trên cột có index thay vì icontains JOIN
+    nhiều bảng. search_fields dùng cú pháp của Django: '=field' so khớp chính xác, còn lại (kể cả '^field')
+    đều là tiền tố; đường dẫn chỉ nên đi qua ForeignKey/OneToOne.
+    """
+    paginator = ApproximateCountPaginator
+    # "(N total)" cạnh kết quả lọc là thêm một COUNT(*) trên cả bảng
+    show_full_result_count = False
+
+    def get_list_select_related(self, request):
+        # Chỉ JOIN các cột được hiển thị (select_related() không tham số bỏ qua FK null=True như category)
+        if self.list_select_related is not False:
+            return super().get_list_select_related(request)
+        related = []
+        for name in self.get_list_display(request):
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.many_to_one or field.one_to_one:
+                related.append(name)
+        return related
+
+    def get_search_results(self, request, queryset, search_term):
+        search_fields = self.get_search_fields(request)
+        if not search_fields or not search_term:
+            return queryset, False
+        # Như Django: mỗi từ phải khớp ít nhất một trường
+        for bit in smart_split(search_term):
+            if bit.startswith(('"', "'")) and bit[0] == bit[-1]:
+                bit = unescape_string_literal(bit)
+            conditions = [self.search_condition(self.model, field.lstrip('^=@').split('__'), field.startswith('='), bit)
+                          for field in search_fields]
+            conditions = [condition for condition in conditions if condition is not None]
+            if not conditions:
+                return queryset.none(), False
+            queryset = queryset.filter(Q(*conditions, _connector=Q.OR))
+        return queryset, False
+
+    def search_condition(self, model, parts, exact, term):
+        field = model._meta.get_field(parts[0])
+        if len(parts) > 1:
+            condition = self.search_condition(field.related_model, parts[1:], exact, term)
+            if condition is None:
+                return None
+            # IN (subquery) thay vì JOIN: subquery dùng index của cột được tìm trên bảng liên quan
+            return Q(**{f'{parts[0]}__in': field.related_model._default_manager.filter(condition).values('pk')})
+        if not exact:
+            return Q(**{f'{parts[0]}__istartswith': term})
+        try:
+            value = field.to_python(term)
+        except ValidationError:
+            # '=id' với từ không phải số: trường này không thể khớp
+            return None
+        lookup = 'iexact' if isinstance(field, (CharField, TextField)) else 'exact'
+        return Q(**{f'{parts[0]}__{lookup}': value})
 
 
-class UserAdmin(admin.ModelAdmin):
+class UserAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ["id", "username", "is_active", "role", "get_store"]
+    # get_store đọc quan hệ ngược one-to-one, phải khai báo vì không phải cột của User
+    list_select_related = ["store"]
 
     def is_active(self, obj):
         return obj.is_active
@@ -24,8 +92,10 @@ class UserAdmin(admin.ModelAdmin):
     role.short_description = 'Role'
 
     def get_store(self, obj):
-        if obj.store:
-            return obj.store.store_name
+        # User chưa có cửa hàng: truy cập obj.store raise RelatedObjectDoesNotExist (một AttributeError)
+        store = getattr(obj, 'store', None)
+        if store:
+            return store.store_name
         else:
             return None
     get_store.short_description = 'Store'
@@ -33,8 +103,21 @@ class UserAdmin(admin.ModelAdmin):
 
 
 
+class CategoryForm(forms.ModelForm):
+    class Meta:
+        model = Category
+        fields = '__all__'
+
+    def clean_parent(self):
+        parent = self.cleaned_data['parent']
+        if creates_cycle(self.instance, parent):
+            raise ValidationError(CYCLE_MESSAGE)
+        return parent
+
+
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ["id", "name", "parent"]
+    form = CategoryForm
     search_fields = ["parent__name", "name"]
     readonly_fields = ['category_image']
 
@@ -43,9 +126,10 @@ class CategoryAdmin(admin.ModelAdmin):
             return mark_safe('<img src="{url}" width="450" height="120" />'.format(url=category.image.url))
 
 
-class StoreAdmin(admin.ModelAdmin):
+class StoreAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ["id", "store_name", "user", "active"]
-    search_fields = ["store_name", "user__username"]
+    search_fields = ["^store_name", "^user__username"]
+    raw_id_fields = ["user"]
     readonly_fields = ['store_wallpaper', 'get_average_rating']
 
     def get_average_rating(self, obj):
@@ -86,9 +170,10 @@ class ProductForm(forms.ModelForm):
         model = Product
         fields = '__all__'
 
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ["id", "product_name", "category", "store", "price", "stock"]
-    search_fields = ["product_name", "category__name", "store__store_name"]
+    search_fields = ["^product_name", "^category__name", "^store__store_name", "=id"]
+    raw_id_fields = ["store"]
     inlines = [ProductImageInline, ProductVariantInline]
     form = ProductForm
     readonly_fields = ['get_average_rating']
@@ -108,117 +193,81 @@ class CommerceAppAdminSite(admin.AdminSite):
 
     def get_urls(self):
         return [
-            path('commerce-stats/', self.commerce_stats)
+            path('commerce-stats/', self.admin_view(self.commerce_stats), name='commerce-stats')
         ] + super().get_urls()
 
     def commerce_stats(self, request):
-        total_stores = Store.objects.count()
-        active_stores = Store.objects.filter(active=True).count()
-        total_customers = User.objects.filter(role=User.CUSTOMER_ROLE).count()
-        total_sellers = User.objects.filter(role=User.SELLER_ROLE).count()
-        unconfirmed_sellers = User.objects.filter(role=User.SELLER_ROLE, is_active=False).count()
-
-        monthly_total_sales = Order.objects.filter(order_status='completed').annotate(
-            month=ExtractMonth('order_date')
-        ).values('month').annotate(total_sales=Sum('total_amount')).order_by('month')
-
-        monthly_store_sales = OrderDetail.objects.filter(order__order_status='completed').annotate(
-            month=ExtractMonth('order__order_date'),
-            store_name=F('product__store__store_name')
-        ).values('month', 'store_name').annotate(total_sales=Sum('price')).order_by('month')
-
-        monthly_paid_orders = Order.objects.filter(order_status='completed').annotate(
-            month=ExtractMonth('order_date'),
-            store_name=F('store__store_name')
-        ).values('month', 'store_name').annotate(total_paid_orders=Count('id')).order_by('month')
-
-        most_paid_orders_store = monthly_paid_orders.order_by('-total_paid_orders').first()
-
-        lowest_sales_store = monthly_store_sales.order_by('total_sales').first()
-
-        quarterly_total_sales = Order.objects.filter(order_status='completed').annotate(
-            quarter=ExtractQuarter('order_date')
-        ).values('quarter').annotate(total_sales=Sum('total_amount')).order_by('quarter')
-
-        quarterly_store_sales = OrderDetail.objects.filter(order__order_status='completed').annotate(
-            quarter=ExtractQuarter('order__order_date'),
-            store_name=F('product__store__store_name')
-        ).values('quarter', 'store_name').annotate(total_sales=Sum('price')).order_by('quarter')
-
-        quarterly_paid_orders = Order.objects.filter(order_status='completed').annotate(
-            quarter=ExtractQuarter('order_date'),
-            store_name=F('store__store_name')
-        ).values('quarter', 'store_name').annotate(total_paid_orders=Count('id')).order_by('quarter')
-
-        most_paid_orders_store_quarter = quarterly_paid_orders.order_by('-total_paid_orders').first()
-
-        lowest_sales_store_quarter = quarterly_store_sales.order_by('total_sales').first()
-
-        yearly_total_sales = Order.objects.filter(order_status='completed').annotate(
-            year=ExtractYear('order_date')
-        ).values('year').annotate(total_sales=Sum('total_amount')).order_by('year')
-
-        yearly_store_sales = OrderDetail.objects.filter(order__order_status='completed').annotate(
-            year=ExtractYear('order__order_date'),
-            store_name=F('product__store__store_name')
-        ).values('year', 'store_name').annotate(total_sales=Sum('price')).order_by('year')
-
-        yearly_paid_orders = Order.objects.filter(order_status='completed').annotate(
-            year=ExtractYear('order_date'),
-            store_name=F('store__store_name')
-        ).values('year', 'store_name').annotate(total_paid_orders=Count('id')).order_by('year')
-
-        most_paid_orders_store_year = yearly_paid_orders.order_by('-total_paid_orders').first()
-
-        lowest_sales_store_year = yearly_store_sales.order_by('total_sales').first()
-
-        context = {
-            'total_stores': total_stores,
-            'active_stores': active_stores,
-            'total_customers': total_customers,
-            'total_sellers': total_sellers,
-            'unconfirmed_sellers': unconfirmed_sellers,
-            'monthly_total_sales': monthly_total_sales,
-            'monthly_store_sales': monthly_store_sales,
-            'monthly_paid_orders': monthly_paid_orders,
-            'most_paid_orders_store': most_paid_orders_store,
-            'lowest_sales_store': lowest_sales_store,
-            'quarterly_total_sales': quarterly_total_sales,
-            'quarterly_store_sales': quarterly_store_sales,
-            'quarterly_paid_orders': quarterly_paid_orders,
-            'most_paid_orders_store_quarter': most_paid_orders_store_quarter,
-            'lowest_sales_store_quarter': lowest_sales_store_quarter,
-            'yearly_total_sales': yearly_total_sales,
-            'yearly_store_sales': yearly_store_sales,
-            'yearly_paid_orders': yearly_paid_orders,
-            'most_paid_orders_store_year': most_paid_orders_store_year,
-            'lowest_sales_store_year': lowest_sales_store_year,
-        }
+        # Đọc snapshot đã tính sẵn (lệnh build_commerce_stats), POST refresh=1 để tính lại ngay
+        if request.method == 'POST' and request.POST.get('refresh'):
+            refresh_stats_snapshot()
+            return HttpResponseRedirect(request.path)
+
+        snapshot = latest_stats_snapshot()
+        context = dict(self.each_context(request), **snapshot.data)
+        context['snapshot_created_at'] = snapshot.created_at
 
         return TemplateResponse(request, 'admin/admin-commerce-stats.html', context)
 
 
 
-class OrderDetailAdmin(admin.ModelAdmin):
+class ExportActionsMixin:
+    # Xuất các dòng đã chọn (hoặc "chọn tất cả" theo bộ lọc hiện tại) thành file nén stream, xem exports.py
+    actions = ['export_csv', 'export_ndjson']
+    export_columns = None
+
+    def export(self, request, queryset, format):
+        return export_response(request, queryset, self.export_columns, format,
+                               self.model._meta.model_name, compress=True)
+
+    @admin.action(description='Export selected as CSV (gzip)')
+    def export_csv(self, request, queryset):
+        return self.export(request, queryset, 'csv')
+
+    @admin.action(description='Export selected as NDJSON (gzip)')
+    def export_ndjson(self, request, queryset):
+        return self.export(request, queryset, 'ndjson')
+
+
+class OrderDetailAdmin(ExportActionsMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['id', 'order', 'store', 'product', 'quantity', 'price']
-    search_fields = ['order__user__username', 'product__product_name']
+    search_fields = ['^order__user__username', '^product__product_name', '=order']
     readonly_fields = ['order', 'store', 'product', 'quantity', 'price']
+    date_hierarchy = 'order__order_date'
+    export_columns = ORDER_DETAIL_COLUMNS
+
+class PaymentMethodFilter(admin.SimpleListFilter):
+    # Payment.payment_method không khai báo choices: bộ lọc mặc định chạy SELECT DISTINCT trên cả bảng mỗi lần mở trang
+    title = 'payment method'
+    parameter_name = 'payment_method'
+
+    def lookups(self, request, model_admin):
+        return Order.PAYMENT_METHOD_CHOICES
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(payment_method=self.value())
+        return queryset
+
 
-class PaymentAdmin(admin.ModelAdmin):
+class PaymentAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['id', 'order', 'payment_method', 'amount', 'payment_date']
-    list_filter = ['payment_method']
-    search_fields = ['order__user__username', 'payment_method']
+    list_filter = [PaymentMethodFilter]
+    search_fields = ['^order__user__username', '=order']
+    raw_id_fields = ['order']
     date_hierarchy = 'payment_date'
 
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(ExportActionsMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ['id', 'user', 'store', 'order_date', 'total_amount', 'payment_method', 'order_status']
     list_filter = ['order_status', 'payment_method']
-    search_fields = ['user__username', 'order_status']
+    search_fields = ['^user__username', '^store__store_name', '=id']
+    raw_id_fields = ['user', 'store']
     date_hierarchy = 'order_date'
+    export_columns = ORDER_COLUMNS
 
-class ReviewAdmin(admin.ModelAdmin):
+class ReviewAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ["id", "user", "product", "store", "rating", "comment", "created_at", "active"]
-    search_fields = ["user__username", "product__product_name", "store__store_name"]
+    search_fields = ["^user__username", "^product__product_name", "^store__store_name"]
+    raw_id_fields = ["user", "product", "store"]
     list_filter = ["active"]
 
 
@@ -0,0 +1,208 @@
+from django.db.models import aprefetch_related_objects
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions
+from rest_framework.filters import OrderingFilter
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from .caching import AsyncCatalogCacheMixin
+from .models import Category, Product, Store
+from .paginators import AsyncPageNumberPagination, KeysetPagination
+from .search import ProductSearchFilter
+from .serializers import CategorySerializer, ProductExpandedSerializer, ProductSerializer, ReviewFeedSerializer, \
+    StoreSerializer
+from .views import category_products, filter_min_rating, include_descendants, review_feed
+
+# Bản async (Django async ORM) của các endpoint đọc nhiều nhất, cùng định dạng response với view trong views.py.
+# Dưới ASGI, view đồng bộ giữ một thread suốt request; view async chỉ chiếm thread khi đang chạy truy vấn.
+
+
+class AsyncReadView(AsyncCatalogCacheMixin, View):
+    queryset = None
+    serializer_class = None
+    filter_backends = ()
+    pagination_class = None
+    not_found_data = None
+
+    async def get(self, request, *args, **kwargs):
+        self.request = Request(request)
+        self.kwargs = kwargs
+        try:
+            return await self.cached_response(self.get_data, self.request)
+        except (Http404, exceptions.NotFound) as error:
+            detail = str(getattr(error, 'detail', error)) or 'Not found.'
+            return self.render(self.not_found_data or {'detail': detail}, status=404)
+
+    async def get_queryset(self):
+        # Như GenericAPIView: mặc định dùng thuộc tính queryset, view lọc theo request/kwargs thì override
+        assert self.queryset is not None, (
+            f"'{self.__class__.__name__}' should either include a `queryset` attribute, "
+            f"or override the `get_queryset()` method."
+        )
+        return self.queryset.all()
+
+    def filter_queryset(self, queryset):
+        for backend in self.filter_backends:
+            queryset = backend().filter_queryset(self.request, queryset, self)
+        return queryset
+
+    def get_serializer_class(self):
+        return self.serializer_class
+
+    def get_serializer(self, *args, **kwargs):
+        return self.get_serializer_class()(*args, context={'request': self.request, 'view': self}, **kwargs)
+
+    async def prefetch(self, rows):
+        pass
+
+    def render(self, data, status=200):
+        return HttpResponse(JSONRenderer().render(data), content_type='application/json', status=status)
+
+
+class AsyncListView(AsyncReadView):
+    async def get_data(self, request):
+        queryset = self.filter_queryset(await self.get_queryset())
+        if self.pagination_class is None:
+            rows = [row async for row in queryset]
+            await self.prefetch(rows)
+            return self.get_serializer(rows, many=True).data
+
+        paginator = self.pagination_class()
+        rows = await paginator.apaginate_queryset(queryset, request, self)
+        await self.prefetch(rows)
+        return paginator.get_paginated_response(self.get_serializer(rows, many=True).data).data
+
+
+class AsyncDetailView(AsyncReadView):
+    async def get_data(self, request):
+        queryset = self.filter_queryset(await self.get_queryset())
+        try:
+            row = await queryset.aget(pk=self.kwargs['pk'])
+        except queryset.model.DoesNotExist:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        await self.prefetch([row])
+        return self.get_serializer(row).data
+
+
+class AsyncProductExpandMixin:
+    # ?expand=true như ProductExpandMixin: ảnh và biến thể được prefetch sau khi có trang sản phẩm
+    def is_expanded(self):
+        return self.request.query_params.get('expand', '').lower() in ('1', 'true', 'yes')
+
+    def get_serializer_class(self):
+        if self.is_expanded():
+            return ProductExpandedSerializer
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.is_expanded():
+            queryset = queryset.select_related('store')
+        return queryset
+
+    async def prefetch(self, rows):
+        if self.is_expanded() and rows:
+            # Một lời gọi cho cả hai quan hệ: async ORM chạy truy vấn trên cùng một thread/kết nối nên tách ra
+            # rồi gather cũng không chạy song song
+            await aprefetch_related_objects(rows, 'images', 'productvariant_set')
+
+
+class ProductListView(AsyncProductExpandMixin, AsyncListView):
+    serializer_class = ProductSerializer
+    filter_backends = (ProductSearchFilter, OrderingFilter)
+    ordering_fields = ['product_name', 'price', 'rating_avg', 'rating_count', 'created_at']
+    pagination_class = KeysetPagination
+
+    async def get_queryset(self):
+        return filter_min_rating(Product.objects.filter(active=True), self.request)
+
+
+class ProductDetailView(AsyncProductExpandMixin, AsyncDetailView):
+    queryset = Product.objects.filter(active=True)
+    serializer_class = ProductSerializer
+
+
+class ProductByStoreView(AsyncProductExpandMixin, AsyncListView):
+    serializer_class = ProductSerializer
+    filter_backends = (OrderingFilter,)
+    ordering_fields = ['product_name', 'price', 'rating_avg', 'created_at']
+    pagination_class = KeysetPagination
+
+    async def get_queryset(self):
+        return Product.objects.filter(store_id=self.kwargs['store_id'])
+
+
+class ProductByCategoryView(AsyncProductExpandMixin, AsyncListView):
+    serializer_class = ProductSerializer
+    filter_backends = (OrderingFilter,)
+    ordering_fields = ['product_name', 'price', 'rating_avg', 'created_at']
+    pagination_class = KeysetPagination
+    cache_scopes = ('product', 'category')
+
+    async def get_queryset(self):
+        category_id = self.kwargs['category_id']
+        descendants = include_descendants(self.request)
+        path = None
+        if descendants:
+            path = await Category.objects.filter(pk=category_id).values_list('path', flat=True).afirst()
+        return category_products(category_id, path, descendants)
+
+
+class StoreListView(AsyncListView):
+    queryset = Store.objects.filter(active=True).order_by('pk')
+    serializer_class = StoreSerializer
+    pagination_class = AsyncPageNumberPagination
+    cache_scopes = ('store',)
+
+
+class StoreDetailView(AsyncDetailView):
+    queryset = Store.objects.filter(active=True)
+    serializer_class = StoreSerializer
+    cache_scopes = ('store',)
+
+
+class CategoryListView(AsyncListView):
+    queryset = Category.objects.filter(active=True).order_by('pk')
+    serializer_class = CategorySerializer
+    pagination_class = AsyncPageNumberPagination
+    cache_scopes = ('category',)
+
+
+class ReviewsByProductView(AsyncListView):
+    serializer_class = ReviewFeedSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
+    cache_scopes = None
+
+    async def get_queryset(self):
+        return review_feed(product_id=self.kwargs['product_id'])
+
+
+class ReviewsByStoreView(AsyncListView):
+    serializer_class = ReviewFeedSerializer
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
+    cache_scopes = None
+
+    async def get_queryset(self):
+        return review_feed(store_id=self.kwargs['store_id'])
+
+
+class SimilarProductView(AsyncReadView):
+    serializer_class = ProductSerializer
+    cache_scopes = None
+    not_found_data = {'message': 'Product not found.'}
+
+    async def get(self, request, *args, **kwargs):
+        if not request.GET.get('product_id'):
+            return self.render({'message': 'Product ID is required.'}, status=400)
+        return await super().get(request, *args, **kwargs)
+
+    async def get_data(self, request):
+        product_id = request.query_params['product_id']
+        queryset = Product.objects.filter(similar_to__product_id=product_id, active=True).order_by('similar_to__rank')
+        rows = [row async for row in queryset[:5]]
+        if not rows and not await Product.objects.filter(id=product_id).aexists():
+            raise Http404
+        return self.get_serializer(rows, many=True).data
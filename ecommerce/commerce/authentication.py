@@ -0,0 +1,114 @@
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils import timezone
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from oauth2_provider.models import get_access_token_model
+
+TOKEN_KEY = 'oauth2-token:%s'
+# Phiên bản của user trong cache dùng chung, đổi khi user được lưu/xoá (xem signals.py)
+USER_VERSION_KEY = 'oauth2-user-version:%s'
+
+# User đã xác thực giữ trong bộ nhớ của process (LRU), không đưa hash mật khẩu vào cache dùng chung
+_users = OrderedDict()
+_users_lock = threading.Lock()
+
+
+def get_token_cache():
+    return caches[settings.OAUTH2_TOKEN_CACHE]
+
+
+def token_checksum(token):
+    # Cùng checksum sha256 mà oauth2_provider lưu trong AccessToken.token_checksum, không để lộ token trong key
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def token_cache_key(checksum):
+    return TOKEN_KEY % checksum
+
+
+def invalidate_tokens(token_checksums):
+    get_token_cache().delete_many([token_cache_key(checksum) for checksum in token_checksums])
+
+
+def bump_user_version(user_id):
+    # Như caching.bump_version: phiên bản là thời điểm thay đổi nên entry bị cull rồi tạo lại không trùng bản cũ
+    get_token_cache().set(USER_VERSION_KEY % user_id, time.time_ns(), timeout=None)
+
+
+def get_user_version(user_id):
+    cache = get_token_cache()
+    version = cache.get(USER_VERSION_KEY % user_id)
+    if version is None:
+        cache.add(USER_VERSION_KEY % user_id, time.time_ns(), timeout=None)
+        version = cache.get(USER_VERSION_KEY % user_id)
+    return version
+
+
+def get_cached_user(user_id):
+    """User theo id từ LRU của process nếu phiên bản còn khớp, không thì đọc DB; trả về bản sao cho mỗi request."""
+    version = get_user_version(user_id)
+    with _users_lock:
+        entry = _users.get(user_id)
+        if entry is not None and entry[0] == version:
+            _users.move_to_end(user_id)
+            return copy.copy(entry[1])
+    # Đọc phiên bản trước khi đọc DB: user đổi giữa hai bước thì entry mang phiên bản cũ và bị đọc lại lần sau
+    user = get_user_model()._default_manager.filter(pk=user_id).first()
+    if user is not None:
+        with _users_lock:
+            _users[user_id] = (version, user)
+            _users.move_to_end(user_id)
+            while len(_users) > settings.OAUTH2_USER_CACHE_SIZE:
+                _users.popitem(last=False)
+        user = copy.copy(user)
+    return user
+
+
+class CachedOAuth2Authentication(OAuth2Authentication):
+    """
+    OAuth2Authentication có cache: kết quả kiểm tra AccessToken được giữ trong cache OAUTH2_TOKEN_CACHE tới khi
+    hết hạn (tối đa OAUTH2_TOKEN_CACHE_TIMEOUT giây), request sau không truy vấn DB. Thu hồi token xoá entry
+    qua signal (xem signals.py).
+
+    Cache dùng chung giữa các worker nên chỉ lưu các trường trong CACHED_FIELDS: không lưu token gốc hay user
+    (kèm hash mật khẩu). User nằm trong LRU của từng process (get_cached_user), hết hiệu lực khi phiên bản
+    của user trong cache dùng chung đổi.
+    """
+    CACHED_FIELDS = ('id', 'user_id', 'application_id', 'scope', 'expires')
+
+    def authenticate(self, request):
+        token = self.get_bearer_token(request)
+        if token is None:
+            return super().authenticate(request)
+
+        cache = get_token_cache()
+        key = token_cache_key(token_checksum(token))
+        cached = cache.get(key)
+        if cached is not None:
+            access_token = get_access_token_model()(**cached)
+            user = None if access_token.is_expired() else get_cached_user(access_token.user_id)
+            if user is not None:
+                access_token.user = user
+                return user, access_token
+
+        result = super().authenticate(request)
+        # Token giới hạn audience (RFC 8707) phụ thuộc URL của request nên không cache
+        if result is not None and not getattr(result[1], 'resource', None):
+            timeout = min(settings.OAUTH2_TOKEN_CACHE_TIMEOUT, (result[1].expires - timezone.now()).total_seconds())
+            if timeout > 0:
+                cache.set(key, {field: getattr(result[1], field) for field in self.CACHED_FIELDS}, timeout)
+        return result
+
+    def get_bearer_token(self, request):
+        # Chỉ cache token trong header; token gửi qua query/body để oauthlib xử lý như cũ
+        authorization = request.META.get('HTTP_AUTHORIZATION', '')
+        if authorization.startswith('Bearer '):
+            return authorization[len('Bearer '):].strip() or None
+        return None
@@ -0,0 +1,171 @@
+import hashlib
+import threading
+import time
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from rest_framework.response import Response
+
+VERSION_KEY = 'catalog-version:%s'
+RESPONSE_KEY = 'catalog-response:%s'
+STATS_KEY = 'catalog-response-stats:%s'
+# Số hit/miss đếm trong bộ nhớ của process, cộng vào cache tối đa mỗi STATS_FLUSH_INTERVAL giây
+STATS_FLUSH_INTERVAL = 10
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+_stats_flushed_at = time.monotonic()
+
+
+def get_response_cache():
+    # Cache riêng cho body response: body chiếm gần hết số entry, bị cull không kéo theo key phiên bản/token
+    return caches[settings.CATALOG_RESPONSE_CACHE]
+
+
+def bump_version(*scopes):
+    # Phiên bản là thời điểm thay đổi (ms), dùng luôn làm Last-Modified
+    now = int(time.time() * 1000)
+    cache.set_many({VERSION_KEY % scope: now for scope in scopes}, timeout=None)
+
+
+def get_versions(scopes):
+    keys = [VERSION_KEY % scope for scope in scopes]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        now = int(time.time() * 1000)
+        cache.set_many({key: now for key in missing}, timeout=None)
+        versions.update({key: now for key in missing})
+    return [versions[key] for key in keys]
+
+
+def record(result):
+    with _stats_lock:
+        _stats[result] += 1
+        due = time.monotonic() - _stats_flushed_at >= STATS_FLUSH_INTERVAL
+    if due:
+        flush_stats()
+
+
+def flush_stats():
+    """
+    Cộng số đếm của process vào cache. incr nguyên tử trên Redis/Memcached; với FileBasedCache (get + set) hai
+    process flush cùng lúc có thể mất một lượt, chấp nhận được cho số liệu thống kê và hiếm vì chỉ flush định kỳ.
+    """
+    global _stats_flushed_at
+    with _stats_lock:
+        pending = dict(_stats)
+        _stats.clear()
+        _stats_flushed_at = time.monotonic()
+    for result, count in pending.items():
+        try:
+            cache.incr(STATS_KEY % result, count)
+        except ValueError:
+            if not cache.add(STATS_KEY % result, count, timeout=None):
+                cache.incr(STATS_KEY % result, count)
+
+
+def cache_stats():
+    flush_stats()
+    hits = cache.get(STATS_KEY % 'hit', 0)
+    misses = cache.get(STATS_KEY % 'miss', 0)
+    not_modified = cache.get(STATS_KEY % 'not_modified', 0)
+    total = hits + misses + not_modified
+    return {
+        'hits': hits,
+        'misses': misses,
+        'not_modified': not_modified,
+        'hit_ratio': (hits + not_modified) / total if total else None,
+    }
+
+
+def response_etag(request, format, versions, timeout):
+    """
+    Tồn kho đổi khi giữ hàng/thanh toán không tăng phiên bản (mỗi lượt đặt hàng sẽ xoá cache cả catalog), nên
+    ETag/Last-Modified còn gắn với khung thời gian `timeout` giây: response cache và 304 chỉ xác nhận `stock`
+    cũ tối đa chừng đó, checkout/giữ hàng vẫn kiểm tra tồn kho thật trong DB.
+    """
+    window = int(time.time()) // timeout
+    signature = '|'.join([request.get_host(), request.get_full_path(), format, str(window), *map(str, versions)])
+    digest = hashlib.md5(signature.encode('utf-8')).hexdigest()
+    return digest, f'"{digest}"', max(max(versions) // 1000, window * timeout)
+
+
+class CatalogCacheMixin:
+    """
+    Cache response của list/retrieve theo đường dẫn + query string và hỗ trợ ETag/Last-Modified (304).
+    Key chứa phiên bản của các nhóm trong cache_scopes; signal tăng phiên bản khi dữ liệu đổi (xem signals.py).
+    Riêng `stock` có thể cũ tối đa cache_timeout giây, xem response_etag.
+    """
+    cache_scopes = ('product',)
+    cache_timeout = 300
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, request, *args, **kwargs)
+
+    def get_cache_scopes(self):
+        return self.cache_scopes
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        versions = get_versions(self.get_cache_scopes())
+        digest, etag, last_modified = response_etag(request, request.accepted_renderer.format, versions,
+                                                    self.cache_timeout)
+
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            record('not_modified')
+            return not_modified
+
+        data = get_response_cache().get(RESPONSE_KEY % digest)
+        if data is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            get_response_cache().set(RESPONSE_KEY % digest, response.data, self.cache_timeout)
+            record('miss')
+            response['X-Cache'] = 'MISS'
+        else:
+            response = Response(data)
+            record('hit')
+            response['X-Cache'] = 'HIT'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class AsyncCatalogCacheMixin:
+    """Như CatalogCacheMixin nhưng cho view async (commerce/async_views.py), dùng chung key phiên bản và thống kê."""
+    cache_scopes = ('product',)
+    cache_timeout = 300
+
+    async def cached_response(self, handler, request):
+        if not self.cache_scopes:
+            return self.render(await handler(request))
+        versions = await sync_to_async(get_versions)(self.cache_scopes)
+        digest, etag, last_modified = response_etag(request, 'json', versions, self.cache_timeout)
+
+        not_modified = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            record('not_modified')
+            return not_modified
+
+        data = await get_response_cache().aget(RESPONSE_KEY % digest)
+        if data is None:
+            data = await handler(request)
+            await get_response_cache().aset(RESPONSE_KEY % digest, data, self.cache_timeout)
+            result = 'miss'
+        else:
+            result = 'hit'
+        record(result)
+        response = self.render(data)
+        response['X-Cache'] = result.upper()
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
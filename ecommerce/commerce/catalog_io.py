@@ -0,0 +1,416 @@
+import csv
+import io
+import json
+import logging
+import os
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from itertools import islice
+from pathlib import Path
+from uuid import uuid4
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, connection, transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import serializers
+
+from .caching import bump_version
+from .inventory import set_stock
+from .media import image_source
+from .models import Category, Product, ProductImage, ProductImport, ProductVariant
+from .search import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Cột của file nhập/xuất; file xuất ra nhập lại được (dòng có id là cập nhật, không có id là tạo mới)
+COLUMNS = ['id', 'product_name', 'category', 'price', 'stock', 'active', 'description', 'variants', 'images']
+# Trong CSV: biến thể "size:color" và ảnh (public id Cloudinary) cách nhau bởi "|"; NDJSON dùng list
+LIST_SEPARATOR = '|'
+VARIANT_SEPARATOR = ':'
+CONTENT_TYPES = {
+    ProductImport.CSV: 'text/csv; charset=utf-8',
+    ProductImport.NDJSON: 'application/x-ndjson',
+}
+EXTENSIONS = {'.csv': ProductImport.CSV, '.ndjson': ProductImport.NDJSON, '.jsonl': ProductImport.NDJSON}
+PRODUCT_FIELDS = ['product_name', 'category_id', 'price', 'stock', 'active', 'description']
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class DelimitedListField(serializers.ListField):
+    # Ô CSV "a|b" thành ["a", "b"], NDJSON gửi thẳng list
+    def to_internal_value(self, data):
+        if isinstance(data, str):
+            data = [self.parse_item(item.strip()) for item in data.split(LIST_SEPARATOR) if item.strip()]
+        return super().to_internal_value(data)
+
+    def parse_item(self, item):
+        return item
+
+
+class VariantListField(DelimitedListField):
+    def parse_item(self, item):
+        size, _, color = item.partition(VARIANT_SEPARATOR)
+        return {'size': size.strip() or None, 'color': color.strip() or None}
+
+
+class ImportVariantSerializer(serializers.Serializer):
+    size = serializers.CharField(max_length=50, allow_blank=True, allow_null=True, required=False)
+    color = serializers.CharField(max_length=50, allow_blank=True, allow_null=True, required=False)
+
+
+class ProductRowSerializer(serializers.Serializer):
+    """Một dòng của file nhập; variants/images bỏ trống thì giữ nguyên, có giá trị thì thay toàn bộ."""
+    id = serializers.IntegerField(required=False, allow_null=True)
+    product_name = serializers.CharField(max_length=255)
+    category = serializers.IntegerField(required=False, allow_null=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=0, min_value=0)
+    stock = serializers.IntegerField(min_value=0)
+    active = serializers.BooleanField(default=True)
+    description = serializers.CharField(allow_blank=True, default='', trim_whitespace=False)
+    variants = VariantListField(child=ImportVariantSerializer(), required=False)
+    images = DelimitedListField(child=serializers.CharField(max_length=255), required=False)
+
+
+def read_rows(file, format):
+    """Sinh (số dòng trong file, dữ liệu, lỗi) cho từng dòng dữ liệu của file nhị phân CSV/NDJSON."""
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    if format == ProductImport.CSV:
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Ô trống coi như không gửi, cột lạ (không có tên) bị bỏ qua
+            yield reader.line_num, {key: value for key, value in row.items() if key and value not in ('', None)}, None
+        return
+    for number, line in enumerate(text, 1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as error:
+            yield number, None, {'non_field_errors': [f'Invalid JSON: {error}']}
+            continue
+        if not isinstance(data, dict):
+            yield number, None, {'non_field_errors': ['Expected a JSON object.']}
+            continue
+        yield number, data, None
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class ProductImporter:
+    """
+    Nhập sản phẩm của một cửa hàng theo lô: mỗi lô được kiểm tra bằng ProductRowSerializer, tra category và id
+    bằng một truy vấn, rồi bulk_create/bulk_update Product, ProductVariant, ProductImage.
+    bulk_create không gửi signal nên importer tự cập nhật chỉ mục tìm kiếm; image_variants để trống
+    (stored_variants tự tính khi đọc, rebuild_image_variants ghi lại) vì sinh URL Cloudinary chiếm phần lớn thời gian.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        # Dùng chung một serializer cho mọi dòng (như ListSerializer), tránh deepcopy các field ở mỗi dòng
+        self.row_serializer = ProductRowSerializer()
+
+    def import_batch(self, rows):
+        """rows là list (số dòng, dữ liệu, lỗi) của read_rows; trả về (số tạo mới, số cập nhật, lỗi theo dòng)."""
+        valid, errors = [], []
+        for line, data, error in rows:
+            if error is None:
+                try:
+                    valid.append((line, self.row_serializer.run_validation(data)))
+                    continue
+                except serializers.ValidationError as exc:
+                    error = exc.detail
+            errors.append({'line': line, 'errors': error})
+        valid = self.check_references(valid, errors)
+
+        with transaction.atomic():
+            created = self.create_products([row for row in valid if row.get('id') is None])
+            updated = self.update_products([row for row in valid if row.get('id') is not None])
+            changed = [product.pk for product in created + updated]
+            if changed:
+                get_backend().index_products(Product.objects.filter(pk__in=changed))
+        errors.sort(key=lambda error: error['line'])
+        return len(created), len(valid) - len(created), errors
+
+    def check_references(self, valid, errors):
+        category_ids = {row['category'] for _, row in valid if row.get('category') is not None}
+        categories = set(Category.objects.filter(pk__in=category_ids).values_list('pk', flat=True))
+        product_ids = {row['id'] for _, row in valid if row.get('id') is not None}
+        self.products = Product.objects.filter(store=self.store, pk__in=product_ids).in_bulk()
+
+        rows, seen = [], set()
+        for line, row in valid:
+            if row.get('category') is not None and row['category'] not in categories:
+                errors.append({'line': line, 'errors': {'category': [f'Category {row["category"]} does not exist.']}})
+            elif row.get('id') is not None and row['id'] not in self.products:
+                errors.append({'line': line, 'errors': {'id': [f'Product {row["id"]} does not exist in this store.']}})
+            elif row.get('id') is not None and row['id'] in seen:
+                errors.append({'line': line, 'errors': {'id': [f'Product {row["id"]} appears twice in this batch.']}})
+            else:
+                seen.add(row.get('id'))
+                rows.append(row)
+        return rows
+
+    def product_values(self, row):
+        return {
+            'product_name': row['product_name'],
+            'category_id': row.get('category'),
+            'price': row['price'],
+            'stock': row['stock'],
+            'active': row['active'],
+            'description': row['description'],
+        }
+
+    def create_products(self, rows):
+        products = [Product(store=self.store, **self.product_values(row)) for row in rows]
+        if not products:
+            return []
+        if connection.features.can_return_rows_from_bulk_insert:
+            Product.objects.bulk_create(products)
+        else:
+            self.insert_tagged(products)
+        self.create_children([(product, row) for product, row in zip(products, rows)])
+        return products
+
+    def insert_tagged(self, products):
+        # MySQL không trả id từ bulk_create và id của một INSERT nhiều dòng không chắc liên tiếp
+        # (innodb_autoinc_lock_mode=2): gắn import_token riêng cho lô, chèn một lần rồi đọc lại id theo token
+        token = uuid4().hex
+        for i, product in enumerate(products):
+            product.import_token = f'{token}:{i}'
+        Product.objects.bulk_create(products)
+        inserted = Product.objects.filter(import_token__startswith=f'{token}:').values_list('import_token', 'pk')
+        pks = {int(import_token.rpartition(':')[2]): pk for import_token, pk in inserted}
+        for i, product in enumerate(products):
+            product.pk, product.import_token = pks[i], None
+        Product.objects.filter(pk__in=pks.values()).update(import_token=None)
+
+    def update_products(self, rows):
+        changed, children, restocked = [], [], []
+        now = timezone.now()
+        for row in rows:
+            product = self.products[row['id']]
+            values = self.product_values(row)
+            if product.stock_shards and product.stock != values['stock']:
+                restocked.append(product)
+            # Bỏ qua dòng không đổi: đồng bộ định kỳ thường gửi lại phần lớn catalog như cũ
+            if any(getattr(product, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(product, field, value)
+                product.updated_at = now
+                changed.append(product)
+            children.append((product, row))
+        if changed:
+            Product.objects.bulk_update(changed, PRODUCT_FIELDS + ['updated_at'])
+        # Tồn kho của sản phẩm chia shard nằm trong StockShard (xem inventory.py)
+        for product in restocked:
+            set_stock(product.pk, product.stock, product.stock_shards)
+        self.replace_children(children)
+        return changed
+
+    def create_children(self, products):
+        variants, images = [], []
+        for product, row in products:
+            variants += [ProductVariant(product_id=product.pk, size=variant.get('size') or None,
+                                        color=variant.get('color') or None) for variant in row.get('variants', ())]
+            images += [ProductImage(product_id=product.pk, image=image_source(image))
+                       for image in row.get('images', ())]
+        ProductVariant.objects.bulk_create(variants)
+        ProductImage.objects.bulk_create(images)
+
+    def replace_children(self, products):
+        # Chỉ xoá/tạo lại biến thể và ảnh của sản phẩm mà danh sách trong file khác với DB
+        product_ids = [product.pk for product, _ in products]
+        current_variants, current_images = {}, {}
+        for product_id, size, color in ProductVariant.objects.filter(product_id__in=product_ids).order_by(
+                'pk').values_list('product_id', 'size', 'color'):
+            current_variants.setdefault(product_id, []).append((size, color))
+        for product_id, image in ProductImage.objects.filter(product_id__in=product_ids).order_by(
+                'pk').values_list('product_id', 'image'):
+            current_images.setdefault(product_id, []).append(image_source(image))
+
+        variant_rows, image_rows = [], []
+        for product, row in products:
+            if 'variants' in row:
+                variants = [(variant.get('size') or None, variant.get('color') or None) for variant in row['variants']]
+                if variants != current_variants.get(product.pk, []):
+                    variant_rows.append((product, {'variants': row['variants']}))
+            if 'images' in row:
+                if [image_source(image) for image in row['images']] != current_images.get(product.pk, []):
+                    image_rows.append((product, {'images': row['images']}))
+        ProductVariant.objects.filter(product_id__in=[product.pk for product, _ in variant_rows]).delete()
+        ProductImage.objects.filter(product_id__in=[product.pk for product, _ in image_rows]).delete()
+        self.create_children(variant_rows + image_rows)
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.PRODUCT_IMPORT_CONCURRENCY,
+                                           thread_name_prefix='product-import')
+        return _executor
+
+
+def detect_format(name):
+    return EXTENSIONS.get(Path(name or '').suffix.lower())
+
+
+def stage_import(store, user, file, format):
+    """Lưu file vào thư mục tạm và tạo ProductImport; file nhỏ được nhập ngay, file lớn chạy nền sau khi commit."""
+    staging_dir = Path(settings.PRODUCT_IMPORT_STAGING_DIR)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    path = staging_dir / f'{uuid4().hex}.{format}'
+    with open(path, 'wb') as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+
+    job = ProductImport.objects.create(store=store, user=user, format=format, original_name=(file.name or '')[:255],
+                                       staged_path=str(path))
+    if file.size <= settings.PRODUCT_IMPORT_INLINE_BYTES or not settings.PRODUCT_IMPORT_CONCURRENCY:
+        process_import(job.pk)
+    else:
+        transaction.on_commit(lambda: get_executor().submit(run_in_worker, job.pk))
+    job.refresh_from_db()
+    return job
+
+
+def run_in_worker(job_id):
+    try:
+        process_import(job_id)
+    except Exception:
+        logger.exception('Product import %s crashed', job_id)
+    finally:
+        close_old_connections()
+
+
+def process_import(job_id):
+    # Nhận việc bằng UPDATE có điều kiện như uploads.process_upload
+    jobs = ProductImport.objects.filter(pk=job_id)
+    if not jobs.filter(status=ProductImport.PENDING).update(status=ProductImport.RUNNING, updated_at=timezone.now()):
+        return None
+    job = ProductImport.objects.select_related('store').get(pk=job_id)
+    importer = ProductImporter(job.store)
+    max_errors = settings.PRODUCT_IMPORT_MAX_ERRORS
+    try:
+        with open(job.staged_path, 'rb') as file:
+            # Bỏ qua các dòng đã nhập ở lần chạy trước (worker chết giữa chừng)
+            rows = islice(read_rows(file, job.format), job.processed_rows, None)
+            for batch in batched(rows, settings.PRODUCT_IMPORT_BATCH_SIZE):
+                with transaction.atomic():
+                    created, updated, errors = importer.import_batch(batch)
+                    job.processed_rows += len(batch)
+                    job.created_count += created
+                    job.updated_count += updated
+                    job.error_count += len(errors)
+                    job.errors += errors[:max(max_errors - len(job.errors), 0)]
+                    # Tiến độ commit cùng lô dữ liệu nên chạy lại không nhập trùng
+                    job.save(update_fields=['processed_rows', 'created_count', 'updated_count', 'error_count',
+                                            'errors', 'updated_at'])
+                transaction.on_commit(lambda: bump_version('product'))
+    except Exception as error:
+        logger.exception('Product import %s failed', job_id)
+        jobs.update(status=ProductImport.FAILED, error=str(error), updated_at=timezone.now())
+        return job
+
+    jobs.update(status=ProductImport.DONE, updated_at=timezone.now())
+    try:
+        os.remove(job.staged_path)
+    except FileNotFoundError:
+        pass
+    job.refresh_from_db()
+    return job
+
+
+def requeue_imports(stale_after=timedelta(minutes=30)):
+    """Trả về id các lần nhập cần chạy: pending và running không có tiến độ trong stale_after (worker chết)."""
+    ProductImport.objects.filter(status=ProductImport.RUNNING, updated_at__lt=timezone.now() - stale_after).update(
+        status=ProductImport.PENDING, updated_at=timezone.now())
+    return list(ProductImport.objects.filter(status=ProductImport.PENDING).order_by('id').values_list('id', flat=True))
+
+
+class Echo:
+    # "File" cho csv.writer trả lại chuỗi vừa ghi, để ghép thành từng khối gửi đi
+    def write(self, value):
+        return value
+
+
+def export_rows(products):
+    """Dòng xuất của một lô sản phẩm (dict từ values()), biến thể và ảnh lấy bằng một truy vấn mỗi loại."""
+    product_ids = [product['id'] for product in products]
+    variants, images = defaultdict(list), defaultdict(list)
+    for product_id, size, color in ProductVariant.objects.filter(product_id__in=product_ids).order_by(
+            'pk').values_list('product_id', 'size', 'color'):
+        variants[product_id].append({'size': size, 'color': color})
+    for product_id, image in ProductImage.objects.filter(product_id__in=product_ids).order_by(
+            'pk').values_list('product_id', 'image'):
+        if image:
+            images[product_id].append(image_source(image))
+    return [{
+        'id': product['id'],
+        'product_name': product['product_name'],
+        'category': product['category_id'],
+        'price': format(product['price'], 'f'),
+        'stock': product['stock'],
+        'active': product['active'],
+        'description': product['description'],
+        'variants': variants[product['id']],
+        'images': images[product['id']],
+    } for product in products]
+
+
+def csv_values(row):
+    row = dict(row, active='true' if row['active'] else 'false')
+    row['variants'] = LIST_SEPARATOR.join(f'{variant["size"] or ""}{VARIANT_SEPARATOR}{variant["color"] or ""}'
+                                          for variant in row['variants'])
+    row['images'] = LIST_SEPARATOR.join(row['images'])
+    return [row[column] for column in COLUMNS]
+
+
+def export_products(queryset, format, batch_size=None):
+    """
+    Sinh file xuất theo từng khối bytes, mỗi khối một lô sản phẩm theo id tăng dần (keyset, không OFFSET)
+    với 3 truy vấn: sản phẩm, biến thể, ảnh. Bộ nhớ chỉ giữ một lô dù cửa hàng có hàng trăm nghìn sản phẩm.
+    """
+    batch_size = batch_size or settings.PRODUCT_IMPORT_BATCH_SIZE
+    writer = csv.writer(Echo())
+    if format == ProductImport.CSV:
+        yield writer.writerow(COLUMNS).encode('utf-8')
+    # values() thay vì model instance: xuất là đường nóng khi đồng bộ catalog lớn
+    queryset = queryset.order_by('pk').values('id', 'product_name', 'category_id', 'price', 'stock', 'active',
+                                              'description')
+    last = 0
+    while products := list(queryset.filter(pk__gt=last)[:batch_size]):
+        last = products[-1]['id']
+        if format == ProductImport.CSV:
+            lines = [writer.writerow(csv_values(row)) for row in export_rows(products)]
+        else:
+            lines = [json.dumps(row, ensure_ascii=False) + '\n' for row in export_rows(products)]
+        yield ''.join(lines).encode('utf-8')
+
+
+async def _async_chunks(chunks):
+    # Dưới ASGI, Django gom hết iterator đồng bộ vào bộ nhớ trước khi gửi; lấy từng khối qua thread để stream thật
+    iterator = iter(chunks)
+    done = object()
+    while (chunk := await sync_to_async(next)(iterator, done)) is not done:
+        yield chunk
+
+
+def streaming_response(request, chunks, content_type, filename):
+    """StreamingHttpResponse tải file về, dùng iterator async khi chạy dưới ASGI."""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        chunks = _async_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
@@ -0,0 +1,94 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, F, Value
+from django.db.models.functions import Concat, Substr
+
+from .media import image_url
+
+SEPARATOR = '/'
+CYCLE_MESSAGE = 'A category cannot be moved under itself or one of its descendants.'
+
+
+def build_path(parent_path, pk):
+    return f'{parent_path or SEPARATOR}{pk}{SEPARATOR}'
+
+
+def creates_cycle(category, parent):
+    # Chuyển danh mục vào chính nó hoặc vào danh mục con của nó
+    return bool(category.pk and parent is not None and
+                (parent.pk == category.pk or build_path('', category.pk) in parent.path))
+
+
+def check_parent(category, parent_path):
+    # Chốt chặn cuối trong pre_save; API và admin đã kiểm tra trước bằng creates_cycle để trả lỗi 400/form
+    if category.pk and parent_path and build_path('', category.pk) in parent_path:
+        raise ValidationError(CYCLE_MESSAGE)
+
+
+def update_category_path(model, category):
+    """Tính lại path/depth của category và dời toàn bộ cây con theo, trả về path mới."""
+    parent_path = model.objects.filter(pk=category.parent_id).values_list('path', flat=True).first() or ''
+    new_path = build_path(parent_path, category.pk)
+    old_path = model.objects.filter(pk=category.pk).values_list('path', flat=True).first()
+    if old_path == new_path:
+        return new_path
+
+    depth = new_path.count(SEPARATOR) - 2
+    with transaction.atomic():
+        if old_path:
+            depth_delta = depth - (old_path.count(SEPARATOR) - 2)
+            model.objects.filter(path__startswith=old_path).exclude(pk=category.pk).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + depth_delta,
+            )
+        model.objects.filter(pk=category.pk).update(path=new_path, depth=depth)
+    category.path, category.depth = new_path, depth
+    return new_path
+
+
+def rebuild_paths(model):
+    """Dựng lại path cho toàn bộ bảng theo từng tầng, dùng cho migration/sửa dữ liệu."""
+    paths = {}
+    level = list(model.objects.filter(parent__isnull=True).values_list('pk', flat=True))
+    depth = 0
+    while level:
+        updates = []
+        for pk, parent_id in model.objects.filter(pk__in=level).values_list('pk', 'parent_id'):
+            paths[pk] = build_path(paths.get(parent_id, ''), pk)
+            updates.append(model(pk=pk, path=paths[pk], depth=depth))
+        model.objects.bulk_update(updates, ['path', 'depth'], batch_size=500)
+        level = list(model.objects.filter(parent_id__in=level).values_list('pk', flat=True))
+        depth += 1
+
+
+def build_tree(categories, product_counts=None):
+    """
+    categories: các dict (id, name, parent_id, image, depth) lấy trong một truy vấn, sắp theo depth.
+    product_counts: {category_id: số sản phẩm} nếu cần đếm, được cộng dồn lên các nút cha.
+    """
+    nodes, roots = {}, []
+    for category in categories:
+        node = {
+            'id': category['id'],
+            'name': category['name'],
+            'parent': category['parent_id'],
+            'image_url': image_url(category['image']),
+            'children': [],
+        }
+        nodes[node['id']] = node
+        if node['parent'] is None:
+            roots.append(node)
+        elif node['parent'] in nodes:
+            nodes[node['parent']]['children'].append(node)
+
+    if product_counts is not None:
+        def count(node):
+            node['product_count'] = product_counts.get(node['id'], 0) + sum(count(child) for child in node['children'])
+            return node['product_count']
+        for root in roots:
+            count(root)
+    return roots
+
+
+def category_product_counts(products):
+    return dict(products.order_by().values_list('category_id').annotate(count=Count('id')))
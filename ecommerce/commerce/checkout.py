@@ -0,0 +1,100 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import BooleanField, Count, ExpressionWrapper, F, Q, Sum
+from rest_framework.exceptions import ValidationError
+
+from .caching import bump_version
+from .inventory import commit_reservations, lock_reservations, take_stock
+from .models import Order, OrderDetail, Payment, Product
+
+# Dòng giỏ hàng còn mua được: sản phẩm đang bán và đủ tồn kho cho số lượng của dòng
+AVAILABLE = Q(product__active=True, product__stock__gte=F('quantity'))
+
+
+def place_orders(user, payment_method, items=(), reservations=(), transaction_id=None):
+    """
+    Tạo một Order cho mỗi Store trong giỏ hàng, kèm OrderDetail và Payment, trong một transaction.
+    Giá và tổng tiền được tính ở server; OrderDetail.price là thành tiền của dòng (đơn giá x số lượng).
+    items bị trừ tồn kho ngay; reservations (id StockReservation đang held, xem inventory.py) đã trừ từ trước.
+    """
+    quantities = defaultdict(int)
+    notes = {}
+    for item in items:
+        quantities[item['product']] += item['quantity']
+        if item.get('note'):
+            notes[item['product']] = item['note']
+
+    with transaction.atomic():
+        held = lock_reservations(user, reservations) if reservations else []
+        ordered = defaultdict(int, quantities)
+        for _, product_id, quantity in held:
+            ordered[product_id] += quantity
+
+        products = Product.objects.filter(pk__in=ordered, active=True).only('id', 'store_id', 'price',
+                                                                            'product_name', 'stock_shards')
+        products = {product.pk: product for product in products}
+        missing = [product_id for product_id in ordered if product_id not in products]
+        if missing:
+            raise ValidationError({'items': [f'Product {product_id} does not exist.' for product_id in missing]})
+
+        shard_counts = {product_id: products[product_id].stock_shards for product_id in quantities
+                        if products[product_id].stock_shards}
+        if quantities and not take_stock(quantities, shard_counts):
+            raise ValidationError({'items': ['Some products are out of stock.']})
+
+        by_store = defaultdict(list)
+        for product_id, quantity in ordered.items():
+            product = products[product_id]
+            by_store[product.store_id].append((product, quantity, product.price * quantity))
+
+        orders, details, payments = [], [], []
+        for store_id, lines in by_store.items():
+            total = sum((amount for _, _, amount in lines), Decimal(0))
+            order = Order.objects.create(user=user, store_id=store_id, total_amount=total,
+                                         item_count=sum(quantity for _, quantity, _ in lines),
+                                         payment_method=payment_method, order_status='processing')
+            orders.append(order)
+            details += [
+                OrderDetail(order=order, store_id=store_id, product=product, quantity=quantity, price=amount,
+                            note=notes.get(product.pk))
+                for product, quantity, amount in lines
+            ]
+            payments.append(Payment(order=order, payment_method=payment_method, amount=total,
+                                    transaction_id=transaction_id))
+            if held:
+                commit_reservations([pk for pk, product_id, _ in held if products[product_id].store_id == store_id],
+                                    order)
+        OrderDetail.objects.bulk_create(details)
+        Payment.objects.bulk_create(payments)
+    # Tồn kho đổi qua update() nên không có signal, tự làm mới cache sản phẩm
+    bump_version('product')
+    return orders
+
+
+def pending_lines(user):
+    return OrderDetail.objects.filter(order__user=user, order__order_status='pending')
+
+
+def cart_summary(user, lines=None):
+    """
+    Giỏ hàng (các dòng của đơn pending) gom theo cửa hàng: [{store, store_name, subtotal, item_count, line_count,
+    unavailable_count, items}]. Thành tiền, số lượng và tình trạng còn hàng tính trong SQL; lines là queryset
+    dòng đã select_related/prefetch cho serializer, mỗi dòng có thêm available.
+    """
+    lines = pending_lines(user) if lines is None else lines
+    lines = lines.annotate(available=ExpressionWrapper(AVAILABLE, output_field=BooleanField())).order_by('store_id', 'id')
+    totals = pending_lines(user).values('store_id').annotate(
+        subtotal=Sum('price'), item_count=Sum('quantity'), line_count=Count('id'),
+        unavailable_count=Count('id', filter=~AVAILABLE),
+    ).order_by('store_id')
+
+    stores = {row['store_id']: dict(row, store_name=None, items=[]) for row in totals}
+    for line in lines:
+        store = stores.get(line.store_id)
+        # Dòng thêm vào giữa hai truy vấn thì để lần tải sau
+        if store is not None:
+            store['store_name'] = line.store.store_name
+            store['items'].append(line)
+    return [store for store in stores.values() if store['items']]
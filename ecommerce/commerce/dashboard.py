@@ -0,0 +1,65 @@
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth, TruncQuarter, TruncYear
+
+from .models import DailySales, Order, StatsSnapshot, Store, User
+
+# (tên kỳ, hàm truncate, hậu tố key trong context cũ, định dạng nhãn có kèm năm)
+PERIODS = [
+    ('month', TruncMonth, 'monthly', '', lambda d: d.strftime('%Y-%m')),
+    ('quarter', TruncQuarter, 'quarterly', '_quarter', lambda d: f'{d.year}-Q{(d.month - 1) // 3 + 1}'),
+    ('year', TruncYear, 'yearly', '_year', lambda d: str(d.year)),
+]
+KEEP_SNAPSHOTS = 10
+
+
+def build_commerce_stats():
+    """Tính toàn bộ số liệu cho trang commerce-stats, nhóm theo kỳ có kèm năm."""
+    stores = Store.objects.aggregate(total=Count('id'), active=Count('id', filter=Q(active=True)))
+    users = User.objects.aggregate(
+        customers=Count('id', filter=Q(role=User.CUSTOMER_ROLE)),
+        sellers=Count('id', filter=Q(role=User.SELLER_ROLE)),
+        unconfirmed=Count('id', filter=Q(role=User.SELLER_ROLE, is_active=False)),
+    )
+    stats = {
+        'total_stores': stores['total'],
+        'active_stores': stores['active'],
+        'total_customers': users['customers'],
+        'total_sellers': users['sellers'],
+        'unconfirmed_sellers': users['unconfirmed'],
+    }
+
+    completed = Order.objects.filter(order_status='completed')
+    for period, trunc, prefix, suffix, label in PERIODS:
+        total_sales = completed.annotate(bucket=trunc('order_date')).values('bucket').annotate(
+            total_sales=Sum('total_amount')).order_by('bucket')
+        # Doanh số theo store lấy từ bảng DailySales thay vì join OrderDetail -> Product -> Store
+        store_sales = DailySales.objects.filter(order_count__gt=0).annotate(bucket=trunc('day')).values(
+            'bucket', 'store__store_name').annotate(total_sales=Sum('revenue')).order_by('bucket')
+        paid_orders = completed.annotate(bucket=trunc('order_date')).values('bucket', 'store__store_name').annotate(
+            total_paid_orders=Count('id')).order_by('bucket')
+
+        total_sales = [{period: label(row['bucket']), 'total_sales': float(row['total_sales'])}
+                       for row in total_sales]
+        store_sales = [{period: label(row['bucket']), 'store_name': row['store__store_name'],
+                        'total_sales': float(row['total_sales'])} for row in store_sales]
+        paid_orders = [{period: label(row['bucket']), 'store_name': row['store__store_name'],
+                        'total_paid_orders': row['total_paid_orders']} for row in paid_orders]
+
+        stats[f'{prefix}_total_sales'] = total_sales
+        stats[f'{prefix}_store_sales'] = store_sales
+        stats[f'{prefix}_paid_orders'] = paid_orders
+        stats[f'most_paid_orders_store{suffix}'] = max(
+            paid_orders, key=lambda row: row['total_paid_orders'], default=None)
+        stats[f'lowest_sales_store{suffix}'] = min(store_sales, key=lambda row: row['total_sales'], default=None)
+    return stats
+
+
+def refresh_stats_snapshot():
+    snapshot = StatsSnapshot.objects.create(data=build_commerce_stats())
+    old = StatsSnapshot.objects.order_by('-created_at').values_list('pk', flat=True)[KEEP_SNAPSHOTS:]
+    StatsSnapshot.objects.filter(pk__in=list(old)).delete()
+    return snapshot
+
+
+def latest_stats_snapshot():
+    return StatsSnapshot.objects.order_by('-created_at').first() or refresh_stats_snapshot()
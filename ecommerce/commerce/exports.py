@@ -0,0 +1,113 @@
+import csv
+import json
+import zlib
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+
+from .catalog_io import CONTENT_TYPES, Echo, streaming_response
+
+# (tên cột, lookup trong values_list); thông tin thanh toán lấy bằng LEFT JOIN tới Payment trong cùng truy vấn
+ORDER_COLUMNS = [
+    ('id', 'id'),
+    ('order_date', 'order_date'),
+    ('user_id', 'user_id'),
+    ('username', 'user__username'),
+    ('store_id', 'store_id'),
+    ('store_name', 'store__store_name'),
+    ('order_status', 'order_status'),
+    ('payment_method', 'payment_method'),
+    ('total_amount', 'total_amount'),
+    ('payment_amount', 'payment__amount'),
+    ('transaction_id', 'payment__transaction_id'),
+    ('payment_date', 'payment__payment_date'),
+]
+ORDER_DETAIL_COLUMNS = [
+    ('id', 'id'),
+    ('order_id', 'order_id'),
+    ('order_date', 'order__order_date'),
+    ('user_id', 'order__user_id'),
+    ('username', 'order__user__username'),
+    ('store_id', 'store_id'),
+    ('order_status', 'order__order_status'),
+    ('product_id', 'product_id'),
+    ('product_name', 'product__product_name'),
+    ('quantity', 'quantity'),
+    ('price', 'price'),
+    ('note', 'note'),
+    ('payment_method', 'order__payment_method'),
+    ('payment_amount', 'order__payment__amount'),
+    ('transaction_id', 'order__payment__transaction_id'),
+    ('payment_date', 'order__payment__payment_date'),
+]
+CSV = 'csv'
+GZIP_CONTENT_TYPE = 'application/gzip'
+
+
+def filter_orders(queryset, store=None, start=None, end=None, prefix='', order_status=None, payment_method=None):
+    """Lọc theo cửa hàng, trạng thái, cách thanh toán và khoảng ngày đặt hàng [start, end] (date); prefix='order__' cho OrderDetail."""
+    if store is not None:
+        queryset = queryset.filter(store=store)
+    if order_status:
+        queryset = queryset.filter(**{f'{prefix}order_status': order_status})
+    if payment_method:
+        queryset = queryset.filter(**{f'{prefix}payment_method': payment_method})
+    if start:
+        queryset = queryset.filter(**{f'{prefix}order_date__gte': timezone.make_aware(datetime.combine(start, time.min))})
+    if end:
+        queryset = queryset.filter(**{f'{prefix}order_date__lt': timezone.make_aware(
+            datetime.combine(end + timedelta(days=1), time.min))})
+    return queryset
+
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return format(value, 'f')
+    return value
+
+
+def export_rows(queryset, columns, format, batch_size=None):
+    """
+    Sinh file CSV/NDJSON theo từng khối bytes từ values_list, mỗi lô một truy vấn theo id tăng dần (keyset).
+    Không dùng iterator(): với MySQL driver vẫn tải cả kết quả vào bộ nhớ, còn keyset giữ bộ nhớ phẳng
+    với hàng triệu dòng và không giữ transaction/cursor mở suốt lúc client tải file.
+    """
+    batch_size = batch_size or settings.ORDER_EXPORT_BATCH_SIZE
+    names = [name for name, _ in columns]
+    writer = csv.writer(Echo())
+    if format == CSV:
+        yield writer.writerow(names).encode('utf-8')
+    rows = queryset.order_by('pk').values_list('pk', *[lookup for _, lookup in columns])
+    batch = list(rows[:batch_size])
+    while batch:
+        if format == CSV:
+            lines = [writer.writerow([export_value(value) for value in row[1:]]) for row in batch]
+        else:
+            lines = [json.dumps(dict(zip(names, map(export_value, row[1:]))), ensure_ascii=False) + '\n'
+                     for row in batch]
+        yield ''.join(lines).encode('utf-8')
+        # Lô cuối chưa đầy thì không cần thêm một truy vấn rỗng
+        batch = list(rows.filter(pk__gt=batch[-1][0])[:batch_size]) if len(batch) == batch_size else []
+
+
+def gzip_chunks(chunks, level=6):
+    # Nén gzip ngay khi stream (wbits 16+ = định dạng gzip), không cần file tạm
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_response(request, queryset, columns, format, filename, compress=False):
+    chunks = export_rows(queryset, columns, format)
+    filename = f'{filename}.{format}'
+    content_type = CONTENT_TYPES[format]
+    if compress:
+        chunks, filename, content_type = gzip_chunks(chunks), f'{filename}.gz', GZIP_CONTENT_TYPE
+    return streaming_response(request, chunks, content_type, filename)
@@ -0,0 +1,187 @@
+import random
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .caching import bump_version
+from .models import Product, StockReservation, StockShard
+
+
+def take_stock(quantities, shard_counts=None):
+    """
+    Trừ tồn kho cho cả giỏ, chỉ khi mọi sản phẩm còn đủ hàng (không bao giờ âm, không cần khoá trước).
+    shard_counts = {product_id: số shard} của các sản phẩm chia shard. Trả về False khi thiếu hàng;
+    người gọi phải đang trong transaction.atomic() và rollback khi đó vì các sản phẩm trước có thể đã bị trừ.
+    """
+    shard_counts = shard_counts or {}
+    plain = {product_id: quantity for product_id, quantity in quantities.items() if product_id not in shard_counts}
+    if plain:
+        # Một câu UPDATE cho mọi sản phẩm thường, chỉ trên các dòng còn đủ hàng
+        enough_stock = Q()
+        for product_id, quantity in plain.items():
+            enough_stock |= Q(pk=product_id, stock__gte=quantity)
+        updated = Product.objects.filter(enough_stock).update(stock=Case(
+            *[When(pk=product_id, then=F('stock') - quantity) for product_id, quantity in plain.items()],
+            default=F('stock'),
+        ))
+        if updated != len(plain):
+            return False
+    # Theo thứ tự id để hai giỏ cùng chứa các sản phẩm này khoá shard theo cùng thứ tự
+    for product_id in sorted(quantities.keys() & shard_counts.keys()):
+        if not take_from_shards(product_id, quantities[product_id], shard_counts[product_id]):
+            return False
+    return True
+
+
+def take_from_shards(product_id, quantity, shards):
+    # Bắt đầu từ một shard ngẫu nhiên: các request đồng thời rải ra nhiều dòng thay vì cùng chờ một dòng
+    start = random.randrange(shards)
+    for offset in range(shards):
+        shard = (start + offset) % shards
+        if StockShard.objects.filter(product_id=product_id, shard=shard, stock__gte=quantity).update(
+                stock=F('stock') - quantity):
+            return True
+    # Không shard nào đủ một mình (gần hết hàng): khoá mọi shard của sản phẩm rồi gom từ nhiều shard
+    locked = list(StockShard.objects.select_for_update().filter(product_id=product_id, stock__gt=0)
+                  .order_by('shard').values_list('pk', 'stock'))
+    if sum(stock for _, stock in locked) < quantity:
+        return False
+    remaining = quantity
+    for pk, stock in locked:
+        taken = min(stock, remaining)
+        StockShard.objects.filter(pk=pk).update(stock=F('stock') - taken)
+        remaining -= taken
+        if not remaining:
+            break
+    return True
+
+
+def restore_stock(quantities):
+    """Trả hàng về kho; với sản phẩm chia shard, hàng trả về một shard ngẫu nhiên (tồn kho không phân biệt shard)."""
+    shard_counts = dict(Product.objects.filter(pk__in=quantities, stock_shards__gt=0)
+                        .values_list('pk', 'stock_shards'))
+    plain = {product_id: quantity for product_id, quantity in quantities.items() if product_id not in shard_counts}
+    if plain:
+        Product.objects.filter(pk__in=plain).update(stock=Case(
+            *[When(pk=product_id, then=F('stock') + quantity) for product_id, quantity in plain.items()],
+            default=F('stock'),
+        ))
+    for product_id, shards in sorted(shard_counts.items()):
+        StockShard.objects.filter(product_id=product_id, shard=random.randrange(shards)).update(
+            stock=F('stock') + quantities[product_id])
+
+
+def hold(user, items):
+    """
+    Giữ hàng cho giỏ đang thanh toán: tồn kho bị trừ ngay, mỗi sản phẩm một StockReservation (held)
+    hết hạn sau RESERVATION_TTL giây. Hàng được trả lại khi release_reservations() hoặc expire_reservations().
+    """
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item['product']] += item['quantity']
+
+    shard_counts = dict(Product.objects.filter(pk__in=quantities, active=True).values_list('pk', 'stock_shards'))
+    missing = [product_id for product_id in quantities if product_id not in shard_counts]
+    if missing:
+        raise ValidationError({'items': [f'Product {product_id} does not exist.' for product_id in missing]})
+    shard_counts = {product_id: shards for product_id, shards in shard_counts.items() if shards}
+
+    for attempt in range(2):
+        with transaction.atomic():
+            if take_stock(quantities, shard_counts):
+                expires_at = timezone.now() + timedelta(seconds=settings.RESERVATION_TTL)
+                # create() từng dòng thay vì bulk_create để có id trên MySQL; mỗi giỏ chỉ vài sản phẩm
+                return [StockReservation.objects.create(user=user, product_id=product_id, quantity=quantity,
+                                                        expires_at=expires_at)
+                        for product_id, quantity in sorted(quantities.items())]
+            transaction.set_rollback(True)
+        # Hết hàng: có thể còn hàng nằm trong reservation đã quá hạn mà chưa được dọn, trả về rồi thử lại một lần
+        if attempt or not expire_reservations(product_ids=list(quantities)):
+            break
+    raise ValidationError({'items': ['Some products are out of stock.']})
+
+
+def release_reservations(queryset, status=StockReservation.RELEASED, skip_locked=False, limit=None):
+    """Chuyển các reservation còn held trong queryset sang status và trả hàng về kho; trả về số reservation."""
+    with transaction.atomic():
+        rows = (queryset.filter(status=StockReservation.HELD).select_for_update(skip_locked=skip_locked)
+                .order_by('pk').values_list('pk', 'product_id', 'quantity'))
+        rows = list(rows[:limit] if limit else rows)
+        if not rows:
+            return 0
+        StockReservation.objects.filter(pk__in=[pk for pk, _, _ in rows]).update(status=status,
+                                                                                 updated_at=timezone.now())
+        quantities = defaultdict(int)
+        for _, product_id, quantity in rows:
+            quantities[product_id] += quantity
+        restore_stock(quantities)
+    return len(rows)
+
+
+def expire_reservations(product_ids=None, batch_size=1000):
+    # skip_locked: nhiều worker dọn cùng lúc không chờ nhau, reservation đang được thanh toán cũng không bị chặn
+    queryset = StockReservation.objects.filter(expires_at__lte=timezone.now())
+    if product_ids is not None:
+        queryset = queryset.filter(product_id__in=product_ids)
+    expired = 0
+    while True:
+        count = release_reservations(queryset, StockReservation.EXPIRED, skip_locked=True, limit=batch_size)
+        expired += count
+        if count < batch_size:
+            return expired
+
+
+def lock_reservations(user, reservation_ids):
+    """Khoá các reservation còn hiệu lực của user để thanh toán; trả về [(id, product_id, quantity)]."""
+    rows = list(StockReservation.objects.select_for_update().filter(
+        pk__in=reservation_ids, user=user, status=StockReservation.HELD, expires_at__gt=timezone.now(),
+    ).order_by('pk').values_list('pk', 'product_id', 'quantity'))
+    if len(rows) != len(set(reservation_ids)):
+        raise ValidationError({'reservations': ['Some reservations have expired or do not exist.']})
+    return rows
+
+
+def commit_reservations(reservation_ids, order):
+    StockReservation.objects.filter(pk__in=reservation_ids).update(status=StockReservation.COMMITTED, order=order,
+                                                                   updated_at=timezone.now())
+
+
+def set_stock(product_id, stock, shards):
+    """Đặt tồn kho của sản phẩm và chia đều vào `shards` shard (0 = bỏ chia shard, tồn kho nằm ở Product.stock)."""
+    with transaction.atomic():
+        list(StockShard.objects.select_for_update().filter(product_id=product_id).values_list('pk'))
+        StockShard.objects.filter(product_id=product_id).delete()
+        if shards:
+            base, extra = divmod(stock, shards)
+            StockShard.objects.bulk_create([StockShard(product_id=product_id, shard=shard,
+                                                       stock=base + (shard < extra)) for shard in range(shards)])
+        Product.objects.filter(pk=product_id).update(stock=stock, stock_shards=shards)
+    bump_version('product')
+
+
+def reshard(product_id, shards):
+    """Bật/tắt hoặc đổi số shard của sản phẩm, giữ nguyên tổng tồn kho hiện có."""
+    with transaction.atomic():
+        product = Product.objects.select_for_update().only('stock', 'stock_shards').get(pk=product_id)
+        stock = product.stock
+        if product.stock_shards:
+            # Khoá rồi cộng trong Python: FOR UPDATE không dùng được cùng hàm gộp (PostgreSQL)
+            stock = sum(StockShard.objects.select_for_update().filter(product_id=product_id)
+                        .values_list('stock', flat=True))
+        set_stock(product_id, stock, shards)
+
+
+def sync_sharded_stock():
+    """Ghi tổng các shard vào Product.stock để danh sách/tìm kiếm hiển thị tồn kho gần đúng."""
+    totals = (StockShard.objects.filter(product=OuterRef('pk')).order_by().values('product')
+              .annotate(total=Sum('stock')).values('total'))
+    updated = Product.objects.filter(stock_shards__gt=0).update(stock=Coalesce(Subquery(totals), 0))
+    if updated:
+        bump_version('product')
+    return updated
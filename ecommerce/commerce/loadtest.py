@@ -0,0 +1,340 @@
+import asyncio
+import contextvars
+import json
+import random
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from secrets import token_urlsafe
+from urllib.parse import urlencode
+
+from asgiref.sync import sync_to_async
+from django.db import connection
+from django.db.backends.signals import connection_created
+from django.db.models import Count
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+
+from .models import Category, Order, Product, Store
+from .search import tokenize
+
+Request = namedtuple('Request', 'method path query body user')
+
+
+def browse(samples, rng):
+    return Request('GET', '/products/', {'ordering': rng.choice(['-created_at', 'price', '-rating_avg'])}, None, None)
+
+
+def browse_category(samples, rng):
+    return Request('GET', f'/products-category/{rng.choice(samples["categories"])}/', {}, None, None)
+
+
+def browse_store(samples, rng):
+    return Request('GET', f'/products-store/{rng.choice(samples["stores"])}/', {}, None, None)
+
+
+def search(samples, rng):
+    return Request('GET', '/products/', {'search': rng.choice(samples['terms'])}, None, None)
+
+
+def product_detail(samples, rng):
+    return Request('GET', f'/products/{rng.choice(samples["products"])}/', {'expand': 'true'}, None, None)
+
+
+def pending_cart(samples, rng):
+    return Request('GET', '/pending-order-details/', {}, None, rng.choice(samples['customers']))
+
+
+def checkout(samples, rng):
+    items = [{'product': product, 'quantity': 1} for product in rng.sample(samples['products'], 2)]
+    return Request('POST', '/checkout/', {}, {'items': items, 'payment_method': 'momo'},
+                   rng.choice(samples['customers']))
+
+
+def seller_statistics(samples, rng):
+    return Request('GET', '/seller-statistics/', {}, None, rng.choice(samples['sellers']))
+
+
+# (tên endpoint, trọng số, hàm sinh request) - trọng số gần với tỉ lệ traffic thật của trang thương mại điện tử
+TRAFFIC_MIX = [
+    ('browse', 25, browse),
+    ('browse-category', 10, browse_category),
+    ('browse-store', 5, browse_store),
+    ('search', 20, search),
+    ('product-detail', 25, product_detail),
+    ('pending-cart', 8, pending_cart),
+    ('checkout', 4, checkout),
+    ('seller-statistics', 3, seller_statistics),
+]
+
+# Endpoint có bản async trong async_views.py, gọi qua tiền tố /async khi bật async_reads
+ASYNC_ENDPOINTS = {'browse', 'browse-category', 'browse-store', 'search', 'product-detail'}
+
+# Trạng thái của request đang chạy, được asgiref chép sang thread chạy view đồng bộ
+current_request = contextvars.ContextVar('loadtest_request', default=None)
+
+
+class ConnectionTracker:
+    """Đếm số kết nối DB đang được giữ bởi request (với CONN_MAX_AGE=0 mỗi request mở một kết nối riêng)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = 0
+        self.peak = 0
+
+    def connection_created(self, sender, connection, **kwargs):
+        state = current_request.get()
+        if state is None:
+            return
+        with self.lock:
+            state['connections'] += 1
+            self.open += 1
+            self.peak = max(self.peak, self.open)
+
+    def release(self, state):
+        with self.lock:
+            self.open -= state['connections']
+
+
+def load_samples(customers=100, sellers=50, size=1000):
+    products = list(Product.objects.filter(active=True, stock__gt=0).values_list('pk', flat=True)[:size])
+    names = Product.objects.filter(pk__in=products[:200]).values_list('product_name', flat=True)
+    customer_ids = (Order.objects.values('user_id').annotate(orders=Count('id')).order_by('-orders')
+                    .values_list('user_id', flat=True)[:customers])
+    seller_ids = Store.objects.filter(active=True).values_list('user_id', flat=True)[:sellers]
+    return {
+        'products': products,
+        'stores': list(Store.objects.filter(active=True).values_list('pk', flat=True)[:size]),
+        'categories': list(Category.objects.values_list('pk', flat=True)[:size]),
+        'terms': sorted({token for name in names for token in tokenize(name) if len(token) > 2}),
+        'customers': list(customer_ids),
+        'sellers': list(seller_ids),
+    }
+
+
+def issue_tokens(user_ids, lifetime=timedelta(hours=1)):
+    # Token OAuth2 tạm cho các user ảo, xoá sau khi chạy xong
+    expires = timezone.now() + lifetime
+    return {user_id: AccessToken.objects.create(user_id=user_id, token=token_urlsafe(30), expires=expires,
+                                                scope='read write').token
+            for user_id in user_ids}
+
+
+def revoke_tokens(tokens):
+    AccessToken.objects.filter(token__in=list(tokens.values())).delete()
+
+
+def percentile(timings, p):
+    if len(timings) < 2:
+        return timings[0] if timings else None
+    return statistics.quantiles(timings, n=100, method='inclusive')[p - 1]
+
+
+class ASGIClient:
+    """Gọi thẳng ASGI application trong cùng process, không qua socket."""
+
+    def __init__(self, application, host='localhost'):
+        self.application = application
+        self.host = host
+
+    async def request(self, method, path, query, body, headers):
+        payload = json.dumps(body).encode('utf-8') if body is not None else b''
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'scheme': 'http',
+            'method': method, 'path': path, 'raw_path': path.encode('utf-8'), 'root_path': '',
+            'query_string': urlencode(query).encode('utf-8'),
+            'headers': [(b'host', self.host.encode('ascii')), (b'content-type', b'application/json'),
+                        (b'content-length', str(len(payload)).encode('ascii'))]
+                       + [(name.lower().encode('ascii'), value.encode('ascii')) for name, value in headers.items()],
+            'client': ('127.0.0.1', 0), 'server': (self.host, 80),
+        }
+        messages = [{'type': 'http.request', 'body': payload, 'more_body': False}]
+        done = asyncio.Event()
+        response = {'status': None, 'body': []}
+
+        async def receive():
+            if messages:
+                return messages.pop(0)
+            await done.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+                if not message.get('more_body'):
+                    done.set()
+
+        await self.application(scope, receive, send)
+        done.set()
+        return response['status'], b''.join(response['body'])
+
+
+class HTTPClient:
+    """Gọi server đang chạy trên localhost (uvicorn/daphne...) qua urllib trong thread pool."""
+
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    async def request(self, method, path, query, body, headers):
+        return await asyncio.to_thread(self.send, method, path, query, body, headers)
+
+    def send(self, method, path, query, body, headers):
+        url = self.base_url + path + ('?' + urlencode(query) if query else '')
+        data = json.dumps(body).encode('utf-8') if body is not None else None
+        request = urllib.request.Request(url, data=data, method=method,
+                                         headers=dict(headers, **{'Content-Type': 'application/json'}))
+        try:
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.read()
+        except OSError:
+            return 599, b''
+
+
+class LoadTest:
+    """
+    Chạy N user ảo song song, mỗi user lặp: chọn endpoint theo trọng số trong mix, gửi request, nghỉ think_time.
+    Ghi lại độ trễ, mã lỗi và số kết nối DB mỗi request đã mở cho từng endpoint.
+    """
+
+    def __init__(self, client, samples, tokens, mix=TRAFFIC_MIX, users=50, duration=30, think_time=0,
+                 ramp_up=0, seed=0, async_reads=False):
+        self.client = client
+        self.samples = samples
+        self.tokens = tokens
+        self.mix = [entry for entry in mix if entry[1] > 0]
+        self.users = users
+        self.duration = duration
+        self.think_time = think_time
+        self.ramp_up = ramp_up
+        self.seed = seed
+        self.async_reads = async_reads
+        self.tracker = ConnectionTracker()
+        self.timings = {name: [] for name, _, _ in self.mix}
+        self.statuses = {name: Counter() for name, _, _ in self.mix}
+        self.connections = Counter()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.server_connections = []
+
+    def run(self):
+        # Thread pool đủ lớn để view đồng bộ và HTTPClient không bị giới hạn bởi executor mặc định
+        connection_created.connect(self.tracker.connection_created)
+        try:
+            return asyncio.run(self.main())
+        finally:
+            connection_created.disconnect(self.tracker.connection_created)
+
+    async def main(self):
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=self.users + 4))
+        self.started = time.perf_counter()
+        self.deadline = self.started + self.duration
+        sampler = asyncio.create_task(self.sample_server_connections())
+        await asyncio.gather(*(self.virtual_user(i) for i in range(self.users)))
+        elapsed = time.perf_counter() - self.started
+        sampler.cancel()
+        return self.report(elapsed)
+
+    async def virtual_user(self, index):
+        rng = random.Random(self.seed * 100003 + index)
+        names = [name for name, _, _ in self.mix]
+        weights = [weight for _, weight, _ in self.mix]
+        builders = {name: builder for name, _, builder in self.mix}
+        if self.ramp_up:
+            await asyncio.sleep(self.ramp_up * index / self.users)
+        while time.perf_counter() < self.deadline:
+            name = rng.choices(names, weights)[0]
+            await self.call(name, builders[name](self.samples, rng))
+            if self.think_time:
+                await asyncio.sleep(rng.expovariate(1 / self.think_time))
+
+    async def call(self, name, request):
+        headers = {}
+        if request.user is not None:
+            headers['Authorization'] = f'Bearer {self.tokens[request.user]}'
+        path = request.path
+        if self.async_reads and name in ASYNC_ENDPOINTS:
+            path = '/async' + path
+        state = {'connections': 0}
+        token = current_request.set(state)
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+        start = time.perf_counter()
+        try:
+            status, _ = await self.client.request(request.method, path, request.query, request.body, headers)
+        except Exception:
+            status = 599
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            self.in_flight -= 1
+            current_request.reset(token)
+            self.tracker.release(state)
+        self.timings[name].append(elapsed)
+        self.statuses[name][status] += 1
+        self.connections[name] += state['connections']
+
+    async def sample_server_connections(self, interval=0.5):
+        # Chỉ MySQL báo được số kết nối phía server; SQLite dựa vào ConnectionTracker
+        if connection.vendor != 'mysql':
+            return
+        # thread_sensitive: mọi lần lấy mẫu chạy trên cùng một thread nên dùng lại một kết nối; thread_sensitive=False
+        # mở kết nối mới trên mỗi thread của executor và không đóng, làm tăng chính Threads_connected đang đo
+        query = sync_to_async(self.mysql_status, thread_sensitive=True)
+        self.max_connections = (await query("SHOW VARIABLES LIKE 'max_connections'"))
+        while True:
+            self.server_connections.append(await query("SHOW GLOBAL STATUS LIKE 'Threads_connected'"))
+            await asyncio.sleep(interval)
+
+    def mysql_status(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            return int(cursor.fetchone()[1])
+
+    def report(self, elapsed):
+        endpoints = {}
+        for name, timings in self.timings.items():
+            if not timings:
+                continue
+            statuses = self.statuses[name]
+            errors = sum(count for status, count in statuses.items() if status >= 400)
+            endpoints[name] = {
+                'requests': len(timings),
+                'throughput_rps': len(timings) / elapsed,
+                'p50_ms': percentile(timings, 50),
+                'p95_ms': percentile(timings, 95),
+                'p99_ms': percentile(timings, 99),
+                'mean_ms': statistics.fmean(timings),
+                'errors': errors,
+                'error_rate': errors / len(timings),
+                'statuses': {str(status): count for status, count in sorted(statuses.items())},
+                'db_connections_per_request': self.connections[name] / len(timings),
+            }
+        total = sum(result['requests'] for result in endpoints.values())
+        errors = sum(result['errors'] for result in endpoints.values())
+        database = {
+            'vendor': connection.vendor,
+            'peak_connections': self.tracker.peak,
+            'peak_in_flight': self.peak_in_flight,
+        }
+        if self.server_connections:
+            database.update(server_peak_connections=max(self.server_connections),
+                            max_connections=self.max_connections,
+                            saturation=max(self.server_connections) / self.max_connections)
+        return {
+            'users': self.users,
+            'async_reads': self.async_reads,
+            'duration_s': elapsed,
+            'requests': total,
+            'throughput_rps': total / elapsed if elapsed else 0,
+            'error_rate': errors / total if total else 0,
+            'database': database,
+            'endpoints': endpoints,
+        }
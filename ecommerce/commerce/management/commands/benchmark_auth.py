@@ -0,0 +1,79 @@
+import time
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from oauth2_provider.contrib.rest_framework import OAuth2Authentication
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+
+from commerce.authentication import CachedOAuth2Authentication, invalidate_tokens, token_checksum
+from commerce.loadtest import issue_tokens, percentile, revoke_tokens
+from commerce.models import Order
+
+ENDPOINTS = ['/order/', '/pending-order-details/', '/user/current_user/']
+MODES = [('db', OAuth2Authentication), ('cached', CachedOAuth2Authentication)]
+
+
+class Command(BaseCommand):
+    help = ('So sánh xác thực OAuth2 truy vấn DB mỗi request với CachedOAuth2Authentication '
+            'trên các endpoint cần đăng nhập, bằng header Authorization thật (dùng sau seed_data)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        customer = Order.objects.values('user_id').annotate(orders=Count('id')).order_by('-orders').first()
+        if customer is None:
+            raise CommandError('Chưa có dữ liệu, hãy chạy seed_data trước.')
+        tokens = issue_tokens([customer['user_id']])
+        token = tokens[customer['user_id']]
+        client = APIClient(HTTP_AUTHORIZATION=f'Bearer {token}')
+        try:
+            self.stdout.write(f'{"endpoint":<28}{"mode":<8}{"p50 ms":>9}{"p95 ms":>9}{"auth ms":>9}{"queries":>9}')
+            for url in ENDPOINTS:
+                results = {}
+                for mode, authentication_class in MODES:
+                    invalidate_tokens([token_checksum(token)])
+                    with mock.patch.object(APIView, 'authentication_classes', [authentication_class]):
+                        results[mode] = self.measure(client, url, options['repeat'])
+                    results[mode]['auth_ms'] = self.measure_authentication(authentication_class, url, token,
+                                                                           options['repeat'])
+                    self.stdout.write(f'{url:<28}{mode:<8}{results[mode]["p50_ms"]:>9.2f}'
+                                      f'{results[mode]["p95_ms"]:>9.2f}{results[mode]["auth_ms"]:>9.3f}'
+                                      f'{results[mode]["queries"]:>9}')
+                db, cached = results['db'], results['cached']
+                self.stdout.write(f'{"":<28}p50 {db["p50_ms"] - cached["p50_ms"]:+.2f}ms, authentication '
+                                  f'{db["auth_ms"] / cached["auth_ms"]:.1f}x faster, '
+                                  f'{db["queries"] - cached["queries"]} queries fewer per request')
+        finally:
+            revoke_tokens(tokens)
+
+    def measure(self, client, url, repeat):
+        # Hai request đầu (nạp cache token, rồi LRU user của process) không tính
+        client.get(url)
+        client.get(url)
+        timings, queries = [], 0
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            if response.status_code != 200:
+                raise CommandError(f'{url}: status {response.status_code}')
+            queries = max(queries, len(captured))
+        return {'p50_ms': percentile(timings, 50), 'p95_ms': percentile(timings, 95), 'queries': queries}
+
+    def measure_authentication(self, authentication_class, url, token, repeat):
+        # Chỉ đo bước xác thực (p50), không lẫn thời gian của view và middleware
+        request = Request(APIRequestFactory().get(url, HTTP_AUTHORIZATION=f'Bearer {token}'))
+        authentication = authentication_class()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            authentication.authenticate(request)
+            timings.append((time.perf_counter() - start) * 1000)
+        return percentile(timings, 50)
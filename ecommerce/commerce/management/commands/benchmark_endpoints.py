@@ -0,0 +1,174 @@
+import json
+import re
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from commerce.caching import get_response_cache
+from commerce.models import Category, Order, Product, Store, User
+from commerce.urls import router
+
+# Ngân sách mặc định cho mỗi endpoint, ghi đè riêng trong BUDGETS hoặc bằng --baseline
+DEFAULT_BUDGET = {'p95_ms': 500, 'queries': 15}
+BUDGETS = {
+    'category-tree': {'p95_ms': 1000},
+    'seller-statistics-list': {'p95_ms': 1000},
+    'checkout-create': {'p95_ms': 1000},
+}
+# Các endpoint cũ trả toàn bộ bảng không phân trang, chỉ đo để theo dõi
+UNPAGINATED = {'pending-order-details-list', 'product-image-list', 'productvariant-list', 'review-list',
+               'payment-list', 'store-by-user-list', 'similar-products-list'}
+# Đo bằng người bán của cửa hàng nhiều đơn nhất; order/order-detail trả hộp đơn của cửa hàng
+SELLER_ENDPOINTS = {'seller-statistics-list', 'store-by-user-list', 'product-import-list', 'product-export-list',
+                    'order-list', 'order-detail-list', 'order-export-list'}
+# Endpoint stream cả catalog/đơn hàng của cửa hàng, số truy vấn tăng theo số lô
+STREAMING = {'product-export-list', 'order-export-list'}
+
+
+class Command(BaseCommand):
+    help = ('Đo p50/p95/p99 và số truy vấn của mọi route trong commerce/urls.py, '
+            'fail nếu vượt ngân sách (dùng sau seed_data, chạy được trên SQLite lẫn MySQL)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warm', action='store_true', help='Giữ cache giữa các lần gọi (mặc định xoá cache)')
+        parser.add_argument('--only', nargs='*', default=[], help='Chỉ đo các endpoint có tên chứa chuỗi này')
+        parser.add_argument('--baseline', help='File JSON kết quả lần trước, dùng làm ngân sách')
+        parser.add_argument('--tolerance', type=float, default=1.2,
+                            help='Hệ số cho phép so với baseline (1.2 = chậm hơn tối đa 20%%)')
+        parser.add_argument('--output', help='Ghi kết quả ra file JSON')
+
+    def handle(self, *args, **options):
+        samples = self.sample_ids()
+        if samples is None:
+            raise CommandError('Chưa có dữ liệu, hãy chạy seed_data trước.')
+        baseline = {}
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                baseline = json.load(f)
+
+        results, failures = {}, []
+        self.stdout.write(f'{"endpoint":<40}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"queries":>9}  budget')
+        for name, method, url, data, user in self.endpoints(samples):
+            if options['only'] and not any(part in name for part in options['only']):
+                continue
+            result = self.measure(method, url, data, user, options['repeat'], options['warm'])
+            budget = self.get_budget(name, baseline, options['tolerance'])
+            errors = self.check(result, budget)
+            results[name] = dict(result, url=url)
+            failures += [f'{name}: {error}' for error in errors]
+            status = self.style.ERROR('FAIL') if errors else self.style.SUCCESS('ok')
+            self.stdout.write(f'{name:<40}{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}{result["p99_ms"]:>9.1f}'
+                              f'{result["queries"]:>9}  {status}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2)
+        if failures:
+            raise CommandError('Vượt ngân sách hiệu năng:\n' + '\n'.join(failures))
+
+    def sample_ids(self):
+        # Lấy các bản ghi "nặng" nhất để đo trường hợp xấu
+        store = Store.objects.annotate(orders=Count('order')).order_by('-orders').first()
+        product = Product.objects.filter(active=True, stock__gt=0).annotate(reviews=Count('review')).order_by('-reviews').first()
+        order = Order.objects.values('user_id').annotate(orders=Count('id')).order_by('-orders').first()
+        if not (store and product and order):
+            return None
+        return {
+            'store_id': store.pk,
+            'product_id': product.pk,
+            'category_id': product.category_id or Category.objects.values_list('pk', flat=True).first(),
+            'user_id': store.user_id,
+            'seller': store.user,
+            'customer': User.objects.get(pk=order['user_id']),
+        }
+
+    def endpoints(self, samples):
+        """Sinh (tên, method, url, query, user) cho list, retrieve và các action GET của từng viewset."""
+        for prefix, viewset, basename in router.registry:
+            kwargs = {name: samples[name] for name in re.findall(r'\(\?P<(\w+)>', prefix)}
+            prefix = re.sub(r'\(\?P<(\w+)>[^)]*\)', lambda match: str(samples[match.group(1)]), prefix)
+            user = samples['seller'] if f'{basename}-list' in SELLER_ENDPOINTS else samples['customer']
+            if user == samples['seller']:
+                # Bản ghi mẫu phải thuộc cửa hàng của người bán, route chỉ thấy dữ liệu của cửa hàng
+                kwargs.setdefault('store_id', samples['store_id'])
+            data = {'product_id': samples['product_id']} if basename == 'similar-products' else {}
+
+            if hasattr(viewset, 'list'):
+                yield f'{basename}-list', 'get', f'/{prefix}/', data, user
+            pk = self.sample_pk(viewset, kwargs)
+            if hasattr(viewset, 'retrieve') and pk is not None:
+                yield f'{basename}-detail', 'get', f'/{prefix}/{pk}/', data, user
+            for extra in viewset.get_extra_actions():
+                if 'get' in extra.mapping:
+                    url = f'/{prefix}/{pk}/{extra.url_path}/' if extra.detail else f'/{prefix}/{extra.url_path}/'
+                    yield f'{basename}-{extra.url_name}', 'get', url, data, user
+            if basename == 'checkout':
+                yield 'checkout-create', 'post', f'/{prefix}/', {
+                    'items': [{'product': samples['product_id'], 'quantity': 1}], 'payment_method': 'momo',
+                }, user
+
+    def sample_pk(self, viewset, kwargs):
+        queryset = getattr(viewset, 'queryset', None)
+        if queryset is None:
+            return None
+        # Route lồng (store-user/<user_id>/<pk>) chỉ tìm thấy bản ghi thuộc đối tượng cha
+        fields = {field.attname for field in queryset.model._meta.concrete_fields}
+        queryset = queryset.filter(**{name: value for name, value in kwargs.items() if name in fields})
+        return queryset.order_by('pk').values_list('pk', flat=True).first()
+
+    def measure(self, method, url, data, user, repeat, warm):
+        client = APIClient()
+        client.force_authenticate(user)
+        timings, queries, status_code = [], 0, None
+        for _ in range(repeat):
+            if not warm:
+                # Chỉ xoá cache response của catalog, không đụng phiên bản/token/số đếm trong cache 'default'
+                get_response_cache().clear()
+            # Request ghi (checkout) chạy trong transaction rồi rollback để không làm bẩn dữ liệu
+            with transaction.atomic(), CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                response = getattr(client, method)(url, data, format='json' if method == 'post' else None)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                timings.append((time.perf_counter() - start) * 1000)
+                transaction.set_rollback(True)
+            queries = max(queries, len(captured))
+            status_code = response.status_code
+        return {
+            'status': status_code,
+            'p50_ms': self.percentile(timings, 50),
+            'p95_ms': self.percentile(timings, 95),
+            'p99_ms': self.percentile(timings, 99),
+            'queries': queries,
+        }
+
+    def percentile(self, timings, p):
+        if len(timings) < 2:
+            return timings[0]
+        return statistics.quantiles(timings, n=100, method='inclusive')[p - 1]
+
+    def get_budget(self, name, baseline, tolerance):
+        budget = dict(DEFAULT_BUDGET, **BUDGETS.get(name, {}))
+        if name in UNPAGINATED:
+            budget = {'queries': None, 'p95_ms': None}
+        if name in STREAMING:
+            budget['queries'] = None
+        if name in baseline:
+            budget = {'p95_ms': baseline[name]['p95_ms'] * tolerance, 'queries': baseline[name]['queries']}
+        return budget
+
+    def check(self, result, budget):
+        errors = []
+        if result['status'] >= 400:
+            errors.append(f'status {result["status"]}')
+        if budget['p95_ms'] is not None and result['p95_ms'] > budget['p95_ms']:
+            errors.append(f'p95 {result["p95_ms"]:.1f}ms > {budget["p95_ms"]:.1f}ms')
+        if budget['queries'] is not None and result['queries'] > budget['queries']:
+            errors.append(f'{result["queries"]} queries > {budget["queries"]}')
+        return errors
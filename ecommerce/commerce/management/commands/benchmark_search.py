@@ -0,0 +1,59 @@
+import statistics
+import time
+from types import SimpleNamespace
+
+from django.core.management.base import BaseCommand
+from rest_framework.filters import SearchFilter
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from commerce.models import Product
+from commerce.search import get_backend, tokenize
+
+# search_fields cũ của ProductViewSet, dùng làm mốc so sánh
+LEGACY_SEARCH_FIELDS = ['product_name', 'price', 'store__store_name', 'category__name']
+
+
+class Command(BaseCommand):
+    help = 'So sánh thời gian tìm kiếm giữa SearchFilter (icontains) và SEARCH_BACKEND'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help='Từ khoá cần đo, mặc định lấy từ tên sản phẩm')
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=20, help='Số kết quả mỗi trang')
+
+    def handle(self, *args, **options):
+        queries = options['queries'] or self.sample_queries()
+        if not queries:
+            self.stderr.write('Không có sản phẩm để lấy từ khoá, hãy truyền queries.')
+            return
+
+        backend = get_backend()
+        queryset = Product.objects.filter(active=True)
+        limit = options['limit']
+        self.stdout.write(f'{"query":<24}{"legacy ms":>12}{"backend ms":>12}{"legacy hits":>13}{"backend hits":>14}')
+        for query in queries:
+            legacy = self.legacy_search(queryset, query)
+            ranked = backend.search(queryset, query)
+            legacy_ms = self.measure(lambda: list(legacy.values_list('pk', flat=True)[:limit]), options['repeat'])
+            backend_ms = self.measure(lambda: list(ranked.values_list('pk', flat=True)[:limit]), options['repeat'])
+            self.stdout.write(
+                f'{query[:23]:<24}{legacy_ms:>12.2f}{backend_ms:>12.2f}{legacy.count():>13}{ranked.count():>14}'
+            )
+
+    def legacy_search(self, queryset, query):
+        request = Request(APIRequestFactory().get('/', {'search': query}))
+        view = SimpleNamespace(search_fields=LEGACY_SEARCH_FIELDS)
+        return SearchFilter().filter_queryset(request, queryset, view)
+
+    def measure(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return statistics.median(timings)
+
+    def sample_queries(self, size=5):
+        names = Product.objects.order_by('?').values_list('product_name', flat=True)[:size]
+        return [tokens[0] for tokens in map(tokenize, names) if tokens]
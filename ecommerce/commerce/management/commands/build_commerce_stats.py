@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from commerce.dashboard import refresh_stats_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Tính snapshot số liệu cho trang admin commerce-stats (chạy định kỳ bằng cron)'
+
+    def handle(self, *args, **options):
+        snapshot = refresh_stats_snapshot()
+        self.stdout.write(self.style.SUCCESS(f'Built stats snapshot at {snapshot.created_at:%Y-%m-%d %H:%M:%S}.'))
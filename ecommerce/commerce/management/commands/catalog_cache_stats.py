@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from commerce.caching import cache_stats
+
+
+class Command(BaseCommand):
+    help = 'In số lần hit/miss/304 của response cache catalog (worker cộng dồn số đếm mỗi ~10 giây)'
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        ratio = '-' if stats['hit_ratio'] is None else f"{stats['hit_ratio']:.1%}"
+        self.stdout.write(f"hits={stats['hits']} misses={stats['misses']} "
+                          f"not_modified={stats['not_modified']} hit_ratio={ratio}")
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from commerce.similarity import compute_similar_products
+
+
+class Command(BaseCommand):
+    help = ('Tính top-K sản phẩm tương tự (TF-IDF tên/mô tả + danh mục + khoảng giá) cho sản phẩm đã thay đổi và '
+            'các sản phẩm bị ảnh hưởng; chạy thêm --full định kỳ (ví dụ mỗi đêm) vì IDF đổi theo toàn catalog')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=10)
+        parser.add_argument('--full', action='store_true', help='Tính lại toàn bộ thay vì chỉ sản phẩm đã thay đổi')
+
+    def handle(self, *args, **options):
+        count = compute_similar_products(k=options['top_k'], full=options['full'])
+        self.stdout.write(self.style.SUCCESS(f'Refreshed similar products for {count} products.'))
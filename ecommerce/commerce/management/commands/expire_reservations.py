@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from commerce.inventory import expire_reservations, sync_sharded_stock
+
+
+class Command(BaseCommand):
+    help = ('Trả hàng của các reservation quá RESERVATION_TTL về kho và đồng bộ tồn kho hiển thị của sản phẩm '
+            'chia shard; dùng --loop để chạy như một worker riêng')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Lặp lại liên tục, nghỉ --interval giây giữa các lượt')
+        parser.add_argument('--interval', type=float, default=30)
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_reservations()
+            synced = sync_sharded_stock()
+            if expired or synced:
+                self.stdout.write(f'{expired} reservations expired, {synced} sharded products synced')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
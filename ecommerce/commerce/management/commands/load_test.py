@@ -0,0 +1,88 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from commerce.loadtest import TRAFFIC_MIX, ASGIClient, HTTPClient, LoadTest, issue_tokens, load_samples, revoke_tokens
+
+
+class Command(BaseCommand):
+    help = ('Chạy tải song song theo traffic mix (duyệt catalog, tìm kiếm, chi tiết, giỏ hàng, checkout, thống kê) '
+            'trên ASGI application trong process hoặc server localhost, báo throughput, p50/p95/p99, tỉ lệ lỗi '
+            'và mức dùng kết nối DB. Checkout ghi thật vào DB, chỉ chạy trên dữ liệu seed_data.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Số user ảo chạy đồng thời')
+        parser.add_argument('--duration', type=float, default=30, help='Thời gian chạy (giây)')
+        parser.add_argument('--think-time', type=float, default=0, help='Thời gian nghỉ trung bình giữa 2 request (giây)')
+        parser.add_argument('--ramp-up', type=float, default=0, help='Khởi động dần các user trong N giây')
+        parser.add_argument('--url', help='Gọi server đang chạy, ví dụ http://127.0.0.1:8000 (mặc định gọi ASGI trong process)')
+        parser.add_argument('--mix', help='Ghi đè trọng số, ví dụ "browse=50,checkout=0"')
+        parser.add_argument('--async-reads', action='store_true',
+                            help='Gọi bản async (/async/...) của các endpoint catalog để so với bản đồng bộ')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Ghi kết quả ra file JSON')
+        parser.add_argument('--compare', help='File JSON của lần chạy trước để so sánh')
+
+    def handle(self, *args, **options):
+        samples = load_samples()
+        if not (samples['products'] and samples['customers'] and samples['sellers']):
+            raise CommandError('Chưa có dữ liệu, hãy chạy seed_data trước.')
+
+        if options['url']:
+            client = HTTPClient(options['url'])
+        else:
+            from ecommerce.asgi import application
+            client = ASGIClient(application)
+
+        tokens = issue_tokens(set(samples['customers']) | set(samples['sellers']))
+        try:
+            result = LoadTest(client, samples, tokens, mix=self.get_mix(options['mix']), users=options['users'],
+                              duration=options['duration'], think_time=options['think_time'],
+                              ramp_up=options['ramp_up'], seed=options['seed'],
+                              async_reads=options['async_reads']).run()
+        finally:
+            revoke_tokens(tokens)
+
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as f:
+                previous = json.load(f)
+        self.print_report(result, previous)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2)
+
+    def get_mix(self, value):
+        if not value:
+            return TRAFFIC_MIX
+        weights = {}
+        for part in value.split(','):
+            name, _, weight = part.partition('=')
+            weights[name.strip()] = int(weight)
+        unknown = set(weights) - {name for name, _, _ in TRAFFIC_MIX}
+        if unknown:
+            raise CommandError(f'Endpoint không có trong mix: {", ".join(sorted(unknown))}')
+        return [(name, weights.get(name, weight), builder) for name, weight, builder in TRAFFIC_MIX]
+
+    def print_report(self, result, previous=None):
+        self.stdout.write(f'{"endpoint":<20}{"req":>8}{"rps":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+                          f'{"errors":>9}{"db conn":>9}')
+        for name, row in result['endpoints'].items():
+            line = (f'{name:<20}{row["requests"]:>8}{row["throughput_rps"]:>9.1f}{row["p50_ms"]:>9.1f}'
+                    f'{row["p95_ms"]:>9.1f}{row["p99_ms"]:>9.1f}{row["error_rate"]:>9.1%}'
+                    f'{row["db_connections_per_request"]:>9.2f}')
+            before = previous and previous['endpoints'].get(name)
+            if before:
+                line += f'   p95 {row["p95_ms"] - before["p95_ms"]:+.1f}ms, rps {row["throughput_rps"] - before["throughput_rps"]:+.1f}'
+            self.stdout.write(line)
+
+        database = result['database']
+        self.stdout.write(
+            f'\n{result["requests"]} requests in {result["duration_s"]:.1f}s with {result["users"]} users: '
+            f'{result["throughput_rps"]:.1f} req/s, {result["error_rate"]:.1%} errors'
+        )
+        self.stdout.write(f'DB ({database["vendor"]}): peak {database["peak_connections"]} connections held by '
+                          f'requests, peak {database["peak_in_flight"]} requests in flight')
+        if 'saturation' in database:
+            self.stdout.write(f'Server connections: peak {database["server_peak_connections"]} / '
+                              f'{database["max_connections"]} ({database["saturation"]:.0%})')
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from commerce.catalog_io import process_import, requeue_imports
+
+
+class Command(BaseCommand):
+    help = ('Chạy các lần nhập sản phẩm còn pending (hoặc bị treo khi process chết, chạy tiếp từ dòng đã commit); '
+            'dùng --loop để chạy như một worker riêng')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Lặp lại liên tục, nghỉ --interval giây giữa các lượt')
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            for job_id in requeue_imports():
+                job = process_import(job_id)
+                if job is not None:
+                    self.stdout.write(f'Import {job.pk} ({job.status}): {job.processed_rows} rows, '
+                                      f'{job.created_count} created, {job.updated_count} updated, '
+                                      f'{job.error_count} errors')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,35 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+from commerce.models import MediaUpload
+from commerce.uploads import requeue_uploads, run_in_worker
+
+
+class Command(BaseCommand):
+    help = ('Đẩy các upload ảnh còn pending (hoặc bị treo khi process chết) lên MEDIA_UPLOAD_STORAGE; '
+            'dùng --loop để chạy như một worker riêng')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.MEDIA_UPLOAD_CONCURRENCY or 1)
+        parser.add_argument('--retry-failed', action='store_true', help='Chạy lại cả các upload đã failed')
+        parser.add_argument('--loop', action='store_true', help='Lặp lại liên tục, nghỉ --interval giây giữa các lượt')
+        parser.add_argument('--interval', type=float, default=5)
+
+    def handle(self, *args, **options):
+        retry_failed = options['retry_failed']
+        with ThreadPoolExecutor(max_workers=options['workers'], thread_name_prefix='media-upload') as executor:
+            while True:
+                upload_ids = requeue_uploads(retry_failed=retry_failed)
+                retry_failed = False
+                list(executor.map(run_in_worker, upload_ids))
+                if upload_ids:
+                    counts = dict(MediaUpload.objects.filter(pk__in=upload_ids).values_list('status').annotate(
+                        total=Count('id')))
+                    self.stdout.write(f'Processed {len(upload_ids)} uploads: {counts}')
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
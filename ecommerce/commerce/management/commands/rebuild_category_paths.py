@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from commerce.category_tree import rebuild_paths
+from commerce.models import Category
+
+
+class Command(BaseCommand):
+    help = 'Dựng lại materialized path của cây danh mục'
+
+    def handle(self, *args, **options):
+        rebuild_paths(Category)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt paths for {Category.objects.count()} categories.'))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from commerce.rollups import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Xây lại bảng DailySales từ các đơn hàng completed'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--store', type=int, help='Chỉ xây lại cho một store')
+
+    def handle(self, *args, **options):
+        count = rebuild_daily_sales(store_id=options['store'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} daily sales rows.'))
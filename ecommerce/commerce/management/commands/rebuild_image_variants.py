@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from commerce.media import MEDIA_FIELDS, rebuild_image_variants, url_cache_info
+
+
+class Command(BaseCommand):
+    help = 'Sinh lại URL các preset ảnh (thumb/card/full) và srcset lưu sẵn cho avatar, wallpaper và ảnh sản phẩm'
+
+    def handle(self, *args, **options):
+        for model in MEDIA_FIELDS:
+            updated = rebuild_image_variants(model)
+            self.stdout.write(f'  {model.__name__}: {updated} rows')
+        info = url_cache_info()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt image variants ({info.currsize} URLs built).'))
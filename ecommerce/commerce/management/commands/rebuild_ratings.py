@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from commerce.models import Product, Review, Store
+from commerce.ratings import rebuild_ratings
+
+
+class Command(BaseCommand):
+    help = 'Tính lại rating_sum/rating_count/rating_avg và histogram số sao của Product và Store từ bảng Review'
+
+    def handle(self, *args, **options):
+        products = rebuild_ratings(Review, Product, 'product')
+        stores = rebuild_ratings(Review, Store, 'store')
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt ratings for {products} products and {stores} stores.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from commerce.models import Product
+from commerce.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Xây lại chỉ mục tìm kiếm sản phẩm theo SEARCH_BACKEND'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.index_products(Product.objects.all())
+        self.stdout.write(self.style.SUCCESS(f'Indexed {Product.objects.count()} products with {type(backend).__name__}.'))
@@ -0,0 +1,192 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from commerce.models import Category, Order, OrderDetail, Payment, Product, ProductVariant, Review, Store, User
+from commerce.orders import rebuild_item_counts
+
+WORDS = ['Áo', 'Quần', 'Giày', 'Túi', 'Điện thoại', 'Tai nghe', 'Sạc', 'Ốp lưng', 'Bàn phím', 'Chuột', 'Sách',
+         'Nồi', 'Chảo', 'Bình', 'Đồng hồ', 'Kính', 'Mũ', 'Ví', 'Balo', 'Đèn']
+ADJECTIVES = ['cao cấp', 'giá rẻ', 'chính hãng', 'thời trang', 'mini', 'không dây', 'chống nước', 'nam', 'nữ',
+              'trẻ em', 'loại 1', 'nhập khẩu']
+STATUSES = [status for status, _ in Order.ORDER_STATUS_CHOICES]
+PAYMENT_METHODS = [method for method, _ in Order.PAYMENT_METHOD_CHOICES]
+SIZES = ['S', 'M', 'L', 'XL']
+COLORS = ['Đỏ', 'Xanh', 'Đen', 'Trắng', 'Vàng']
+
+
+class Command(BaseCommand):
+    help = 'Sinh dữ liệu giả lập số lượng lớn bằng bulk_create theo lô, để đo hiệu năng các endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stores', type=int, default=1000)
+        parser.add_argument('--customers', type=int, default=5000)
+        parser.add_argument('--categories', type=int, default=100)
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--order-details', type=int, default=100000)
+        parser.add_argument('--reviews', type=int, default=50000)
+        parser.add_argument('--days', type=int, default=3 * 365, help='Đơn hàng rải đều trong N ngày gần nhất')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--skip-rebuild', action='store_true',
+                            help='Không chạy lại các lệnh rebuild (rating, doanh số, chỉ mục tìm kiếm...)')
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.days = options['days']
+        started = time.perf_counter()
+
+        sellers = self.create_users('seller', options['stores'], User.SELLER_ROLE)
+        customers = self.create_users('customer', options['customers'], User.CUSTOMER_ROLE)
+        stores = self.create_stores(sellers)
+        categories = self.create_categories(options['categories'])
+        products = self.create_products(stores, categories, options['products'])
+        self.create_variants(products)
+        self.create_orders(customers, products, options['order_details'])
+        self.create_reviews(customers, products, stores, options['reviews'])
+
+        if not options['skip_rebuild']:
+            # bulk_create không gửi signal nên phải dựng lại các bảng phụ
+            for command in ['rebuild_category_paths', 'rebuild_ratings', 'rebuild_daily_sales',
+                            'rebuild_search_index', 'rebuild_image_variants']:
+                call_command(command, stdout=self.stdout)
+        self.stdout.write(self.style.SUCCESS(f'Seeded data in {time.perf_counter() - started:.1f}s.'))
+
+    def bulk_create(self, model, objects, return_ids=True):
+        """
+        bulk_create theo lô và trả về id các dòng mới (MySQL không trả id từ bulk_create).
+        return_ids=False cho các bảng lớn không cần id (chi tiết đơn, đánh giá...) để không đọc lại cả bảng vào bộ nhớ.
+        """
+        start = model.objects.aggregate(start=Max('pk'))['start'] or 0
+        batch, total = [], 0
+        for obj in objects:
+            batch.append(obj)
+            if len(batch) >= self.chunk_size:
+                total += self.flush(model, batch)
+                batch = []
+        total += self.flush(model, batch)
+        self.stdout.write(f'  {model.__name__}: {total} rows')
+        if not return_ids:
+            return None
+        return list(model.objects.filter(pk__gt=start).order_by('pk').values_list('pk', flat=True))
+
+    def flush(self, model, batch):
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+        return len(batch)
+
+    def random_date(self):
+        return timezone.now() - timedelta(days=self.random.random() * self.days)
+
+    def create_users(self, prefix, count, role):
+        start = User.objects.aggregate(start=Max('pk'))['start'] or 0
+        return self.bulk_create(User, (
+            # Mật khẩu không dùng được, tránh tốn thời gian băm
+            User(username=f'{prefix}{start + i}', password='!', avatar='sample', role=role, phone_number='0900000000',
+                 address='TP. Hồ Chí Minh')
+            for i in range(count)
+        ))
+
+    def create_stores(self, sellers):
+        return self.bulk_create(Store, (
+            Store(user_id=user_id, store_name=f'Cửa hàng {user_id}', wallpaper='sample', description='')
+            for user_id in sellers
+        ))
+
+    def create_categories(self, count):
+        start = Category.objects.aggregate(start=Max('pk'))['start'] or 0
+        roots = self.bulk_create(Category, (
+            Category(name=f'Danh mục {start + i + 1}', image='sample') for i in range(max(count // 10, 1))
+        ))
+        children = self.bulk_create(Category, (
+            Category(name=f'Danh mục {roots[i % len(roots)]}.{i}', parent_id=roots[i % len(roots)], image='sample')
+            for i in range(count - len(roots))
+        ))
+        return roots + children
+
+    def create_products(self, stores, categories, count):
+        product_ids = self.bulk_create(Product, (
+            Product(store_id=self.random.choice(stores), category_id=self.random.choice(categories),
+                    product_name=f'{self.random.choice(WORDS)} {self.random.choice(ADJECTIVES)} {i}',
+                    price=Decimal(self.random.randrange(10, 5000) * 1000),
+                    description=f'<p>{self.random.choice(WORDS)} {self.random.choice(ADJECTIVES)}</p>',
+                    stock=self.random.randrange(0, 500))
+            for i in range(count)
+        ))
+        return list(Product.objects.filter(pk__in=product_ids).values_list('pk', 'store_id', 'price'))
+
+    def create_variants(self, products):
+        self.bulk_create(ProductVariant, (
+            ProductVariant(product_id=product_id, size=size, color=self.random.choice(COLORS))
+            for product_id, _, _ in products
+            for size in self.random.sample(SIZES, 2)
+        ), return_ids=False)
+
+    def create_orders(self, customers, products, detail_count):
+        by_store = {}
+        for product in products:
+            by_store.setdefault(product[1], []).append(product)
+        stores = list(by_store)
+        order_count = max(detail_count // 3, 1)
+
+        orders = []
+        order_ids = self.bulk_create(Order, self.generate_orders(customers, stores, order_count, orders))
+        # order_date là auto_now_add nên bulk_create ghi thời điểm hiện tại; bulk_update không gọi pre_save nên
+        # ghi lại được ngày ngẫu nhiên trải theo nhiều năm
+        for i in range(0, len(order_ids), self.chunk_size):
+            with transaction.atomic():
+                Order.objects.bulk_update([
+                    Order(pk=order_id, order_date=order_date)
+                    for order_id, (_, _, _, order_date) in zip(order_ids[i:i + self.chunk_size],
+                                                               orders[i:i + self.chunk_size])
+                ], ['order_date'])
+        self.bulk_create(Payment, (
+            Payment(order_id=order_id, payment_method=method, amount=0)
+            for order_id, (_, method, status, _) in zip(order_ids, orders) if status == 'completed'
+        ), return_ids=False)
+
+        def details():
+            for i in range(detail_count):
+                order_id, (store_id, _, _, _) = order_ids[i % len(order_ids)], orders[i % len(orders)]
+                product_id, _, price = self.random.choice(by_store[store_id])
+                quantity = self.random.randrange(1, 4)
+                yield OrderDetail(order_id=order_id, store_id=store_id, product_id=product_id, quantity=quantity,
+                                  price=price * quantity)
+        self.bulk_create(OrderDetail, details(), return_ids=False)
+
+        new_orders = Order.objects.filter(pk__gte=order_ids[0])
+        totals = OrderDetail.objects.filter(order=OuterRef('pk')).order_by().values('order').annotate(
+            total=Sum('price')).values('total')
+        new_orders.update(total_amount=Coalesce(Subquery(totals), Value(Decimal(0))))
+        rebuild_item_counts(orders=new_orders)
+        Payment.objects.filter(order__in=new_orders).update(
+            amount=Subquery(Order.objects.filter(pk=OuterRef('order_id')).values('total_amount')))
+
+    def generate_orders(self, customers, stores, count, orders):
+        for _ in range(count):
+            store_id = self.random.choice(stores)
+            method = self.random.choice(PAYMENT_METHODS)
+            status = self.random.choices(STATUSES, weights=[1, 1, 1, 6, 1])[0]
+            orders.append((store_id, method, status, self.random_date()))
+            yield Order(user_id=self.random.choice(customers), store_id=store_id, total_amount=0,
+                        payment_method=method, order_status=status)
+
+    def create_reviews(self, customers, products, stores, count):
+        def reviews():
+            for i in range(count):
+                # 80% đánh giá sản phẩm, 20% đánh giá cửa hàng
+                target = {'product_id': self.random.choice(products)[0]} if i % 5 else {
+                    'store_id': self.random.choice(stores)}
+                yield Review(user_id=self.random.choice(customers), rating=self.random.choices(
+                    range(1, 6), weights=[1, 1, 2, 4, 6])[0], comment='Sản phẩm tốt', **target)
+        self.bulk_create(Review, reviews(), return_ids=False)
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from commerce.inventory import reshard
+from commerce.models import Product
+
+
+class Command(BaseCommand):
+    help = ('Chia tồn kho của sản phẩm bán rất chạy (flash sale) vào nhiều StockShard để các lượt giữ hàng '
+            'đồng thời không cùng chờ khoá một dòng; --shards 0 gộp lại vào Product.stock')
+
+    def add_arguments(self, parser):
+        parser.add_argument('product_ids', nargs='+', type=int)
+        parser.add_argument('--shards', type=int, default=16)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shards'] <= 256:
+            raise CommandError('--shards must be between 0 and 256.')
+        for product_id in options['product_ids']:
+            try:
+                reshard(product_id, options['shards'])
+            except Product.DoesNotExist:
+                raise CommandError(f'Product {product_id} does not exist.')
+            product = Product.objects.only('stock', 'stock_shards').get(pk=product_id)
+            self.stdout.write(f'Product {product_id}: {product.stock} in stock, {product.stock_shards} shards')
@@ -0,0 +1,106 @@
+import multiprocessing
+import random
+import time
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError, connections
+from django.db.models import Sum
+from rest_framework.exceptions import ValidationError
+
+from commerce.inventory import hold, release_reservations, reshard
+from commerce.loadtest import percentile
+from commerce.models import Product, StockReservation, StockShard, Store, User
+
+
+def run_worker(args):
+    # Chạy trong process con (fork), mỗi process một kết nối DB riêng
+    product_id, user_id, quantity, release_ratio, seed = args
+    rng = random.Random(seed)
+    user = User.objects.get(pk=user_id)
+    held = released = errors = 0
+    latencies = []
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                reservations = hold(user, [{'product': product_id, 'quantity': quantity}])
+                latencies.append(time.perf_counter() - start)
+                held += 1
+                if rng.random() < release_ratio:
+                    release_reservations(StockReservation.objects.filter(pk__in=[r.pk for r in reservations]))
+                    released += 1
+            except ValidationError:
+                break
+            except DatabaseError:
+                # Deadlock/lock timeout (hoặc "database is locked" với SQLite): thử lại như client thật
+                errors += 1
+                if errors > 1000:
+                    break
+    finally:
+        connections.close_all()
+    return held, released, errors, latencies
+
+
+class Command(BaseCommand):
+    help = ('Nhiều process cùng giữ hàng một sản phẩm tới khi hết, kiểm tra không bán vượt tồn kho và báo số '
+            'reservation/giây, p50/p95. Tạo user/cửa hàng/sản phẩm tạm và xoá khi xong; chạy trên DB thật '
+            '(MySQL/PostgreSQL) để đo tranh chấp khoá, SQLite tuần tự hoá mọi lượt ghi.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=8)
+        parser.add_argument('--stock', type=int, default=2000)
+        parser.add_argument('--quantity', type=int, default=1, help='Số lượng mỗi lượt giữ hàng')
+        parser.add_argument('--shards', type=int, default=0, help='Chia tồn kho vào N StockShard (0 = một dòng)')
+        parser.add_argument('--release-ratio', type=float, default=0,
+                            help='Tỉ lệ reservation được trả lại ngay sau khi giữ (mô phỏng huỷ giỏ)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if not 0 <= options['release_ratio'] < 1:
+            raise CommandError('--release-ratio must be in [0, 1).')
+        tag = uuid4().hex[:8]
+        seller = User.objects.create(username=f'stress-seller-{tag}', avatar='avatar', role=User.SELLER_ROLE)
+        buyers = [User.objects.create(username=f'stress-buyer-{tag}-{i}', avatar='avatar')
+                  for i in range(options['processes'])]
+        store = Store.objects.create(user=seller, store_name=f'Stress {tag}', description='', wallpaper='wallpaper')
+        product = Product.objects.create(store=store, product_name=f'Flash sale {tag}', price=1000, description='',
+                                         stock=options['stock'])
+        try:
+            if options['shards']:
+                reshard(product.pk, options['shards'])
+            jobs = [(product.pk, buyer.pk, options['quantity'], options['release_ratio'], options['seed'] + i)
+                    for i, buyer in enumerate(buyers)]
+            # Process con không được dùng chung kết nối của process cha
+            connections.close_all()
+            start = time.perf_counter()
+            with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+                results = pool.map(run_worker, jobs)
+            elapsed = time.perf_counter() - start
+            self.report(product, options, results, elapsed)
+        finally:
+            User.objects.filter(pk__in=[seller.pk] + [buyer.pk for buyer in buyers]).delete()
+
+    def report(self, product, options, results, elapsed):
+        held = sum(result[0] for result in results)
+        released = sum(result[1] for result in results)
+        errors = sum(result[2] for result in results)
+        latencies = sorted(latency for result in results for latency in result[3])
+
+        if options['shards']:
+            remaining = StockShard.objects.filter(product=product).aggregate(stock=Sum('stock'))['stock'] or 0
+            negative = StockShard.objects.filter(product=product, stock__lt=0).exists()
+        else:
+            remaining = Product.objects.get(pk=product.pk).stock
+            negative = remaining < 0
+        reserved = StockReservation.objects.filter(product=product, status=StockReservation.HELD).aggregate(
+            quantity=Sum('quantity'))['quantity'] or 0
+
+        self.stdout.write(f'{options["processes"]} processes, stock {options["stock"]}, '
+                          f'{options["shards"] or "no"} shards: {held} holds ({released} released) in {elapsed:.2f}s')
+        self.stdout.write(f'{held / elapsed:.0f} reservations/s, p50 {(percentile(latencies, 50) or 0) * 1000:.1f} ms, '
+                          f'p95 {(percentile(latencies, 95) or 0) * 1000:.1f} ms, {errors} retried DB errors')
+        self.stdout.write(f'held {reserved} + remaining {remaining} = {reserved + remaining} (stock {options["stock"]})')
+        if negative or reserved + remaining != options['stock'] or (held - released) * options['quantity'] != reserved:
+            raise CommandError('Oversold: reserved quantity and remaining stock do not add up to the initial stock.')
+        self.stdout.write(self.style.SUCCESS('No oversell.'))
@@ -0,0 +1,109 @@
+from functools import lru_cache
+
+from cloudinary import CloudinaryResource
+from cloudinary.models import CloudinaryField
+from django.conf import settings
+
+from .models import Category, ProductImage, Store, User
+
+# Preset biến đổi ảnh của Cloudinary; thumb/card cắt vuông cho danh sách, full giới hạn chiều rộng cho trang chi tiết
+PRESETS = {
+    'thumb': {'width': 150, 'height': 150, 'crop': 'fill', 'gravity': 'auto'},
+    'card': {'width': 400, 'height': 400, 'crop': 'fill', 'gravity': 'auto'},
+    'full': {'width': 1600, 'crop': 'limit'},
+}
+# Cloudinary tự chọn WebP/AVIF theo trình duyệt và nén phù hợp
+AUTO_FORMAT = {'fetch_format': 'auto', 'quality': 'auto'}
+# Các chiều rộng sinh sẵn cho srcset của từng preset
+SRCSET_WIDTHS = {
+    'thumb': (75, 150, 300),
+    'card': (200, 400, 800),
+    'full': (800, 1200, 1600),
+}
+
+# Trường ảnh của từng model và trường JSON lưu sẵn các biến thể (cập nhật bởi signal, xem signals.py)
+MEDIA_FIELDS = {
+    User: ('avatar', 'avatar_variants'),
+    Store: ('wallpaper', 'wallpaper_variants'),
+    Category: ('image', 'image_variants'),
+    ProductImage: ('image', 'image_variants'),
+}
+
+_field = CloudinaryField(type='upload', resource_type='image')
+
+
+def image_source(value):
+    # Chuỗi lưu trong DB ("image/upload/v1/abc.jpg"), dùng làm key cache
+    if not value:
+        return None
+    if not isinstance(value, CloudinaryResource):
+        value = _field.to_python(str(value))
+    return value.get_prep_value()
+
+
+@lru_cache(maxsize=getattr(settings, 'IMAGE_URL_CACHE_SIZE', 10000))
+def _build_url(source, preset, width, format):
+    options = {}
+    if preset:
+        options.update(PRESETS[preset], **AUTO_FORMAT)
+        if width:
+            base = PRESETS[preset]
+            options['width'] = width
+            if 'height' in base:
+                options['height'] = round(base['height'] * width / base['width'])
+    if format:
+        options['format'] = format
+    return _field.parse_cloudinary_resource(source).build_url(**options)
+
+
+def image_url(value, preset=None, width=None, format=None):
+    """URL ảnh (preset=None là ảnh gốc như CloudinaryField.url), được nhớ trong LRU cache theo tham số."""
+    source = image_source(value)
+    if source is None:
+        return None
+    return _build_url(source, preset, width, format)
+
+
+def image_srcset(value, preset):
+    if not image_source(value):
+        return None
+    return ', '.join(f'{image_url(value, preset, width)} {width}w' for width in SRCSET_WIDTHS[preset])
+
+
+def image_variants(value):
+    source = image_source(value)
+    if source is None:
+        return {}
+    return {
+        'source': source,
+        **{preset: image_url(value, preset) for preset in PRESETS},
+        'srcset': {preset: image_srcset(value, preset) for preset in PRESETS},
+    }
+
+
+def stored_variants(value, variants):
+    # Dùng bản lưu sẵn nếu còn khớp ảnh hiện tại (bulk_create/update() không qua signal nên có thể cũ hoặc rỗng)
+    if variants and variants.get('source') == image_source(value):
+        return variants
+    return image_variants(value)
+
+
+def url_cache_info():
+    return _build_url.cache_info()
+
+
+def rebuild_image_variants(model, batch_size=1000):
+    field, variants_field = MEDIA_FIELDS[model]
+    updated = 0
+    batch = []
+    for obj in model.objects.only('pk', field, variants_field).iterator(chunk_size=batch_size):
+        variants = image_variants(getattr(obj, field))
+        if variants != getattr(obj, variants_field):
+            setattr(obj, variants_field, variants)
+            batch.append(obj)
+        if len(batch) >= batch_size:
+            updated += model.objects.bulk_update(batch, [variants_field])
+            batch = []
+    if batch:
+        updated += model.objects.bulk_update(batch, [variants_field])
+    return updated
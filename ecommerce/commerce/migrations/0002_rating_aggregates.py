@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:54
+
+from django.db import migrations, models
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+
+def backfill_ratings(apps, schema_editor):
+    # Bản sao cố định của ratings.rebuild_ratings tại thời điểm migration, không import code của app
+    Review = apps.get_model('commerce', 'Review')
+    for model_name, fk_name in (('Product', 'product'), ('Store', 'store')):
+        model = apps.get_model('commerce', model_name)
+        reviews = Review.objects.filter(active=True, **{fk_name: OuterRef('pk')}).order_by().values(fk_name)
+        model.objects.update(
+            rating_sum=Coalesce(Subquery(reviews.annotate(total=Sum('rating')).values('total'),
+                                         output_field=IntegerField()), Value(0)),
+            rating_count=Coalesce(Subquery(reviews.annotate(count=Count('id')).values('count'),
+                                           output_field=IntegerField()), Value(0)),
+        )
+        model.objects.filter(rating_count__gt=0).update(rating_avg=Cast('rating_sum', FloatField()) / F('rating_count'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_avg',
+            field=models.FloatField(db_index=True, default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_sum',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_ratings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_fulltext_index(apps, schema_editor):
+    # Chỉ MySQL mới dùng FULLTEXT index (MySQLFullTextBackend)
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('CREATE FULLTEXT INDEX product_name_fulltext ON commerce_product (product_name)')
+
+
+def drop_fulltext_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX product_name_fulltext ON commerce_product')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0002_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('weight', models.FloatField(default=1)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='commerce.product')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'product', 'weight'], name='search_term_product_idx')],
+                'unique_together': {('product', 'term')},
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
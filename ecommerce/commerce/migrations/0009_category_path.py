@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:05
+
+from django.db import migrations, models
+
+
+def backfill_paths(apps, schema_editor):
+    # Bản sao cố định của category_tree.rebuild_paths tại thời điểm migration: dựng path theo từng tầng
+    Category = apps.get_model('commerce', 'Category')
+    paths = {}
+    level = list(Category.objects.filter(parent__isnull=True).values_list('pk', flat=True))
+    depth = 0
+    while level:
+        updates = []
+        for pk, parent_id in Category.objects.filter(pk__in=level).values_list('pk', 'parent_id'):
+            paths[pk] = f"{paths.get(parent_id, '/')}{pk}/"
+            updates.append(Category(pk=pk, path=paths[pk], depth=depth))
+        Category.objects.bulk_update(updates, ['path', 'depth'], batch_size=500)
+        level = list(Category.objects.filter(parent_id__in=level).values_list('pk', flat=True))
+        depth += 1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0008_product_images_related_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='path',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=255),
+        ),
+        migrations.RunPython(backfill_paths, migrations.RunPython.noop),
+    ]
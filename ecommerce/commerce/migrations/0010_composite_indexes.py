@@ -0,0 +1,45 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0009_category_path'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'order_status', 'order_date'], name='order_user_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['store', 'order_status', 'order_date'], name='order_store_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderdetail',
+            index=models.Index(fields=['store', 'order'], name='orderdetail_store_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['payment_date'], name='payment_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['active', 'category', 'price'], name='product_active_category_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['store', 'active', 'created_at'], name='product_store_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['product', 'active', 'created_at'], name='review_product_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['store', 'active', 'created_at'], name='review_store_active_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:21
+
+import cloudinary.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0011_image_variants'),
+        ('contenttypes', '0002_remove_content_type_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productimage',
+            name='image',
+            field=cloudinary.models.CloudinaryField(blank=True, default=None, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='store',
+            name='wallpaper',
+            field=cloudinary.models.CloudinaryField(blank=True, default=None, max_length=255, null=True),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='avatar',
+            field=cloudinary.models.CloudinaryField(blank=True, default=None, max_length=255, null=True),
+        ),
+        migrations.CreateModel(
+            name='MediaUpload',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('field', models.CharField(max_length=50)),
+                ('original_name', models.CharField(blank=True, max_length=255)),
+                ('staged_path', models.CharField(max_length=500)),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('uploading', 'Uploading'), ('done', 'Done'), ('failed', 'Failed')], default='pending', max_length=20)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+                ('result', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='mediaupload_status_idx'), models.Index(fields=['content_type', 'object_id', 'field'], name='mediaupload_target_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0014_stock_reservation'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['store', 'order_date', 'id'], name='order_store_date_idx'),
+        ),
+    ]
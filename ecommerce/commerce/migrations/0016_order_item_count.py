@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:50
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_item_counts(apps, schema_editor):
+    # Bản sao cố định của orders.rebuild_item_counts tại thời điểm migration
+    Order = apps.get_model('commerce', 'Order')
+    OrderDetail = apps.get_model('commerce', 'OrderDetail')
+    counts = (OrderDetail.objects.filter(order=OuterRef('pk')).order_by().values('order')
+              .annotate(count=Sum('quantity')).values('count'))
+    Order.objects.update(item_count=Coalesce(Subquery(counts), Value(0)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0015_order_store_date_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='item_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['user', 'order_date', 'id'], name='order_user_date_idx'),
+        ),
+        migrations.RunPython(backfill_item_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:53
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_histograms(apps, schema_editor):
+    # Bản sao cố định của phần histogram trong ratings.rebuild_ratings tại thời điểm migration
+    Review = apps.get_model('commerce', 'Review')
+    for model_name, fk_name in (('Product', 'product'), ('Store', 'store')):
+        reviews = Review.objects.filter(active=True, **{fk_name: OuterRef('pk')}).order_by().values(fk_name)
+        apps.get_model('commerce', model_name).objects.update(**{
+            f'rating_{rating}_count': Coalesce(Subquery(reviews.filter(rating=rating).annotate(count=Count('id'))
+                                                        .values('count'), output_field=IntegerField()), Value(0))
+            for rating in range(1, 6)
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0016_order_item_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_1_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_2_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_3_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_4_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='store',
+            name='rating_5_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_histograms, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0017_rating_histogram'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['product_name'], name='product_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='store',
+            index=models.Index(fields=['store_name'], name='store_name_idx'),
+        ),
+    ]
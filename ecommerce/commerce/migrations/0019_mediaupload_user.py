@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0018_admin_search_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mediaupload',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+    ]
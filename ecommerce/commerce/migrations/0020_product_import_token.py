@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0019_mediaupload_user'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='import_token',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=50, null=True),
+        ),
+    ]
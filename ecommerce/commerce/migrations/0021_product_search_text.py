@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:34
+
+import re
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize(text):
+    # Bản đông cứng của search.normalize/tokenize tại thời điểm viết migration
+    text = unicodedata.normalize('NFD', str(text).lower().replace('đ', 'd'))
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(term[:64] for term in re.findall(r'\w+', text))
+
+
+def fill_search_text(apps, schema_editor):
+    # Chỉ MySQL mới dùng search_text (MySQLFullTextBackend)
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    schema_editor.execute('CREATE FULLTEXT INDEX product_search_text_fulltext ON commerce_product (search_text)')
+    Product = apps.get_model('commerce', 'Product')
+    rows = Product.objects.order_by('pk').values_list('pk', 'product_name', 'category__name', 'store__store_name',
+                                                      'price')
+    batch = []
+    for pk, *values in rows.iterator(chunk_size=1000):
+        text = ' '.join(normalize(format(value, 'f') if i == 3 else value)
+                        for i, value in enumerate(values) if value is not None)
+        batch.append(Product(pk=pk, search_text=text))
+        if len(batch) >= 1000:
+            Product.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    Product.objects.bulk_update(batch, ['search_text'])
+
+
+def drop_search_text_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'mysql':
+        schema_editor.execute('DROP INDEX product_search_text_fulltext ON commerce_product')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('commerce', '0020_product_import_token'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, drop_search_text_index),
+    ]
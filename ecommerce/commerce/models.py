@@ -1,13 +1,17 @@
 from cloudinary.models import CloudinaryField
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from ckeditor.fields import RichTextField
-from django.db.models import Avg
 
 
 
 class User(AbstractUser):
-    avatar = CloudinaryField(type='upload', resource_type='image', default=None)
+    # null khi ảnh mới đang chờ upload nền (xem uploads.py)
+    avatar = CloudinaryField(type='upload', resource_type='image', default=None, null=True, blank=True)
+    # URL các preset thumb/card/full và srcset, sinh sẵn khi lưu (xem media.py)
+    avatar_variants = models.JSONField(default=dict, blank=True, editable=False)
     phone_number = models.CharField(max_length=20)
     address = models.CharField(max_length=255)
     SELLER_ROLE = 'seller'
@@ -27,9 +31,13 @@ class Category(models.Model):
     name = models.CharField(max_length=100, null=False, unique=True)
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True)
     image = CloudinaryField(type='upload', resource_type='image', default=None)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
+    # Materialized path dạng "/1/5/12/", cập nhật bởi signal (xem category_tree.py)
+    path = models.CharField(max_length=255, default='', editable=False, db_index=True)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
 
     def __str__(self):
@@ -46,6 +54,12 @@ class Review(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['product', 'active', 'created_at'], name='review_product_active_idx'),
+            models.Index(fields=['store', 'active', 'created_at'], name='review_store_active_idx'),
+        ]
+
     def __str__(self):
         if self.product:
             return f"{self.user.username} - {self.product.product_name}"
@@ -55,17 +69,37 @@ class Review(models.Model):
 class Store(models.Model):
     user = models.OneToOneField('User', on_delete=models.CASCADE)
     store_name = models.CharField(max_length=255)
-    wallpaper = CloudinaryField(type='upload', resource_type='image', default=None)
+    wallpaper = CloudinaryField(type='upload', resource_type='image', default=None, null=True, blank=True)
+    wallpaper_variants = models.JSONField(default=dict, blank=True, editable=False)
     description = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_count = models.IntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False, db_index=True)
+    # Số review theo số sao (histogram), cập nhật cùng rating_* (xem ratings.py)
+    rating_1_count = models.IntegerField(default=0, editable=False)
+    rating_2_count = models.IntegerField(default=0, editable=False)
+    rating_3_count = models.IntegerField(default=0, editable=False)
+    rating_4_count = models.IntegerField(default=0, editable=False)
+    rating_5_count = models.IntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Tìm kiếm theo tiền tố trong admin (LIKE 'abc%')
+            models.Index(fields=['store_name'], name='store_name_idx'),
+        ]
 
     def __str__(self):
         return self.store_name
 
     def average_rating(self):
-        return self.review_set.aggregate(Avg('rating'))['rating__avg']
+        # rating_* được cập nhật bởi signal của Review (xem ratings.py)
+        return self.rating_avg if self.rating_count else None
+
+    def rating_histogram(self):
+        return {stars: getattr(self, f'rating_{stars}_count') for stars in range(1, 6)}
 
 
 class Product(models.Model):
@@ -78,19 +112,51 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     active = models.BooleanField(default=True)
+    rating_sum = models.IntegerField(default=0, editable=False)
+    rating_count = models.IntegerField(default=0, editable=False)
+    rating_avg = models.FloatField(default=0, editable=False, db_index=True)
+    # Số review theo số sao (histogram), cập nhật cùng rating_* (xem ratings.py)
+    rating_1_count = models.IntegerField(default=0, editable=False)
+    rating_2_count = models.IntegerField(default=0, editable=False)
+    rating_3_count = models.IntegerField(default=0, editable=False)
+    rating_4_count = models.IntegerField(default=0, editable=False)
+    rating_5_count = models.IntegerField(default=0, editable=False)
+    similar_updated_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # > 0: tồn kho nằm trong StockShard (sản phẩm bán rất chạy), stock chỉ là tổng được đồng bộ định kỳ (xem inventory.py)
+    stock_shards = models.PositiveSmallIntegerField(default=0, editable=False)
+    # "<token của lô>:<thứ tự trong lô>" trong lúc nhập file, để đọc lại id trên DB không trả id từ bulk_create
+    # (xem catalog_io.py); xoá về null ngay sau đó
+    import_token = models.CharField(max_length=50, null=True, blank=True, editable=False, db_index=True)
+    # Tên sản phẩm, danh mục, cửa hàng và giá đã chuẩn hoá, có FULLTEXT index trên MySQL (MySQLFullTextBackend)
+    search_text = models.TextField(blank=True, default='', editable=False)
+
+    class Meta:
+        indexes = [
+            # Thứ tự ổn định cho KeysetPagination
+            models.Index(fields=['created_at', 'id'], name='product_created_id_idx'),
+            models.Index(fields=['price', 'id'], name='product_price_id_idx'),
+            models.Index(fields=['active', 'category', 'price'], name='product_active_category_idx'),
+            models.Index(fields=['store', 'active', 'created_at'], name='product_store_active_idx'),
+            # Tìm kiếm theo tiền tố trong admin (LIKE 'abc%')
+            models.Index(fields=['product_name'], name='product_name_idx'),
+        ]
 
     def __str__(self):
         return self.product_name
 
     def average_rating(self):
-        return self.review_set.aggregate(Avg('rating'))['rating__avg']
+        return self.rating_avg if self.rating_count else None
+
+    def rating_histogram(self):
+        return {stars: getattr(self, f'rating_{stars}_count') for stars in range(1, 6)}
 
 
 
 
 class ProductImage(models.Model):
-    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='images+')
-    image = CloudinaryField(type='upload', resource_type='image', default=None)
+    product = models.ForeignKey('Product', on_delete=models.CASCADE, related_name='images')
+    image = CloudinaryField(type='upload', resource_type='image', default=None, null=True, blank=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -125,6 +191,19 @@ class Order(models.Model):
         ('canceled', 'Canceled'),
     ]
     order_status = models.CharField(max_length=20, choices=ORDER_STATUS_CHOICES)
+    # Tổng số lượng sản phẩm của đơn, ghi lúc đặt hàng và cập nhật theo OrderDetail (xem signals.py)
+    item_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['order_date', 'id'], name='order_date_id_idx'),
+            # Lịch sử đơn của khách sắp theo (order_date, id) như KeysetPagination
+            models.Index(fields=['user', 'order_date', 'id'], name='order_user_date_idx'),
+            models.Index(fields=['user', 'order_status', 'order_date'], name='order_user_status_idx'),
+            models.Index(fields=['store', 'order_status', 'order_date'], name='order_store_status_idx'),
+            # Hộp đơn của người bán không lọc trạng thái, sắp theo (order_date, id) như KeysetPagination
+            models.Index(fields=['store', 'order_date', 'id'], name='order_store_date_idx'),
+        ]
 
 
 
@@ -136,6 +215,53 @@ class OrderDetail(models.Model):
     price = models.DecimalField(max_digits=10, decimal_places=2)
     note = models.TextField(blank=True, null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['store', 'order'], name='orderdetail_store_order_idx'),
+        ]
+
+class StockShard(models.Model):
+    # Một phần tồn kho của sản phẩm chia shard; mỗi lượt giữ hàng chỉ khoá một dòng shard thay vì dòng Product
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='shards')
+    shard = models.PositiveSmallIntegerField()
+    stock = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('product', 'shard')
+
+
+class StockReservation(models.Model):
+    """Lượng hàng đã trừ khỏi tồn kho cho giỏ hàng đang thanh toán, tự trả lại khi huỷ hoặc hết hạn (xem inventory.py)."""
+    HELD = 'held'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
+    STATUS_CHOICES = [
+        (HELD, 'Held'),
+        (COMMITTED, 'Committed'),
+        (RELEASED, 'Released'),
+        (EXPIRED, 'Expired'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    quantity = models.PositiveIntegerField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=HELD)
+    expires_at = models.DateTimeField()
+    order = models.ForeignKey('Order', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'expires_at'], name='reservation_status_expires_idx'),
+            models.Index(fields=['user', 'status'], name='reservation_user_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'Reservation {self.pk}: {self.quantity} x product {self.product_id} ({self.status})'
+
+
 class Payment(models.Model):
     order = models.OneToOneField(Order, related_name='payment', on_delete=models.CASCADE)
     payment_method = models.CharField(max_length=20)
@@ -143,3 +269,131 @@ class Payment(models.Model):
     payment_date = models.DateTimeField(auto_now_add=True)
     transaction_id = models.CharField(max_length=255, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['payment_date'], name='payment_date_idx'),
+        ]
+
+
+class ProductSearchTerm(models.Model):
+    # Chỉ mục đảo (inverted index) phục vụ tìm kiếm sản phẩm, xem search.py
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='search_terms')
+    term = models.CharField(max_length=64)
+    weight = models.FloatField(default=1)
+
+    class Meta:
+        unique_together = ('product', 'term')
+        indexes = [
+            models.Index(fields=['term', 'product', 'weight'], name='search_term_product_idx'),
+        ]
+
+
+class SimilarProduct(models.Model):
+    # Bảng láng giềng top-K được tính sẵn bởi lệnh compute_similar_products
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+')
+    similar = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='similar_to')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('product', 'rank')
+        ordering = ['product', 'rank']
+
+
+class DailySales(models.Model):
+    # Bảng tổng hợp doanh số theo (store, product, ngày), chỉ tính đơn hàng completed, xem rollups.py
+    store = models.ForeignKey(Store, on_delete=models.CASCADE)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    order_count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('store', 'day', 'product')
+
+
+class StatsSnapshot(models.Model):
+    # Số liệu trang commerce-stats được tính sẵn, xem dashboard.py
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    data = models.JSONField()
+
+
+class MediaUpload(models.Model):
+    """File ảnh đã nhận và đang chờ worker đẩy lên storage (xem uploads.py)."""
+    PENDING = 'pending'
+    UPLOADING = 'uploading'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (UPLOADING, 'Uploading'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    # Người tải lên, chỉ người này xem được trạng thái (null với các upload tạo trước khi có cột này)
+    user = models.ForeignKey(User, null=True, blank=True, on_delete=models.CASCADE)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveBigIntegerField()
+    target = GenericForeignKey('content_type', 'object_id')
+    field = models.CharField(max_length=50)
+    original_name = models.CharField(max_length=255, blank=True)
+    staged_path = models.CharField(max_length=500)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    result = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='mediaupload_status_idx'),
+            models.Index(fields=['content_type', 'object_id', 'field'], name='mediaupload_target_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.content_type.model} {self.object_id} {self.field} ({self.status})'
+
+
+class ProductImport(models.Model):
+    """File CSV/NDJSON sản phẩm của người bán, được nhập theo lô (xem catalog_io.py)."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    CSV = 'csv'
+    NDJSON = 'ndjson'
+    FORMAT_CHOICES = [(CSV, 'CSV'), (NDJSON, 'NDJSON')]
+
+    store = models.ForeignKey(Store, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    original_name = models.CharField(max_length=255, blank=True)
+    staged_path = models.CharField(max_length=500)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    # Số dòng đã xử lý xong (đã commit), dùng để chạy tiếp mà không nhập trùng khi worker chết giữa chừng
+    processed_rows = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    # Lỗi theo dòng [{"line": 12, "errors": {...}}], giữ tối đa PRODUCT_IMPORT_MAX_ERRORS dòng đầu
+    errors = models.JSONField(default=list, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='productimport_status_idx'),
+        ]
+
+    def __str__(self):
+        return f'Import {self.pk} of store {self.store_id} ({self.status})'
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .models import Order, OrderDetail, Store, User
+
+STATUS_COUNTS_KEY = 'order-status-counts:%s:%s'
+
+
+def order_scope(user):
+    """
+    Phạm vi đơn hàng user được xem: ('store', id) với người bán có cửa hàng đang hoạt động (hộp đơn của cửa hàng),
+    ('user', id) với người dùng khác (đơn mình đặt).
+    """
+    if user.role == User.SELLER_ROLE:
+        store_id = Store.objects.filter(user=user, active=True).values_list('pk', flat=True).first()
+        if store_id is not None:
+            return 'store', store_id
+    return 'user', user.pk
+
+
+def scope_orders(queryset, scope, prefix=''):
+    # prefix='order__' cho OrderDetail; OrderDetail có sẵn store_id nên lọc cửa hàng không cần JOIN
+    field, pk = scope
+    if field == 'store':
+        return queryset.filter(store_id=pk)
+    return queryset.filter(**{f'{prefix}user_id': pk})
+
+
+def status_counts(scope):
+    """
+    Số đơn theo từng trạng thái (kèm total) cho badge của app: một truy vấn GROUP BY chỉ đọc index
+    (store|user, order_status, order_date), kết quả được cache tới khi có đơn của phạm vi đó thay đổi.
+    """
+    key = STATUS_COUNTS_KEY % scope
+    counts = cache.get(key)
+    if counts is None:
+        rows = dict(scope_orders(Order.objects.all(), scope).order_by().values_list('order_status')
+                    .annotate(count=Count('id')))
+        counts = {status: rows.get(status, 0) for status, _ in Order.ORDER_STATUS_CHOICES}
+        counts['total'] = sum(rows.values())
+        cache.set(key, counts, settings.ORDER_STATUS_COUNTS_TIMEOUT)
+    return counts
+
+
+def invalidate_status_counts(order):
+    cache.delete_many([STATUS_COUNTS_KEY % ('store', order.store_id), STATUS_COUNTS_KEY % ('user', order.user_id)])
+
+
+def rebuild_item_counts(orders=None):
+    """Tính lại Order.item_count từ OrderDetail cho các đơn trong orders (mặc định mọi đơn)."""
+    counts = (OrderDetail.objects.filter(order=OuterRef('pk')).order_by().values('order')
+              .annotate(count=Sum('quantity')).values('count'))
+    orders = Order.objects.all() if orders is None else orders
+    return orders.update(item_count=Coalesce(Subquery(counts), Value(0)))
+
+
+def apply_item_count_change(old, new):
+    """old/new: dict order_id, quantity của OrderDetail trước và sau khi ghi, None nếu chưa có hoặc đã xoá."""
+    for values, sign in ((old, -1), (new, 1)):
+        if values:
+            Order.objects.filter(pk=values['order_id']).update(item_count=F('item_count') + sign * values['quantity'])
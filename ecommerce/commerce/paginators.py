@@ -0,0 +1,297 @@
+import datetime
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def encode_cursor_value(value):
+    # Giữ nguyên micro giây (DjangoJSONEncoder cắt còn mili giây, làm lệch điều kiện keyset)
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'Cannot encode {type(value).__name__} in cursor')
+
+
+class KeysetPagination(BasePagination):
+    """
+    Phân trang theo con trỏ (keyset) trên thứ tự ổn định, ví dụ (created_at, id) hoặc (price, id):
+    trang sau lọc WHERE (created_at, id) < (giá trị dòng cuối) thay vì OFFSET nên trang 1000 nhanh như trang 1.
+
+    Vẫn trả về {count, next, previous, results} như PageNumberPagination. Truyền ?count=false để bỏ COUNT(*),
+    và nếu request có ?page=N thì dùng lại PageNumberPagination cho client cũ.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    default_ordering = ('-created_at', '-id')
+    invalid_cursor_message = 'Invalid cursor'
+    fallback_class = PageNumberPagination
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.fallback = None
+        if request.query_params.get(self.fallback_class.page_query_param):
+            self.fallback = self.fallback_class()
+            return self.fallback.paginate_queryset(
+                queryset.order_by(*self.get_ordering(request, queryset, view)), request, view)
+
+        page_queryset, cursor = self.get_page_queryset(queryset, request, view)
+        self.count = queryset.count() if self.get_count_enabled(request, view) else None
+        return self.get_page(list(page_queryset[:self.page_size + 1]), cursor)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        # Bản async cho commerce/async_views.py: COUNT và trang kết quả dùng async ORM
+        if request.query_params.get(self.fallback_class.page_query_param):
+            return await sync_to_async(self.paginate_queryset)(queryset, request, view)
+        page_queryset, cursor = self.get_page_queryset(queryset, request, view)
+        self.count = await queryset.acount() if self.get_count_enabled(request, view) else None
+        return self.get_page([row async for row in page_queryset[:self.page_size + 1]], cursor)
+
+    def get_page_queryset(self, queryset, request, view):
+        self.fallback = None
+        self.request = request
+        self.ordering = self.get_ordering(request, queryset, view)
+        cursor = self.decode_cursor(request)
+        ordering = [self.invert(field) for field in self.ordering] if cursor and cursor['reverse'] else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if cursor:
+            try:
+                queryset = queryset.filter(self.keyset_filter(ordering, cursor['values']))
+            except (DjangoValidationError, TypeError, ValueError):
+                # Cursor đúng định dạng nhưng giá trị không hợp kiểu của trường sắp xếp (ví dụ ngày sai)
+                raise NotFound(self.invalid_cursor_message)
+        return queryset, cursor
+
+    def get_page(self, results, cursor):
+        reverse = bool(cursor and cursor['reverse'])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+
+        self.next_values = self.row_values(results[-1]) if results and (has_more or reverse) else None
+        self.previous_values = self.row_values(results[0]) if results and cursor and (has_more or not reverse) else None
+        return results
+
+    def get_ordering(self, request, queryset, view):
+        # OrderingFilter (hoặc search backend) đã sắp xếp queryset trước khi phân trang
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)]
+        ordering = ordering or list(getattr(view, 'keyset_ordering', self.default_ordering))
+        if not any(field.lstrip('-') in ('id', 'pk') for field in ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
+
+    def get_count_enabled(self, request, view):
+        value = request.query_params.get(self.count_query_param)
+        if value is None:
+            return getattr(view, 'keyset_count', True)
+        return value.lower() not in ('0', 'false', 'no')
+
+    def invert(self, field):
+        return field[1:] if field.startswith('-') else '-' + field
+
+    def keyset_filter(self, ordering, values):
+        # (a, b, id) > (x, y, z)  <=>  a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        conditions = []
+        for i, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            equal = {prev.lstrip('-'): value for prev, value in zip(ordering[:i], values[:i])}
+            conditions.append(Q(**equal, **{f'{name}__{lookup}': values[i]}))
+        return reduce(or_, conditions)
+
+    def row_values(self, row):
+        return [getattr(row, field.lstrip('-')) for field in self.ordering]
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            if not isinstance(cursor['values'], list) or len(cursor['values']) != len(self.ordering):
+                raise ValueError
+            cursor['reverse'] = bool(cursor.get('reverse'))
+            return cursor
+        except (TypeError, ValueError, KeyError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, values, reverse):
+        cursor = json.dumps({'values': values, 'reverse': reverse}, default=encode_cursor_value, separators=(',', ':'))
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, urlsafe_b64encode(cursor.encode('utf-8')).decode('ascii'))
+
+    def get_next_link(self):
+        if self.fallback:
+            return self.fallback.get_next_link()
+        if self.next_values is None:
+            return None
+        return self.encode_cursor(self.next_values, False)
+
+    def get_previous_link(self):
+        if self.fallback:
+            return self.fallback.get_previous_link()
+        if self.previous_values is None:
+            return None
+        return self.encode_cursor(self.previous_values, True)
+
+    def get_paginated_response(self, data):
+        if self.fallback:
+            return self.fallback.get_paginated_response(data)
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return PageNumberPagination().get_paginated_response_schema(schema)
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'The pagination cursor value.',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.count_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Set to false to skip the total count.',
+                'schema': {'type': 'boolean'},
+            },
+        ]
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """PageNumberPagination cho view async: đếm và lấy trang bằng async ORM, response giữ nguyên định dạng."""
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        page_number = request.query_params.get(self.page_query_param) or 1
+        try:
+            number = int(page_number)
+            if number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message='Invalid page.'))
+
+        offset = (number - 1) * page_size
+        results = [row async for row in queryset[offset:offset + page_size]]
+        paginator = self.django_paginator_class(queryset, page_size)
+        paginator.count = await queryset.acount()
+        if number > paginator.num_pages:
+            raise NotFound(self.invalid_page_message.format(page_number=number, message='That page contains no results'))
+
+        self.request = request
+        self.page = Page(results, number, paginator)
+        return results
+
+
+def estimate_table_rows(model, using='default'):
+    """Số dòng ước lượng của bảng theo thống kê của DB (không quét bảng); None nếu DB không hỗ trợ (SQLite)."""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            # InnoDB chỉ lấy mẫu nên TABLE_ROWS có thể lệch vài chục phần trăm
+            cursor.execute('SELECT table_rows FROM information_schema.tables '
+                           'WHERE table_schema = DATABASE() AND table_name = %s', [model._meta.db_table])
+        elif connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        else:
+            return None
+        row = cursor.fetchone()
+    # reltuples = -1 khi bảng chưa được ANALYZE
+    if row is None or row[0] is None or row[0] < 0:
+        return None
+    return int(row[0])
+
+
+class ApproximateCount(int):
+    """Số đếm không chính xác: vẫn so sánh như int, hiển thị '10000+' (cận dưới) hoặc '~50000' (ước lượng)."""
+
+    def __new__(cls, value, lower_bound=True):
+        count = super().__new__(cls, value)
+        count.lower_bound = lower_bound
+        return count
+
+    def __str__(self):
+        return f'{int(self)}+' if self.lower_bound else f'~{int(self)}'
+
+
+class ApproximateCountPaginator(Paginator):
+    """
+    Paginator cho changelist của admin trên bảng lớn, không chạy COUNT(*) trên cả bảng: khi không lọc thì dùng
+    số dòng ước lượng (estimate_table_rows) nếu bảng lớn hơn ADMIN_EXACT_COUNT_LIMIT, khi có lọc/tìm kiếm thì
+    chỉ đếm tối đa ADMIN_EXACT_COUNT_LIMIT dòng. Bảng nhỏ và SQLite vẫn đếm chính xác.
+
+    Khi số đếm không chính xác (ApproximateCount) vẫn mở được các trang sau num_pages nếu trang đó còn dòng,
+    và dãy link trang thêm trang kế tiếp thay vì dừng ở trang cuối theo số đếm.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        if not queryset.query.where:
+            estimate = estimate_table_rows(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                return ApproximateCount(estimate, lower_bound=False)
+        # COUNT trên subquery có LIMIT (bỏ ORDER BY): DB dừng sau limit + 1 dòng thay vì đếm hết kết quả lọc
+        count = queryset.order_by()[:limit + 1].count()
+        return ApproximateCount(limit) if count > limit else count
+
+    def has_rows(self, number):
+        bottom = (number - 1) * self.per_page
+        return self.object_list[bottom:bottom + 1].exists()
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            # Số đếm bị cắt ở giới hạn hoặc ước lượng thấp: trang vượt num_pages vẫn hợp lệ nếu còn dòng
+            number = int(number)
+            if isinstance(self.count, ApproximateCount) and self.has_rows(number):
+                return number
+            raise
+
+    def page(self, number):
+        if not isinstance(self.count, ApproximateCount):
+            return super().page(number)
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(self.object_list[bottom:bottom + self.per_page], number, self)
+
+    def get_elided_page_range(self, number=1, *, on_each_side=3, on_ends=2):
+        number = self.validate_number(number)
+        if not isinstance(self.count, ApproximateCount) or number < self.num_pages:
+            yield from super().get_elided_page_range(number, on_each_side=on_each_side, on_ends=on_ends)
+            return
+        # Không biết trang cuối thật: các trang đầu, các trang trước trang hiện tại và trang kế tiếp nếu còn dòng
+        yield from range(1, min(on_ends, number) + 1)
+        if number - on_each_side > on_ends + 1:
+            yield self.ELLIPSIS
+        yield from range(max(on_ends + 1, number - on_each_side), number + 1)
+        if self.has_rows(number + 1):
+            yield number + 1
@@ -0,0 +1,87 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, FloatField, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Cast, Coalesce
+
+# Cột rating_* của Product/Store, đủ để trả average, count và histogram mà không đọc bảng review
+RATING_FIELDS = ['rating_avg', 'rating_count'] + [f'rating_{rating}_count' for rating in range(1, 6)]
+# Cột cần cho ReviewFeedSerializer (review + tên, ảnh đại diện người viết)
+REVIEW_FEED_FIELDS = ['id', 'user_id', 'product_id', 'store_id', 'rating', 'comment', 'created_at', 'updated_at',
+                      'user__username', 'user__first_name', 'user__last_name', 'user__avatar', 'user__avatar_variants']
+
+
+def review_targets(product_id, store_id, rating, active):
+    """Trả về danh sách (model, pk, rating) mà một review đang đóng góp vào."""
+    if not active:
+        return []
+    from .models import Product, Store
+
+    targets = []
+    if product_id:
+        targets.append((Product, product_id, rating))
+    if store_id:
+        targets.append((Store, store_id, rating))
+    return targets
+
+
+def histogram_field(rating):
+    return f'rating_{rating}_count'
+
+
+def apply_rating_delta(model, pk, deltas):
+    """deltas: {tên cột: chênh lệch} trên rating_sum, rating_count và các cột histogram rating_N_count."""
+    with transaction.atomic():
+        model.objects.filter(pk=pk).update(**{field: F(field) + value for field, value in deltas.items()})
+        # Tách làm 2 câu UPDATE: MySQL tính vế phải theo giá trị mới từ trái sang phải
+        if deltas.get('rating_sum') or deltas.get('rating_count'):
+            refresh_rating_avg(model.objects.filter(pk=pk))
+
+
+def refresh_rating_avg(queryset):
+    queryset.filter(rating_count__gt=0).update(
+        rating_avg=Cast('rating_sum', FloatField()) / F('rating_count')
+    )
+    queryset.filter(rating_count__lte=0).update(rating_avg=0)
+
+
+def apply_review_change(old, new):
+    """
+    old/new là tuple (product_id, store_id, rating, active) trước và sau khi ghi review,
+    None nếu review chưa tồn tại hoặc đã bị xoá.
+    """
+    if old == new:
+        return
+    deltas = defaultdict(lambda: defaultdict(int))
+    for state, sign in ((old, -1), (new, 1)):
+        for model, pk, rating in review_targets(*state) if state else []:
+            target = deltas[(model, pk)]
+            target['rating_sum'] += sign * rating
+            target['rating_count'] += sign
+            target[histogram_field(rating)] += sign
+
+    for (model, pk), target in deltas.items():
+        # Đổi số sao giữ nguyên count nhưng vẫn chuyển một review giữa 2 cột histogram
+        target = {field: value for field, value in target.items() if value}
+        if target:
+            apply_rating_delta(model, pk, target)
+
+
+def rebuild_ratings(review_model, model, fk_name):
+    """Tính lại rating_* (kể cả histogram) của model từ bảng review bằng subquery, dùng để sửa lệch."""
+    reviews = review_model.objects.filter(active=True, **{fk_name: OuterRef('pk')}).order_by().values(fk_name)
+    total = reviews.annotate(total=Sum('rating')).values('total')
+    count = reviews.annotate(count=Count('id')).values('count')
+    histogram = {
+        histogram_field(rating): Coalesce(Subquery(reviews.filter(rating=rating).annotate(count=Count('id'))
+                                                   .values('count'), output_field=IntegerField()), Value(0))
+        for rating in range(1, 6)
+    }
+    with transaction.atomic():
+        updated = model.objects.update(
+            rating_sum=Coalesce(Subquery(total, output_field=IntegerField()), Value(0)),
+            rating_count=Coalesce(Subquery(count, output_field=IntegerField()), Value(0)),
+            **histogram,
+        )
+        refresh_rating_avg(model.objects.all())
+    return updated
@@ -0,0 +1,94 @@
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailySales, Order, OrderDetail
+
+COMPLETED = 'completed'
+
+
+def apply_sales(order_date, rows, sign=1):
+    """rows: các dict có store_id, product_id, quantity, revenue, orders. sign=-1 để trừ."""
+    day = timezone.localdate(order_date)
+    with transaction.atomic():
+        for row in rows:
+            values = {
+                'quantity': sign * row['quantity'],
+                'revenue': sign * row['revenue'],
+                'order_count': sign * row['orders'],
+            }
+            sales, created = DailySales.objects.get_or_create(
+                store_id=row['store_id'], product_id=row['product_id'], day=day, defaults=values
+            )
+            if not created:
+                DailySales.objects.filter(pk=sales.pk).update(
+                    **{field: F(field) + value for field, value in values.items()}
+                )
+
+
+def order_rows(order_id):
+    return OrderDetail.objects.filter(order_id=order_id).values('store_id', 'product_id').annotate(
+        quantity=Sum('quantity'), revenue=Sum('price'), orders=Count('order_id', distinct=True)
+    ).order_by()
+
+
+def apply_order_status_change(order, old_status):
+    if old_status == order.order_status or COMPLETED not in (old_status, order.order_status):
+        return
+    sign = 1 if order.order_status == COMPLETED else -1
+    apply_sales(order.order_date, order_rows(order.pk), sign)
+
+
+def refresh_order_count(store_id, product_id, order_date):
+    """Đếm lại order_count (số đơn completed khác nhau) của một dòng DailySales từ OrderDetail."""
+    day = timezone.localdate(order_date)
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    orders = OrderDetail.objects.filter(
+        store_id=store_id, product_id=product_id, order__order_status=COMPLETED,
+        order__order_date__gte=start, order__order_date__lt=end,
+    ).values('order_id').distinct().count()
+    DailySales.objects.filter(store_id=store_id, product_id=product_id, day=day).update(order_count=orders)
+
+
+def apply_detail_change(old, new):
+    """
+    old/new là dict giá trị OrderDetail trước và sau khi ghi, None nếu chưa có hoặc đã xoá (gọi sau khi ghi/xoá).
+    Số lượng và doanh thu cộng dồn; order_count được đếm lại vì một đơn có thể có nhiều dòng cùng sản phẩm.
+    """
+    for values, sign in ((old, -1), (new, 1)):
+        if not values:
+            continue
+        order = Order.objects.filter(pk=values['order_id']).values('order_status', 'order_date').first()
+        if order and order['order_status'] == COMPLETED:
+            apply_sales(order['order_date'], [dict(values, revenue=values['price'], orders=0)], sign)
+            refresh_order_count(values['store_id'], values['product_id'], order['order_date'])
+
+
+def rebuild_daily_sales(store_id=None, batch_size=1000):
+    details = OrderDetail.objects.filter(order__order_status=COMPLETED)
+    rollups = DailySales.objects.all()
+    if store_id:
+        details = details.filter(store_id=store_id)
+        rollups = rollups.filter(store_id=store_id)
+
+    rows = details.annotate(day=TruncDate('order__order_date')).values('store_id', 'product_id', 'day').annotate(
+        quantity=Sum('quantity'), revenue=Sum('price'), orders=Count('order_id', distinct=True)
+    ).order_by()
+    count = 0
+    with transaction.atomic():
+        rollups.delete()
+        batch = []
+        for row in rows.iterator(chunk_size=batch_size):
+            batch.append(DailySales(store_id=row['store_id'], product_id=row['product_id'], day=row['day'],
+                                    quantity=row['quantity'], revenue=row['revenue'], order_count=row['orders']))
+            if len(batch) >= batch_size:
+                DailySales.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        DailySales.objects.bulk_create(batch)
+        count += len(batch)
+    return count
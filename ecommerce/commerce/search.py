@@ -0,0 +1,170 @@
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import FloatField, OuterRef, Q, Subquery, Sum
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework.filters import SearchFilter
+
+from .models import Product, ProductSearchTerm
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+DEFAULT_BACKEND = 'commerce.search.TermIndexBackend'
+
+
+def normalize(text):
+    # Bỏ dấu tiếng Việt: "Điện thoại" -> "dien thoai"
+    text = unicodedata.normalize('NFD', str(text).lower().replace('đ', 'd'))
+    return ''.join(c for c in text if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    if text is None:
+        return []
+    return [term[:MAX_TERM_LENGTH] for term in TOKEN_RE.findall(normalize(text))]
+
+
+class TermIndexBackend:
+    """
+    Chỉ mục đảo lưu trong bảng ProductSearchTerm (term, product, weight).
+    Chạy được trên cả SQLite lẫn MySQL, xếp hạng theo tổng trọng số các term khớp.
+    """
+    field_weights = (('product_name', 3.0), ('category__name', 2.0), ('store__store_name', 1.0), ('price', 1.0))
+    batch_size = 1000
+
+    def product_terms(self, values):
+        weights = defaultdict(float)
+        for (field, weight), value in zip(self.field_weights, values):
+            if field == 'price' and value is not None:
+                value = format(value, 'f')
+            for term in tokenize(value):
+                weights[term] += weight
+        return weights
+
+    def index_products(self, products):
+        fields = [field for field, weight in self.field_weights]
+        rows = products.order_by('pk').values_list('pk', *fields)
+        batch = []
+        for row in rows.iterator(chunk_size=self.batch_size):
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                self._write(batch)
+                batch = []
+        if batch:
+            self._write(batch)
+
+    def _write(self, rows):
+        terms = [
+            ProductSearchTerm(product_id=row[0], term=term, weight=weight)
+            for row in rows
+            for term, weight in self.product_terms(row[1:]).items()
+        ]
+        with transaction.atomic():
+            ProductSearchTerm.objects.filter(product_id__in=[row[0] for row in rows]).delete()
+            ProductSearchTerm.objects.bulk_create(terms, batch_size=self.batch_size)
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset
+        # Sản phẩm phải khớp mọi term (như SearchFilter); term cuối so khớp tiền tố để tìm theo từng phím gõ
+        *words, prefix = terms
+        conditions = [Q(term=word) for word in dict.fromkeys(words)] + [Q(term__startswith=prefix)]
+        for condition in conditions:
+            # Mỗi term một subquery đọc index (term, product, weight)
+            queryset = queryset.filter(pk__in=ProductSearchTerm.objects.filter(condition).values('product_id'))
+        matches = ProductSearchTerm.objects.filter(Q(*conditions, _connector=Q.OR))
+        rank = matches.filter(product=OuterRef('pk')).order_by().values('product').annotate(
+            rank=Sum('weight')).values('rank')
+        return queryset.annotate(search_rank=Subquery(rank, output_field=FloatField())).order_by('-search_rank', '-pk')
+
+
+# Stopword mặc định của InnoDB (INFORMATION_SCHEMA.INNODB_FT_DEFAULT_STOPWORD): không có trong FULLTEXT index
+INNODB_STOPWORDS = frozenset([
+    'a', 'about', 'an', 'are', 'as', 'at', 'be', 'by', 'com', 'de', 'en', 'for', 'from', 'how', 'i', 'in', 'is',
+    'it', 'la', 'of', 'on', 'or', 'that', 'the', 'this', 'to', 'was', 'what', 'when', 'where', 'who', 'will',
+    'with', 'und', 'www',
+])
+
+
+class MySQLFullTextBackend:
+    """
+    Dùng FULLTEXT index của MySQL trên Product.search_text (migration 0021): tên sản phẩm, danh mục, cửa hàng và giá
+    đã chuẩn hoá như TermIndexBackend, nên đổi SEARCH_BACKEND không đổi tập sản phẩm tìm thấy. index_products
+    ghi lại search_text (signal, importer, lệnh rebuild_search_index); FULLTEXT index trên product_name
+    (migration 0003) chỉ dùng để xếp khớp tên lên trước.
+    """
+    fields = [field for field, weight in TermIndexBackend.field_weights]
+    batch_size = 1000
+
+    def product_text(self, values):
+        parts = []
+        for field, value in zip(self.fields, values):
+            if field == 'price' and value is not None:
+                value = format(value, 'f')
+            parts += tokenize(value)
+        return ' '.join(parts)
+
+    def index_products(self, products):
+        rows = products.order_by('pk').values_list('pk', *self.fields)
+        batch = []
+        for row in rows.iterator(chunk_size=self.batch_size):
+            batch.append(Product(pk=row[0], search_text=self.product_text(row[1:])))
+            if len(batch) >= self.batch_size:
+                Product.objects.bulk_update(batch, ['search_text'])
+                batch = []
+        if batch:
+            Product.objects.bulk_update(batch, ['search_text'])
+
+    def boolean_query(self, terms):
+        """
+        Chuỗi BOOLEAN MODE cho các term đã tokenize: term có trong index là +term (bắt buộc, term cuối khớp tiền tố),
+        term ngắn hơn innodb_ft_min_token_size hoặc là stopword không có trong index nên +term sẽ không khớp dòng
+        nào; chúng chỉ được OR thêm (không bắt buộc). Trả về None nếu không còn term bắt buộc nào.
+        """
+        min_size = settings.SEARCH_FULLTEXT_MIN_TOKEN_SIZE
+        parts, required = [], False
+        for i, term in enumerate(terms):
+            wildcard = '*' if i == len(terms) - 1 else ''
+            if len(term) < min_size or term in INNODB_STOPWORDS:
+                parts.append(term + wildcard)
+            else:
+                parts.append(f'+{term}{wildcard}')
+                required = True
+        return ' '.join(parts) if required else None
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset
+        boolean_query = self.boolean_query(terms)
+        if boolean_query is None:
+            # Chỉ toàn term ngắn/stopword: FULLTEXT không dùng được, so khớp LIKE trên search_text
+            for term in terms:
+                queryset = queryset.filter(search_text__icontains=term)
+            return queryset.order_by('-pk')
+        table = Product._meta.db_table
+        matched = RawSQL(f'MATCH ({table}.search_text) AGAINST (%s IN BOOLEAN MODE)', (boolean_query,))
+        rank = RawSQL(f'MATCH ({table}.search_text) AGAINST (%s IN BOOLEAN MODE) + '
+                      f'MATCH ({table}.product_name) AGAINST (%s IN BOOLEAN MODE)', (boolean_query, boolean_query))
+        return queryset.annotate(search_match=matched, search_rank=rank).filter(search_match__gt=0).order_by(
+            '-search_rank', '-pk')
+
+
+def get_backend():
+    # Đọc setting mỗi lần gọi (backend không giữ trạng thái) để override_settings/đổi cấu hình có hiệu lực
+    return import_string(getattr(settings, 'SEARCH_BACKEND', DEFAULT_BACKEND))()
+
+
+class ProductSearchFilter(SearchFilter):
+    """Thay cho SearchFilter (icontains trên nhiều bảng) bằng search backend đã cấu hình."""
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        return get_backend().search(queryset, query)
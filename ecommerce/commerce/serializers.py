@@ -1,19 +1,42 @@
 from rest_framework import serializers
 from rest_framework.serializers import ModelSerializer, HyperlinkedModelSerializer
 from .models import *
-
-class UserSerializer(HyperlinkedModelSerializer):
+from .media import image_url, stored_variants
+from .catalog_io import detect_format
+from .category_tree import CYCLE_MESSAGE, creates_cycle
+from .inventory import set_stock
+from .uploads import StagedUploadMixin
+
+class ImageVariantsMixin:
+    """
+    Map *_variants đầy đủ (mọi preset và srcset) chỉ có khi lấy một đối tượng hoặc ?expand=true,
+    trong danh sách chỉ còn {"thumb": ...} để response không phình theo số ảnh.
+    """
+
+    def variants_for(self, value, variants):
+        variants = stored_variants(value, variants)
+        request = self.context.get('request')
+        expanded = request is not None and request.query_params.get('expand', '').lower() in ('1', 'true', 'yes')
+        if isinstance(self.parent, serializers.ListSerializer) and not expanded:
+            return {'thumb': variants['thumb']} if variants else {}
+        return variants
+
+
+class UserSerializer(ImageVariantsMixin, StagedUploadMixin, HyperlinkedModelSerializer):
+    upload_fields = ('avatar',)
     new_password = serializers.CharField(write_only=True, required=False)
     avatar_url = serializers.SerializerMethodField()
+    avatar_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = User
-        fields = ['id', 'first_name', 'last_name', 'email', 'username', 'password', 'avatar', 'address', 'phone_number', 'role', 'new_password', 'avatar_url', 'is_active']
+        fields = ['id', 'first_name', 'last_name', 'email', 'username', 'password', 'avatar', 'address', 'phone_number', 'role', 'new_password', 'avatar_url', 'avatar_variants', 'is_active']
         extra_kwargs = {
             'password': {'write_only': True}
         }
 
     def create(self, validated_data):
+        files = self.pop_uploads(validated_data, creating=True)
         user = User(**validated_data)
         user.set_password(validated_data['password'])
         if user.role == User.SELLER_ROLE:
@@ -21,38 +44,50 @@ class UserSerializer(HyperlinkedModelSerializer):
         else:
             user.is_active = True
         user.save()
+        self.stage_uploads(user, files)
         return user
 
     def get_avatar_url(self, obj):
-        if obj.avatar:
-            return obj.avatar.url
-        return None
+        return image_url(obj.avatar)
+
+    def get_avatar_variants(self, obj):
+        return self.variants_for(obj.avatar, obj.avatar_variants)
 
 
-class StoreSerializer(HyperlinkedModelSerializer):
+class StoreSerializer(ImageVariantsMixin, StagedUploadMixin, HyperlinkedModelSerializer):
+    upload_fields = ('wallpaper',)
     wallpaper_url = serializers.SerializerMethodField()
+    wallpaper_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Store
-        fields = ["id", "user", "store_name", "wallpaper", "wallpaper_url", "description", "created_at", "updated_at"]
+        fields = ["id", "user", "store_name", "wallpaper", "wallpaper_url", "wallpaper_variants", "description", "rating_avg", "rating_count", "created_at", "updated_at"]
 
     def get_wallpaper_url(self, obj):
-        if obj.wallpaper:
-            return obj.wallpaper.url
-        return None
+        return image_url(obj.wallpaper)
 
+    def get_wallpaper_variants(self, obj):
+        return self.variants_for(obj.wallpaper, obj.wallpaper_variants)
 
-class CategorySerializer(HyperlinkedModelSerializer):
+
+class CategorySerializer(ImageVariantsMixin, HyperlinkedModelSerializer):
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Category
-        fields = ['id', 'name', 'parent', 'image', 'image_url']
+        fields = ['id', 'name', 'parent', 'image', 'image_url', 'image_variants']
 
     def get_image_url(self, obj):
-        if obj.image:
-            return obj.image.url
-        return None
+        return image_url(obj.image)
+
+    def get_image_variants(self, obj):
+        return self.variants_for(obj.image, obj.image_variants)
+
+    def validate_parent(self, parent):
+        if self.instance is not None and creates_cycle(self.instance, parent):
+            raise serializers.ValidationError(CYCLE_MESSAGE)
+        return parent
 
 
 
@@ -62,23 +97,48 @@ class ReviewSerializer(ModelSerializer):
         fields = ['id', 'user', 'product', 'store', 'rating', 'comment', 'created_at', 'updated_at']
 
 
+class ReviewFeedSerializer(ReviewSerializer):
+    # Kèm tên và ảnh đại diện người viết, cần queryset đã select_related('user') (xem ReviewFeedMixin)
+    username = serializers.CharField(source='user.username', read_only=True)
+    first_name = serializers.CharField(source='user.first_name', read_only=True)
+    last_name = serializers.CharField(source='user.last_name', read_only=True)
+    avatar_url = serializers.SerializerMethodField()
+
+    class Meta(ReviewSerializer.Meta):
+        fields = ReviewSerializer.Meta.fields + ['username', 'first_name', 'last_name', 'avatar_url']
+
+    def get_avatar_url(self, obj):
+        return stored_variants(obj.user.avatar, obj.user.avatar_variants).get('thumb')
+
+
 class ProductSerializer(ModelSerializer):
     class Meta:
         model = Product
-        fields = ['id', 'store', 'category', 'product_name', 'price', 'description', 'stock', 'created_at', 'updated_at']
-
-class ProductImageSerializer(HyperlinkedModelSerializer):
+        fields = ['id', 'store', 'category', 'product_name', 'price', 'description', 'stock', 'rating_avg', 'rating_count', 'created_at', 'updated_at']
+
+    def update(self, instance, validated_data):
+        restocked = instance.stock_shards and validated_data.get('stock', instance.stock) != instance.stock
+        instance = super().update(instance, validated_data)
+        # Sản phẩm chia shard: tồn kho thật nằm trong StockShard, chia lại theo số mới
+        if restocked:
+            set_stock(instance.pk, instance.stock, instance.stock_shards)
+        return instance
+
+class ProductImageSerializer(ImageVariantsMixin, StagedUploadMixin, HyperlinkedModelSerializer):
+    upload_fields = ('image',)
     image_url = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = ProductImage
-        fields = ['id', 'product', 'image', 'image_url', 'created_at', 'updated_at']
+        fields = ['id', 'product', 'image', 'image_url', 'image_variants', 'created_at', 'updated_at']
 
 
     def get_image_url(self, obj):
-        if obj.image:
-            return obj.image.url
-        return None
+        return image_url(obj.image)
+
+    def get_image_variants(self, obj):
+        return self.variants_for(obj.image, obj.image_variants)
 
 
 class ProductVariantSerializer(serializers.ModelSerializer):
@@ -89,6 +149,40 @@ class ProductVariantSerializer(serializers.ModelSerializer):
         fields = ['id', 'size', 'color', 'product_id']
 
 
+class ProductCardImageSerializer(ModelSerializer):
+    # Ảnh nhỏ cho danh sách: thumb và srcset của preset card thay vì ảnh gốc
+    image_url = serializers.SerializerMethodField()
+    thumb_url = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ProductImage
+        fields = ['id', 'image_url', 'thumb_url', 'srcset']
+
+    def get_image_url(self, obj):
+        return image_url(obj.image)
+
+    def get_thumb_url(self, obj):
+        return stored_variants(obj.image, obj.image_variants).get('thumb')
+
+    def get_srcset(self, obj):
+        return stored_variants(obj.image, obj.image_variants).get('srcset', {}).get('card')
+
+
+class ProductExpandedSerializer(ProductSerializer):
+    # Gộp ảnh, biến thể, đánh giá và tên cửa hàng vào một response, cần queryset đã prefetch (xem ProductExpandMixin)
+    store_name = serializers.CharField(source='store.store_name', read_only=True)
+    images = ProductCardImageSerializer(many=True, read_only=True)
+    variants = ProductVariantSerializer(source='productvariant_set', many=True, read_only=True)
+    rating = serializers.SerializerMethodField()
+
+    class Meta(ProductSerializer.Meta):
+        fields = ProductSerializer.Meta.fields + ['store_name', 'images', 'variants', 'rating']
+
+    def get_rating(self, obj):
+        return {'average': obj.average_rating(), 'count': obj.rating_count}
+
+
 class OrderSerializer(serializers.ModelSerializer):
     class Meta:
         model = Order
@@ -101,10 +195,139 @@ class OrderDetailSerializer(serializers.ModelSerializer):
         model = OrderDetail
         fields = ['id', 'order', 'store', 'product', 'quantity', 'price', 'note', 'product_name']
 
+class OrderHistoryLineSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.product_name', read_only=True)
+    thumb_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = OrderDetail
+        fields = ['id', 'product', 'product_name', 'thumb_url', 'quantity', 'price', 'note']
+
+    def get_thumb_url(self, obj):
+        # first_images: ảnh đầu tiên của sản phẩm, prefetch sẵn (xem UserOrderViewSet)
+        images = obj.product.first_images
+        return stored_variants(images[0].image, images[0].image_variants).get('thumb') if images else None
+
+
+class CartLineSerializer(OrderHistoryLineSerializer):
+    # Dòng giỏ hàng chỉ với các trường của thẻ sản phẩm; available tính trong SQL (xem checkout.cart_summary)
+    unit_price = serializers.DecimalField(source='product.price', max_digits=10, decimal_places=2, read_only=True)
+    available = serializers.BooleanField(read_only=True)
+
+    class Meta(OrderHistoryLineSerializer.Meta):
+        fields = ['id', 'order', 'product', 'product_name', 'thumb_url', 'unit_price', 'quantity', 'price', 'note',
+                  'available']
+
+
+class CartStoreSerializer(serializers.Serializer):
+    store = serializers.IntegerField(source='store_id')
+    store_name = serializers.CharField()
+    subtotal = serializers.DecimalField(max_digits=12, decimal_places=2)
+    item_count = serializers.IntegerField()
+    line_count = serializers.IntegerField()
+    unavailable_count = serializers.IntegerField()
+    items = CartLineSerializer(many=True)
+
+
+class OrderHistoryPaymentSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Payment
+        fields = ['payment_method', 'amount', 'payment_date', 'transaction_id']
+
+
+class OrderHistorySerializer(serializers.ModelSerializer):
+    # Đơn hàng kèm các dòng sản phẩm và thanh toán trong một response, cần queryset đã prefetch (xem UserOrderViewSet)
+    store_name = serializers.CharField(source='store.store_name', read_only=True)
+    items = OrderHistoryLineSerializer(source='orderdetail_set', many=True, read_only=True)
+    payment = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Order
+        fields = ['id', 'store', 'store_name', 'order_date', 'order_status', 'payment_method', 'total_amount',
+                  'item_count', 'items', 'payment']
+
+    def get_payment(self, obj):
+        # Chưa thanh toán thì không có dòng Payment
+        payment = getattr(obj, 'payment', None)
+        return OrderHistoryPaymentSerializer(payment).data if payment else None
+
+
 class PaymentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Payment
         fields = ['id', 'order', 'payment_method', 'amount', 'payment_date', 'transaction_id']
 
 
+class CheckoutItemSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    note = serializers.CharField(required=False, allow_blank=True)
+
+
+class CheckoutSerializer(serializers.Serializer):
+    items = CheckoutItemSerializer(many=True, required=False)
+    # Id các StockReservation đang giữ hàng (POST /reservations/), thanh toán cùng hoặc thay cho items
+    reservations = serializers.ListField(child=serializers.IntegerField(), required=False)
+    payment_method = serializers.ChoiceField(choices=Order.PAYMENT_METHOD_CHOICES)
+    transaction_id = serializers.CharField(required=False, allow_blank=True, max_length=255)
+
+    def validate(self, attrs):
+        if not attrs.get('items') and not attrs.get('reservations'):
+            raise serializers.ValidationError({'items': ['Provide items or reservations.']})
+        return attrs
+
+
+class HoldSerializer(serializers.Serializer):
+    items = CheckoutItemSerializer(many=True, allow_empty=False)
+
 
+class StockReservationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockReservation
+        fields = ['id', 'product', 'quantity', 'status', 'expires_at', 'order', 'created_at']
+
+
+class MediaUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = MediaUpload
+        fields = ['id', 'field', 'object_id', 'status', 'attempts', 'error', 'result', 'created_at', 'updated_at']
+
+
+class ProductImportSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductImport
+        fields = ['id', 'store', 'format', 'original_name', 'status', 'processed_rows', 'created_count',
+                  'updated_count', 'error_count', 'errors', 'error', 'created_at', 'updated_at']
+
+
+class ProductImportFileSerializer(serializers.Serializer):
+    file = serializers.FileField()
+    # Mặc định đoán theo đuôi file (.csv, .ndjson, .jsonl)
+    type = serializers.ChoiceField(choices=ProductImport.FORMAT_CHOICES, required=False)
+
+    def validate(self, attrs):
+        if not attrs.get('type'):
+            attrs['type'] = detect_format(attrs['file'].name)
+            if attrs['type'] is None:
+                raise serializers.ValidationError({'type': ['Unknown file type, use .csv or .ndjson.']})
+        return attrs
+
+
+class OrderFilterSerializer(serializers.Serializer):
+    # Tham số lọc đơn hàng trên query string, xem exports.filter_orders
+    order_status = serializers.ChoiceField(choices=Order.ORDER_STATUS_CHOICES, required=False)
+    payment_method = serializers.ChoiceField(choices=Order.PAYMENT_METHOD_CHOICES, required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('start') and attrs.get('end') and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'end': ['End date must not be before start date.']})
+        return attrs
+
+
+class OrderExportSerializer(OrderFilterSerializer):
+    type = serializers.ChoiceField(choices=['csv', 'ndjson'], default='csv')
+    # orders: mỗi đơn một dòng, details: mỗi dòng sản phẩm một dòng (kèm thông tin đơn và thanh toán)
+    level = serializers.ChoiceField(choices=['orders', 'details'], default='details')
+    compress = serializers.ChoiceField(choices=['gzip'], required=False)
@@ -0,0 +1,188 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from oauth2_provider.models import get_access_token_model
+
+from .authentication import bump_user_version, invalidate_tokens
+from .caching import bump_version
+from .category_tree import check_parent, update_category_path
+from .media import MEDIA_FIELDS, image_source, image_variants
+from .models import Category, Order, OrderDetail, Product, ProductImage, ProductVariant, Review, Store, User
+from .orders import apply_item_count_change, invalidate_status_counts
+from .ratings import apply_review_change
+from .rollups import apply_detail_change, apply_order_status_change
+from .search import get_backend
+
+AccessToken = get_access_token_model()
+
+
+def _review_state(review):
+    return review.product_id, review.store_id, review.rating, review.active
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_state(sender, instance, **kwargs):
+    instance._rating_state = None
+    if instance.pk:
+        old = Review.objects.filter(pk=instance.pk).values_list('product_id', 'store_id', 'rating', 'active').first()
+        instance._rating_state = old
+
+
+@receiver(post_save, sender=Review)
+def update_rating_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    apply_review_change(getattr(instance, '_rating_state', None), _review_state(instance))
+    instance._rating_state = _review_state(instance)
+
+
+@receiver(post_delete, sender=Review)
+def update_rating_on_delete(sender, instance, **kwargs):
+    apply_review_change(_review_state(instance), None)
+
+
+@receiver(post_save, sender=Product)
+def index_product_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    get_backend().index_products(Product.objects.filter(pk=instance.pk))
+
+
+@receiver(pre_save, sender=Store)
+@receiver(pre_save, sender=Category)
+def remember_indexed_name(sender, instance, **kwargs):
+    field = 'store_name' if sender is Store else 'name'
+    instance._indexed_name = None
+    if instance.pk:
+        instance._indexed_name = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+@receiver(post_save, sender=Store)
+def reindex_store_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or getattr(instance, '_indexed_name', None) == instance.store_name:
+        return
+    get_backend().index_products(Product.objects.filter(store_id=instance.pk))
+
+
+@receiver(post_save, sender=Category)
+def reindex_category_products(sender, instance, created=False, raw=False, **kwargs):
+    if raw or created or getattr(instance, '_indexed_name', None) == instance.name:
+        return
+    get_backend().index_products(Product.objects.filter(category_id=instance.pk))
+
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._old_status = None
+    if instance.pk:
+        instance._old_status = Order.objects.filter(pk=instance.pk).values_list('order_status', flat=True).first()
+
+
+@receiver(post_save, sender=Order)
+def update_sales_on_status_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    apply_order_status_change(instance, getattr(instance, '_old_status', None))
+    instance._old_status = instance.order_status
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_delete, sender=Order)
+def invalidate_order_status_counts(sender, instance, **kwargs):
+    invalidate_status_counts(instance)
+
+
+DETAIL_ROLLUP_FIELDS = ('order_id', 'store_id', 'product_id', 'quantity', 'price')
+
+
+def _detail_state(detail):
+    return {field: getattr(detail, field) for field in DETAIL_ROLLUP_FIELDS}
+
+
+@receiver(pre_save, sender=OrderDetail)
+def remember_detail_state(sender, instance, **kwargs):
+    instance._rollup_state = None
+    if instance.pk:
+        instance._rollup_state = OrderDetail.objects.filter(pk=instance.pk).values(*DETAIL_ROLLUP_FIELDS).first()
+
+
+@receiver(post_save, sender=OrderDetail)
+def update_sales_on_detail_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old, new = getattr(instance, '_rollup_state', None), _detail_state(instance)
+    if old != new:
+        apply_detail_change(old, new)
+        if not old or (old['order_id'], old['quantity']) != (new['order_id'], new['quantity']):
+            apply_item_count_change(old, new)
+    instance._rollup_state = new
+
+
+@receiver(post_delete, sender=OrderDetail)
+def update_sales_on_detail_delete(sender, instance, **kwargs):
+    # post_delete: khi xoá đơn theo cascade, mọi dòng của đơn đã bị xoá (order_count đếm lại đúng)
+    # nhưng bản thân Order vẫn còn trong DB vì Django xoá bảng con trước
+    apply_detail_change(_detail_state(instance), None)
+    apply_item_count_change(_detail_state(instance), None)
+
+
+# Nhóm cache bị ảnh hưởng khi mỗi model thay đổi, xem CatalogCacheMixin
+CACHE_SCOPES = {
+    Product: ('product',),
+    ProductImage: ('product',),
+    ProductVariant: ('product',),
+    Store: ('product', 'store'),
+    Review: ('product', 'store'),
+    Category: ('category',),
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_catalog_cache(sender, **kwargs):
+    scopes = CACHE_SCOPES.get(sender)
+    if scopes:
+        bump_version(*scopes)
+
+
+@receiver(pre_save, sender=Category)
+def validate_category_parent(sender, instance, raw=False, **kwargs):
+    if raw or not instance.parent_id:
+        return
+    check_parent(instance, Category.objects.filter(pk=instance.parent_id).values_list('path', flat=True).first())
+
+
+@receiver(post_save, sender=Category)
+def update_category_tree(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    update_category_path(Category, instance)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_save, sender=Store)
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=ProductImage)
+def store_image_variants(sender, instance, raw=False, **kwargs):
+    # Chạy sau khi lưu vì CloudinaryField chỉ có public_id sau khi upload xong (trong pre_save của field)
+    field, variants_field = MEDIA_FIELDS[sender]
+    value = getattr(instance, field)
+    if raw or getattr(instance, variants_field).get('source') == image_source(value):
+        return
+    variants = image_variants(value)
+    setattr(instance, variants_field, variants)
+    sender.objects.filter(pk=instance.pk).update(**{variants_field: variants})
+
+
+@receiver(post_save, sender=AccessToken)
+@receiver(post_delete, sender=AccessToken)
+def invalidate_cached_token(sender, instance, **kwargs):
+    # AccessToken.revoke(), thu hồi refresh token và /o/revoke_token/ đều xoá dòng AccessToken
+    invalidate_tokens([instance.token_checksum])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, raw=False, **kwargs):
+    # Process khác thấy phiên bản mới và đọc lại user (role, is_active...) ở request sau
+    if not raw:
+        bump_user_version(instance.pk)
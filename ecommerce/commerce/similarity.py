@@ -0,0 +1,166 @@
+import math
+from collections import Counter
+
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+from django.db.models import Count, F, Min, Q
+from django.utils import timezone
+from django.utils.html import strip_tags
+
+from .models import Product, SimilarProduct
+from .search import tokenize
+
+NAME_WEIGHT = 2
+CATEGORY_WEIGHT = 0.5
+PRICE_BAND_WEIGHT = 0.3
+CHUNK_SIZE = 256
+# Số ô điểm tối đa của một khối (số dòng × số sản phẩm), ~128 MB float64 khi mọi sản phẩm cùng danh mục/khoảng giá
+MAX_SCORE_CELLS = 16 * 1024 * 1024
+
+
+def price_band(price):
+    # Mỗi band rộng gấp đôi band trước: 0-1k, 1k-2k, 2k-4k, ...
+    return int(math.log2(float(price) / 1000 + 1)) if price else 0
+
+
+def l2_normalize(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+def one_hot(values, weight):
+    codes = {value: i for i, value in enumerate(sorted(set(values), key=str))}
+    rows = np.arange(len(values))
+    cols = np.array([codes[value] for value in values], dtype=np.int64)
+    data = np.full(len(values), weight, dtype=np.float64)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(len(values), len(codes)))
+
+
+def build_matrix(rows):
+    """rows: (id, product_name, description, category_id, price). Trả về ma trận TF-IDF đã chuẩn hoá L2."""
+    vocabulary = {}
+    indptr, indices, counts = [0], [], []
+    for _, name, description, _, _ in rows:
+        terms = Counter(tokenize(strip_tags(description or '')))
+        for term in tokenize(name):
+            terms[term] += NAME_WEIGHT
+        for term, count in terms.items():
+            indices.append(vocabulary.setdefault(term, len(vocabulary)))
+            counts.append(count)
+        indptr.append(len(indices))
+
+    tf = sparse.csr_matrix((np.array(counts, dtype=np.float64), indices, indptr),
+                           shape=(len(rows), max(len(vocabulary), 1)))
+    tf.data = 1 + np.log(tf.data)
+    df = np.bincount(tf.indices, minlength=tf.shape[1])
+    idf = np.log((1 + len(rows)) / (1 + df)) + 1
+    text = l2_normalize(tf @ sparse.diags(idf))
+
+    category = one_hot([row[3] for row in rows], CATEGORY_WEIGHT)
+    band = one_hot([price_band(row[4]) for row in rows], PRICE_BAND_WEIGHT)
+    return l2_normalize(sparse.hstack([text, category, band]).tocsr())
+
+
+def score_chunks(matrix, rows):
+    """Sinh (chunk, điểm cosine dạng sparse của các dòng chunk với mọi dòng), khối nhỏ lại khi catalog lớn."""
+    transposed = matrix.T.tocsc()
+    chunk_size = max(1, min(CHUNK_SIZE, MAX_SCORE_CELLS // max(matrix.shape[0], 1)))
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        yield chunk, (matrix[chunk] @ transposed).tocsr()
+
+
+def top_k_neighbors(matrix, targets, k):
+    """Trả về {row: [(neighbor_row, score), ...]} cho các dòng targets, theo cosine similarity."""
+    result = {}
+    for chunk, scores in score_chunks(matrix, targets):
+        for i, row in enumerate(chunk):
+            # Chỉ xét các ô khác 0 của dòng sparse, không dựng ma trận dày chunk × N
+            cols = scores.indices[scores.indptr[i]:scores.indptr[i + 1]]
+            values = scores.data[scores.indptr[i]:scores.indptr[i + 1]]
+            keep = (cols != row) & (values > 0)
+            cols, values = cols[keep], values[keep]
+            if len(cols) > k:
+                best = np.argpartition(-values, k - 1)[:k] if k > 0 else []
+                cols, values = cols[best], values[best]
+            order = np.lexsort((cols, -values))
+            result[row] = [(int(cols[j]), float(values[j])) for j in order]
+    return result
+
+
+def changed_products():
+    changed = Product.objects.filter(Q(similar_updated_at__isnull=True) | Q(updated_at__gt=F('similar_updated_at')))
+    return list(changed.values_list('pk', flat=True))
+
+
+def affected_products(matrix, product_ids, changed_rows, k, batch_size=1000):
+    """
+    Sản phẩm mà top-k có thể đổi vì các dòng changed_rows: điểm mới với một sản phẩm vừa đổi cao hơn điểm thấp nhất
+    trong danh sách hiện tại của nó, hoặc danh sách chưa đủ k láng giềng.
+    """
+    best = np.zeros(matrix.shape[0])
+    for _, scores in score_chunks(matrix, changed_rows):
+        best = np.maximum(best, scores.max(axis=0).toarray().ravel())
+    best[changed_rows] = 0
+    candidates = np.flatnonzero(best > 0)
+    affected = set()
+    for start in range(0, len(candidates), batch_size):
+        batch = {product_ids[row]: best[row] for row in candidates[start:start + batch_size]}
+        lists = (SimilarProduct.objects.filter(product_id__in=batch).order_by().values('product_id')
+                 .annotate(count=Count('id'), lowest=Min('score')).values_list('product_id', 'count', 'lowest'))
+        current = {product_id: (count, lowest) for product_id, count, lowest in lists}
+        for product_id, score in batch.items():
+            count, lowest = current.get(product_id, (0, 0))
+            if count < k or score > lowest:
+                affected.add(product_id)
+    return affected
+
+
+def stale_products(changed_ids, batch_size=1000):
+    stale = set(changed_ids)
+    # Sản phẩm đang trỏ tới sản phẩm vừa đổi cũng phải tính lại điểm
+    for start in range(0, len(changed_ids), batch_size):
+        batch = changed_ids[start:start + batch_size]
+        stale.update(SimilarProduct.objects.filter(similar_id__in=batch).values_list('product_id', flat=True))
+    return stale
+
+
+def compute_similar_products(k=10, full=False, batch_size=1000):
+    """
+    Tính lại bảng SimilarProduct cho sản phẩm đã đổi, sản phẩm đang trỏ tới chúng và sản phẩm mà chúng có thể
+    chen vào top-k. IDF phụ thuộc toàn catalog nên điểm của các cặp không đổi vẫn trôi dần: chạy full=True
+    định kỳ (ví dụ mỗi đêm) bên cạnh lượt cập nhật tăng dần.
+    """
+    started_at = timezone.now()
+    rows = list(Product.objects.filter(active=True).order_by('pk').values_list(
+        'pk', 'product_name', 'description', 'category_id', 'price'))
+    matrix = build_matrix(rows) if rows else None
+    if full:
+        stale_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    else:
+        changed_ids = changed_products()
+        stale = stale_products(changed_ids, batch_size)
+        changed = set(changed_ids)
+        changed_rows = [i for i, row in enumerate(rows) if row[0] in changed]
+        if changed_rows:
+            stale |= affected_products(matrix, [row[0] for row in rows], changed_rows, k, batch_size)
+        stale_ids = sorted(stale)
+    stale = set(stale_ids)
+    targets = [i for i, row in enumerate(rows) if row[0] in stale]
+
+    neighbors = top_k_neighbors(matrix, targets, k) if targets else {}
+    new_rows = [
+        SimilarProduct(product_id=rows[row][0], similar_id=rows[col][0], rank=rank, score=score)
+        for row, items in neighbors.items()
+        for rank, (col, score) in enumerate(items, start=1)
+    ]
+    with transaction.atomic():
+        # Sản phẩm đã ngừng bán vẫn nằm trong stale_ids nên láng giềng cũ của nó cũng bị xoá
+        for start in range(0, len(stale_ids), batch_size):
+            batch = stale_ids[start:start + batch_size]
+            SimilarProduct.objects.filter(product_id__in=batch).delete()
+            Product.objects.filter(pk__in=batch).update(similar_updated_at=started_at)
+        SimilarProduct.objects.bulk_create(new_rows, batch_size=batch_size)
+    return len(stale_ids)
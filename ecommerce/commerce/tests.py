@@ -1,3 +1,1304 @@
-from django.test import TestCase
+import csv
+import gzip
+import io
+import json
+import os
+import tempfile
+from base64 import urlsafe_b64encode
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+import cloudinary_storage.app_settings  # noqa: F401  nạp CLOUDINARY_STORAGE để build url ảnh
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from oauth2_provider.models import AccessToken
+from rest_framework.test import APIClient
+
+from .authentication import token_cache_key, token_checksum
+from .admin import CategoryForm
+from .caching import cache_stats, get_response_cache, record
+from .category_tree import CYCLE_MESSAGE
+from .dashboard import refresh_stats_snapshot
+from .inventory import sync_sharded_stock
+from .search import MySQLFullTextBackend
+from .similarity import build_matrix, top_k_neighbors
+from .models import *
+
+
+class ProductExpandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.store = Store.objects.create(user=user, store_name='Store', description='', wallpaper='wallpaper')
+        self.category = Category.objects.create(name='Category', image='category')
+
+    def create_products(self, count):
+        for i in range(count):
+            product = Product.objects.create(store=self.store, category=self.category, product_name=f'Product {i}',
+                                             price=1000 + i, description='<p>description</p>', stock=10)
+            ProductImage.objects.create(product=product, image=f'image-{i}-a')
+            ProductImage.objects.create(product=product, image=f'image-{i}-b')
+            ProductVariant.objects.create(product=product, size='M', color='Red')
+
+    def test_expanded_list_has_fixed_query_count(self):
+        self.create_products(2)
+        # COUNT + products (join store) + images + variants
+        with self.assertNumQueries(4):
+            response = self.client.get('/products/', {'expand': 'true'})
+        self.assertEqual(len(response.data['results']), 2)
+
+        self.create_products(18)
+        with self.assertNumQueries(4):
+            response = self.client.get('/products/', {'expand': 'true'})
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_expanded_product_fields(self):
+        self.create_products(1)
+        product = Product.objects.get()
+        Review.objects.create(user=self.store.user, product=product, rating=4)
+
+        with self.assertNumQueries(3):
+            response = self.client.get(f'/products/{product.id}/', {'expand': '1'})
+        self.assertEqual(response.data['store_name'], 'Store')
+        self.assertEqual(len(response.data['images']), 2)
+        self.assertTrue(response.data['images'][0]['image_url'])
+        self.assertEqual(response.data['variants'][0]['size'], 'M')
+        self.assertEqual(response.data['rating'], {'average': 4.0, 'count': 1})
+
+    def test_store_and_category_listings_support_expand(self):
+        self.create_products(3)
+        # Danh mục cần thêm một truy vấn lấy path để lọc cả cây con
+        for url, queries in [(f'/products-store/{self.store.id}/', 4), (f'/products-category/{self.category.id}/', 5)]:
+            with self.assertNumQueries(queries):
+                response = self.client.get(url, {'expand': 'true'})
+            self.assertEqual(len(response.data['results']), 3)
+            self.assertIn('images', response.data['results'][0])
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create(username='customer', avatar='avatar')
+        self.client.force_authenticate(self.customer)
+        self.products = []
+        for i in range(2):
+            seller = User.objects.create(username=f'seller{i}', avatar='avatar', role=User.SELLER_ROLE)
+            store = Store.objects.create(user=seller, store_name=f'Store {i}', description='', wallpaper='wallpaper')
+            self.products += [
+                Product.objects.create(store=store, product_name=f'Product {i}-{j}', price=1000 * (j + 1),
+                                       description='', stock=5)
+                for j in range(15)
+            ]
+
+    def test_checkout_splits_cart_by_store(self):
+        items = [{'product': product.id, 'quantity': 2} for product in self.products]
+        # Số truy vấn không phụ thuộc số dòng trong giỏ, chỉ phụ thuộc số cửa hàng
+        with self.assertNumQueries(8):
+            response = self.client.post('/checkout/', {'items': items, 'payment_method': 'momo'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(response.data), 2)
+
+        for order in Order.objects.all():
+            self.assertEqual(order.orderdetail_set.count(), 15)
+            self.assertEqual(order.total_amount, sum(1000 * (j + 1) * 2 for j in range(15)))
+            self.assertEqual(order.payment.amount, order.total_amount)
+        self.assertEqual(set(Product.objects.values_list('stock', flat=True)), {3})
+
+    def test_checkout_rolls_back_when_out_of_stock(self):
+        items = [{'product': self.products[0].id, 'quantity': 1}, {'product': self.products[1].id, 'quantity': 6}]
+        response = self.client.post('/checkout/', {'items': items, 'payment_method': 'momo'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.products[0].id).stock, 5)
+
+
+class CatalogCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_response_cache().clear()
+        self.client = APIClient()
+        user = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.store = Store.objects.create(user=user, store_name='Store', description='', wallpaper='wallpaper')
+        self.product = Product.objects.create(store=self.store, product_name='Product', price=1000,
+                                              description='', stock=10)
+
+    def test_cached_response_and_not_modified(self):
+        response = self.client.get('/products/')
+        self.assertEqual(response['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            response = self.client.get('/products/')
+        self.assertEqual(response['X-Cache'], 'HIT')
+
+        response = self.client.get('/products/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_seller_edit_invalidates_cache(self):
+        etag = self.client.get(f'/products/{self.product.id}/')['ETag']
+        self.product.product_name = 'Renamed'
+        self.product.save()
+
+        response = self.client.get(f'/products/{self.product.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['product_name'], 'Renamed')
+
+    def test_stock_change_expires_with_cache_window(self):
+        with mock.patch('commerce.caching.time.time', return_value=1_000_000):
+            etag = self.client.get(f'/products/{self.product.id}/')['ETag']
+            # Tồn kho đổi không tăng phiên bản: trong cùng khung thời gian vẫn trả 304
+            Product.objects.filter(pk=self.product.id).update(stock=3)
+            response = self.client.get(f'/products/{self.product.id}/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+        with mock.patch('commerce.caching.time.time', return_value=1_000_300):
+            response = self.client.get(f'/products/{self.product.id}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stock'], 3)
+
+    def test_stats_are_flushed_to_cache(self):
+        before = cache_stats()
+        record('hit')
+        record('hit')
+        record('miss')
+        stats = cache_stats()
+        self.assertEqual(stats['hits'], before['hits'] + 2)
+        self.assertEqual(stats['misses'], before['misses'] + 1)
+
+
+class ProductSearchTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.store = Store.objects.create(user=seller, store_name='Shop', description='', wallpaper='wallpaper')
+        self.category = Category.objects.create(name='Thời trang', image='category')
+
+    def create_product(self, name, category=None):
+        return Product.objects.create(store=self.store, category=category, product_name=name, price=1000,
+                                      description='', stock=10)
+
+    def search(self, query):
+        return [product['id'] for product in self.client.get('/products/', {'search': query}).data['results']]
+
+    def test_every_term_must_match(self):
+        red_shoe = self.create_product('Red shoe')
+        red_shirt = self.create_product('Red shirt')
+        self.create_product('Blue shoe')
+        self.assertEqual(self.search('red shoe'), [red_shoe.id])
+        # Term cuối khớp tiền tố, các term trước khớp nguyên từ
+        self.assertEqual(self.search('red sh'), [red_shirt.id, red_shoe.id])
+        self.assertEqual(self.search('re shoe'), [])
+
+    def test_diacritics_are_folded(self):
+        phone = self.create_product('Điện thoại Samsung')
+        self.assertEqual(self.search('dien thoai'), [phone.id])
+        self.assertEqual(self.search('ĐIỆN THOẠI'), [phone.id])
+
+    def test_ranked_by_matched_field_weight(self):
+        # Khớp tên sản phẩm (3) xếp trên khớp tên danh mục (2)
+        by_category = self.create_product('Áo khoác', self.category)
+        by_name = self.create_product('Áo thời trang')
+        self.assertEqual(self.search('thoi trang'), [by_name.id, by_category.id])
+
+    def test_reindexed_on_save(self):
+        product = self.create_product('Giày')
+        product.product_name = 'Dép'
+        product.save()
+        self.assertEqual(self.search('giay'), [])
+        self.assertEqual(self.search('dep'), [product.id])
+
+        # Đổi tên danh mục/cửa hàng cập nhật chỉ mục của các sản phẩm thuộc về nó
+        product.category = self.category
+        product.save()
+        self.category.name = 'Sandal'
+        self.category.save()
+        self.store.store_name = 'Bitis'
+        self.store.save()
+        self.assertEqual(self.search('sandal bitis'), [product.id])
+        self.assertEqual(self.search('thoi'), [])
+
+    @override_settings(SEARCH_BACKEND='commerce.search.MySQLFullTextBackend')
+    def test_fulltext_backend_covers_same_fields(self):
+        # search_text có đủ các trường của TermIndexBackend, cập nhật khi lưu sản phẩm và khi đổi tên danh mục
+        product = self.create_product('Áo khoác', self.category)
+        self.assertEqual(Product.objects.get(pk=product.pk).search_text, 'ao khoac thoi trang shop 1000')
+        self.category.name = 'Đồ nam'
+        self.category.save()
+        self.assertEqual(Product.objects.get(pk=product.pk).search_text, 'ao khoac do nam shop 1000')
+        # Chỉ toàn term ngắn hơn min token size: so khớp LIKE thay vì FULLTEXT (chạy được cả trên SQLite)
+        self.assertEqual(self.search('ao do'), [product.id])
+
+    def test_fulltext_short_terms_and_stopwords_are_optional(self):
+        backend = MySQLFullTextBackend()
+        self.assertEqual(backend.boolean_query(['ao', 'khoac', 'do']), 'ao +khoac do*')
+        self.assertEqual(backend.boolean_query(['the', 'shoes']), 'the +shoes*')
+        self.assertIsNone(backend.boolean_query(['ao', 'do']))
+
+
+class SimilarProductTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.store = Store.objects.create(user=seller, store_name='Store', description='', wallpaper='wallpaper')
+
+    def create_product(self, name, price=1000):
+        return Product.objects.create(store=self.store, product_name=name, price=price, description='', stock=10)
+
+    def neighbors(self, product):
+        return list(SimilarProduct.objects.filter(product=product).order_by('rank').values_list('similar_id', flat=True))
+
+    def test_new_product_enters_existing_neighbor_lists(self):
+        shoe = self.create_product('Running shoe red', 500000)
+        self.create_product('Leather bag', 90000000)
+        self.create_product('Wool hat', 20)
+        call_command('compute_similar_products', '--full', '--top-k', '1', stdout=io.StringIO())
+        self.assertNotEqual(len(self.neighbors(shoe)), 0)
+
+        # Chỉ sản phẩm mới thay đổi nhưng nó giống shoe hơn láng giềng hiện tại nên shoe phải được tính lại
+        twin = self.create_product('Running shoe blue', 500000)
+        call_command('compute_similar_products', '--top-k', '1', stdout=io.StringIO())
+        self.assertEqual(self.neighbors(shoe), [twin.id])
+        self.assertEqual(self.neighbors(twin), [shoe.id])
+
+    def test_edited_product_leaves_neighbor_lists(self):
+        shoe = self.create_product('Running shoe', 500000)
+        twin = self.create_product('Running shoe', 500000)
+        hat = self.create_product('Wool hat', 20)
+        call_command('compute_similar_products', '--full', stdout=io.StringIO())
+        self.assertEqual(self.neighbors(shoe)[0], twin.id)
+
+        twin.product_name = 'Wool hat'
+        twin.price = 20
+        twin.save()
+        call_command('compute_similar_products', stdout=io.StringIO())
+        self.assertEqual(self.neighbors(hat)[0], twin.id)
+        # Danh sách của shoe được tính lại với điểm mới (chỉ còn chung danh mục rỗng)
+        self.assertLess(SimilarProduct.objects.get(product=shoe, similar=twin).score, 0.5)
+
+    def test_top_k_independent_of_chunk_size(self):
+        rows = [(i, f'Product {"shoe" if i % 2 else "hat"} {i % 3}', '', i % 4, 1000 * i) for i in range(1, 40)]
+        matrix = build_matrix(rows)
+        targets = list(range(len(rows)))
+        expected = top_k_neighbors(matrix, targets, 5)
+        # Khối điểm nhỏ nhất (1 dòng một lượt) cho cùng kết quả
+        with mock.patch('commerce.similarity.MAX_SCORE_CELLS', 1):
+            self.assertEqual(top_k_neighbors(matrix, targets, 5), expected)
+        self.assertEqual([len(neighbors) for neighbors in expected.values()], [5] * len(rows))
+        self.assertTrue(all(row not in [col for col, _ in neighbors] for row, neighbors in expected.items()))
+
+
+class DailySalesTests(TestCase):
+    def setUp(self):
+        self.seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.customer = User.objects.create(username='customer', avatar='avatar')
+        self.store = Store.objects.create(user=self.seller, store_name='Store', description='', wallpaper='wallpaper')
+        self.product = Product.objects.create(store=self.store, product_name='Phone', price=1000, description='',
+                                              stock=10)
+        self.order = Order.objects.create(user=self.customer, store=self.store, total_amount=3000,
+                                          payment_method='momo', order_status='pending')
+        self.lines = [OrderDetail.objects.create(order=self.order, store=self.store, product=self.product,
+                                                 quantity=1, price=1000) for _ in range(3)]
+
+    def sales(self):
+        return list(DailySales.objects.values_list('quantity', 'revenue', 'order_count'))
+
+    def set_status(self, status):
+        # Nạp lại đơn: item_count trong bộ nhớ đã cũ sau khi thêm dòng
+        self.order = Order.objects.get(pk=self.order.pk)
+        self.order.order_status = status
+        self.order.save()
+
+    def test_status_transitions(self):
+        self.assertEqual(self.sales(), [])
+        self.set_status('completed')
+        # 3 dòng cùng sản phẩm vẫn là một đơn
+        self.assertEqual(self.sales(), [(3, 3000, 1)])
+        self.set_status('canceled')
+        self.assertEqual(self.sales(), [(0, 0, 0)])
+        self.set_status('completed')
+        self.assertEqual(self.sales(), [(3, 3000, 1)])
+
+    def test_detail_edits_on_completed_order(self):
+        self.set_status('completed')
+        self.lines[0].quantity, self.lines[0].price = 2, 2000
+        self.lines[0].save()
+        self.assertEqual(self.sales(), [(4, 4000, 1)])
+        self.lines[1].delete()
+        self.assertEqual(self.sales(), [(3, 3000, 1)])
+        OrderDetail.objects.create(order=self.order, store=self.store, product=self.product, quantity=1, price=1000)
+        self.assertEqual(self.sales(), [(4, 4000, 1)])
+        # Xoá đơn xoá mọi dòng theo cascade
+        self.order.delete()
+        self.assertEqual(self.sales(), [(0, 0, 0)])
+
+    def test_rebuild_matches_incremental_rollup(self):
+        self.set_status('completed')
+        other = Order.objects.create(user=self.customer, store=self.store, total_amount=1000,
+                                     payment_method='momo', order_status='completed')
+        OrderDetail.objects.create(order=other, store=self.store, product=self.product, quantity=5, price=5000)
+        incremental = self.sales()
+        self.assertEqual(incremental, [(8, 8000, 2)])
+        DailySales.objects.update(quantity=0, order_count=7)
+        call_command('rebuild_daily_sales', stdout=io.StringIO())
+        self.assertEqual(self.sales(), incremental)
+
+    def test_statistics_use_local_date(self):
+        self.set_status('completed')
+        client = APIClient()
+        client.force_authenticate(self.seller)
+        response = client.get('/seller-statistics/')
+        self.assertEqual(response.data['monthly_revenue'], 3000)
+        self.assertEqual(response.data['highest_revenue_product_month']['product__product_name'], 'Phone')
+
+
+class CommerceStatsTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        customer = User.objects.create(username='customer', avatar='avatar')
+        self.store = Store.objects.create(user=seller, store_name='Store', description='', wallpaper='wallpaper')
+        product = Product.objects.create(store=self.store, product_name='Phone', price=1000, description='', stock=10)
+        # Cùng tháng 1 nhưng khác năm, và hai ngày sát nhau qua giao thừa
+        for day, amount in [((2023, 1, 15), 100), ((2023, 12, 31), 200), ((2024, 1, 1), 400), ((2024, 1, 15), 800)]:
+            order = Order.objects.create(user=customer, store=self.store, total_amount=amount,
+                                         payment_method='momo', order_status='completed')
+            OrderDetail.objects.create(order=order, store=self.store, product=product, quantity=1, price=amount)
+            Order.objects.filter(pk=order.pk).update(order_date=timezone.make_aware(timezone.datetime(*day, 12)))
+        Order.objects.create(user=customer, store=self.store, total_amount=5000, payment_method='momo',
+                             order_status='pending')
+        call_command('rebuild_daily_sales', stdout=io.StringIO())
+
+    def test_snapshot_content_and_year_aware_buckets(self):
+        data = StatsSnapshot.objects.get(pk=refresh_stats_snapshot().pk).data
+        self.assertEqual((data['total_stores'], data['active_stores'], data['total_customers'], data['total_sellers']),
+                         (1, 1, 1, 1))
+        self.assertEqual(data['monthly_total_sales'], [
+            {'month': '2023-01', 'total_sales': 100.0}, {'month': '2023-12', 'total_sales': 200.0},
+            {'month': '2024-01', 'total_sales': 1200.0},
+        ])
+        self.assertEqual(data['quarterly_total_sales'], [
+            {'quarter': '2023-Q1', 'total_sales': 100.0}, {'quarter': '2023-Q4', 'total_sales': 200.0},
+            {'quarter': '2024-Q1', 'total_sales': 1200.0},
+        ])
+        self.assertEqual(data['yearly_store_sales'], [
+            {'year': '2023', 'store_name': 'Store', 'total_sales': 300.0},
+            {'year': '2024', 'store_name': 'Store', 'total_sales': 1200.0},
+        ])
+        self.assertEqual([(row['year'], row['total_paid_orders']) for row in data['yearly_paid_orders']],
+                         [('2023', 2), ('2024', 2)])
+        self.assertEqual(data['lowest_sales_store'], {'month': '2023-01', 'store_name': 'Store', 'total_sales': 100.0})
+
+    # Template của trang không nằm trong repo này, thay bằng một template tối giản để kiểm tra view
+    @override_settings(TEMPLATES=[dict(settings.TEMPLATES[0], APP_DIRS=False, OPTIONS=dict(
+        settings.TEMPLATES[0]['OPTIONS'], loaders=[
+            ('django.template.loaders.locmem.Loader', {'admin/admin-commerce-stats.html': '{{ total_sellers }}'}),
+            'django.template.loaders.app_directories.Loader',
+        ]))])
+    def test_admin_page_reads_snapshot_and_refreshes(self):
+        self.client.force_login(User.objects.create_superuser(username='admin', password='admin', email=''))
+        response = self.client.get('/admin/commerce-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(StatsSnapshot.objects.count(), 1)
+        self.assertEqual(response.context['total_sellers'], 1)
+
+        # Snapshot đã có thì GET không tính lại, POST refresh=1 tính lại rồi redirect
+        Store.objects.update(active=False)
+        self.assertEqual(self.client.get('/admin/commerce-stats/').context['active_stores'], 1)
+        response = self.client.post('/admin/commerce-stats/', {'refresh': '1'})
+        self.assertRedirects(response, '/admin/commerce-stats/')
+        self.assertEqual(StatsSnapshot.objects.count(), 2)
+        self.assertEqual(self.client.get('/admin/commerce-stats/').context['active_stores'], 0)
+
+
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        store = Store.objects.create(user=seller, store_name='Store', description='', wallpaper='wallpaper')
+        self.products = [Product.objects.create(store=store, product_name=f'Product {i}', price=1000 + i % 3,
+                                                description='', stock=10) for i in range(45)]
+        # Nhiều sản phẩm cùng created_at/price: thứ tự phải dựa vào id để không lặp/mất dòng
+        Product.objects.update(created_at=timezone.now())
+
+    def walk(self, data):
+        pages, response = [], self.client.get('/products/', data)
+        while True:
+            pages.append([product['id'] for product in response.data['results']])
+            if not response.data['next']:
+                return pages, response
+            response = self.client.get(response.data['next'])
+
+    def test_next_and_previous_round_trip_across_equal_keys(self):
+        for ordering, expected in [
+            (None, sorted((p.id for p in self.products), reverse=True)),
+            ('price', [p.id for p in sorted(self.products, key=lambda p: (p.price, p.id))]),
+            ('-price', [p.id for p in sorted(self.products, key=lambda p: (-p.price, -p.id))]),
+        ]:
+            data = {'ordering': ordering} if ordering else {}
+            pages, last = self.walk(data)
+            self.assertEqual([len(page) for page in pages], [20, 20, 5], ordering)
+            self.assertEqual(sum(pages, []), expected, ordering)
+            # Quay lại bằng previous cho đúng các trang trước
+            response = self.client.get(last.data['previous'])
+            self.assertEqual([product['id'] for product in response.data['results']], pages[1], ordering)
+            response = self.client.get(response.data['previous'])
+            self.assertEqual([product['id'] for product in response.data['results']], pages[0], ordering)
+            self.assertIsNone(response.data['previous'])
+
+    def test_count_toggle_and_page_fallback(self):
+        response = self.client.get('/products/')
+        self.assertEqual(response.data['count'], 45)
+        with self.assertNumQueries(1):
+            response = self.client.get('/products/', {'count': 'false'})
+        self.assertIsNone(response.data['count'])
+
+        response = self.client.get('/products/', {'page': 2})
+        self.assertEqual(response.data['count'], 45)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertIn('page=3', response.data['next'])
+        self.assertEqual(response.data['results'][0]['id'], sorted(p.id for p in self.products)[-21])
+
+    def test_invalid_cursor_is_not_found(self):
+        def cursor(payload):
+            return urlsafe_b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+        for value in ['garbage', cursor([1, 2]), cursor({'values': [1]}), cursor({'values': 'ab'}),
+                      cursor({'values': ['not-a-date', 5]}), cursor({'values': ['2024-01-01T00:00:00', 'x']}),
+                      cursor({'values': [[1], {'a': 1}]})]:
+            response = self.client.get('/products/', {'cursor': value})
+            self.assertEqual(response.status_code, 404, value)
+
+
+class CategoryTreeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        get_response_cache().clear()
+        self.client = APIClient()
+        self.user = User.objects.create(username='staff', avatar='avatar')
+        self.root = Category.objects.create(name='Root', image='category')
+        self.child = Category.objects.create(name='Child', parent=self.root, image='category')
+        self.leaf = Category.objects.create(name='Leaf', parent=self.child, image='category')
+        self.other = Category.objects.create(name='Other', image='category')
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        store = Store.objects.create(user=seller, store_name='Store', description='', wallpaper='wallpaper')
+        self.products = {
+            category.name: Product.objects.create(store=store, category=category, product_name=category.name,
+                                                  price=1000, description='', stock=1)
+            for category in (self.root, self.child, self.leaf, self.other)
+        }
+
+    def test_moving_subtree_rewrites_paths(self):
+        self.child.parent = self.other
+        self.child.save()
+        self.leaf.refresh_from_db()
+        self.assertEqual(self.leaf.path, f'/{self.other.id}/{self.child.id}/{self.leaf.id}/')
+        self.assertEqual(self.leaf.depth, 2)
+
+        self.child.parent = None
+        self.child.save()
+        self.leaf.refresh_from_db()
+        self.assertEqual((self.leaf.path, self.leaf.depth), (f'/{self.child.id}/{self.leaf.id}/', 1))
+
+    def test_cycle_is_rejected(self):
+        self.client.force_authenticate(self.user)
+        for parent in (self.leaf, self.root):
+            response = self.client.patch(f'/categories/{self.root.id}/',
+                                         {'parent': f'http://testserver/categories/{parent.id}/'}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.data['parent'], [CYCLE_MESSAGE])
+
+        form = CategoryForm({'name': 'Root', 'parent': self.leaf.id}, instance=self.root)
+        self.assertFalse(form.is_valid())
+        self.assertEqual(form.errors['parent'], [CYCLE_MESSAGE])
+
+        # Lưu trực tiếp vẫn bị chặn bởi signal
+        self.root.parent = self.child
+        with self.assertRaises(ValidationError):
+            self.root.save()
+        self.assertEqual(Category.objects.get(pk=self.root.id).parent_id, None)
+
+    def test_products_of_descendants(self):
+        response = self.client.get(f'/products-category/{self.child.id}/')
+        self.assertEqual({row['id'] for row in response.data['results']},
+                         {self.products['Child'].id, self.products['Leaf'].id})
+        response = self.client.get(f'/products-category/{self.child.id}/', {'descendants': 'false'})
+        self.assertEqual([row['id'] for row in response.data['results']], [self.products['Child'].id])
+
+    def test_tree_counts(self):
+        response = self.client.get('/categories/tree/', {'counts': 'true'})
+        roots = {node['name']: node for node in response.data}
+        self.assertEqual(set(roots), {'Root', 'Other'})
+        self.assertEqual(roots['Root']['product_count'], 3)
+        child = roots['Root']['children'][0]
+        self.assertEqual((child['name'], child['product_count']), ('Child', 2))
+        self.assertEqual(child['children'][0]['product_count'], 1)
+        self.assertEqual(roots['Other']['product_count'], 1)
+
+    def test_list_sends_only_thumb_variant(self):
+        # Danh sách chỉ có thumb, đầy đủ preset/srcset khi lấy một danh mục hoặc ?expand=true
+        listed = self.client.get('/categories/').data['results'][0]['image_variants']
+        self.assertEqual(set(listed), {'thumb'})
+        detail = self.client.get(f'/categories/{self.root.id}/').data['image_variants']
+        self.assertEqual(detail['thumb'], listed['thumb'])
+        self.assertIn('srcset', detail)
+        expanded = self.client.get('/categories/', {'expand': 'true'}).data['results'][0]['image_variants']
+        self.assertIn('srcset', expanded)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Chạy EXPLAIN cho mọi câu SELECT mà các endpoint nóng sinh ra và fail nếu một bảng lớn bị quét toàn bộ,
+    để việc thiếu index không âm thầm quay lại.
+    """
+    # Bảng nhỏ (danh mục, cấu hình...) được phép quét toàn bộ
+    small_tables = {'commerce_category', 'django_content_type', 'django_session'}
+    # Bảng dẫn xuất của Prefetch có cắt [:n] (ROW_NUMBER), bảng thật bên trong vẫn được kiểm tra
+    derived_tables = {'qualify', 'qualify_mask'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        cls.customer = User.objects.create(username='customer', avatar='avatar')
+        cls.store = Store.objects.create(user=cls.seller, store_name='Store', description='', wallpaper='wallpaper')
+        cls.category = Category.objects.create(name='Category', image='category')
+        cls.product = Product.objects.create(store=cls.store, category=cls.category, product_name='Phone',
+                                             price=1000, description='', stock=10)
+        Review.objects.create(user=cls.customer, product=cls.product, rating=5)
+        Review.objects.create(user=cls.customer, store=cls.store, rating=4)
+        order = Order.objects.create(user=cls.customer, store=cls.store, total_amount=1000,
+                                     payment_method='momo', order_status='pending')
+        OrderDetail.objects.create(order=order, store=cls.store, product=cls.product, quantity=1, price=1000)
+
+    def setUp(self):
+        cache.clear()
+
+    def capture_selects(self, url, user=None, data=None):
+        statements = []
+
+        def wrapper(execute, sql, params, many, context):
+            if sql.lstrip().upper().startswith('SELECT'):
+                statements.append((sql, params))
+            return execute(sql, params, many, context)
+
+        client = APIClient()
+        if user:
+            client.force_authenticate(user)
+        with connection.execute_wrapper(wrapper):
+            response = client.get(url, data)
+        self.assertEqual(response.status_code, 200, url)
+        return statements
+
+    def full_scans(self, sql, params):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+                details = [row[-1] for row in cursor.fetchall()]
+                return [detail for detail in details
+                        if detail.startswith('SCAN ') and 'USING' not in detail
+                        and detail.split()[1] not in self.small_tables | self.derived_tables
+                        and not detail.startswith('SCAN (subquery')]
+            cursor.execute('EXPLAIN ' + sql, params)
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [f"{row['table']} type=ALL" for row in rows
+                    if row['type'] == 'ALL' and row['table'] not in self.small_tables | self.derived_tables
+                    and not row['table'].startswith('<derived')]
+
+    def assertNoFullScan(self, url, user=None, data=None):
+        for sql, params in self.capture_selects(url, user, data):
+            scans = self.full_scans(sql, params)
+            self.assertFalse(scans, f'{url}: full table scan {scans} in\n{sql}')
+
+    def test_catalog_endpoints(self):
+        product, store, category = self.product.id, self.store.id, self.category.id
+        self.assertNoFullScan('/products/', data={'count': 'false'})
+        self.assertNoFullScan('/products/', data={'count': 'false', 'ordering': 'price'})
+        self.assertNoFullScan('/products/', data={'count': 'false', 'search': 'pho'})
+        self.assertNoFullScan(f'/products/{product}/', data={'expand': 'true'})
+        self.assertNoFullScan(f'/products-store/{store}/', data={'count': 'false'})
+        self.assertNoFullScan(f'/products-category/{category}/', data={'count': 'false'})
+        self.assertNoFullScan('/similar-products/', data={'product_id': product})
+        self.assertNoFullScan(f'/productvariants-product/{product}/')
+        self.assertNoFullScan(f'/product-images/item/{product}/')
+        self.assertNoFullScan(f'/review-products/{product}/')
+        self.assertNoFullScan(f'/review-store/{store}/')
+
+    def test_order_endpoints(self):
+        self.assertNoFullScan('/order-by-user/', self.customer)
+        self.assertNoFullScan('/pending-order-details/', self.customer)
+        self.assertNoFullScan('/pending-order-details/summary/', self.customer)
+        self.assertNoFullScan('/seller-statistics/', self.seller)
+        self.assertNoFullScan('/order/', self.seller, {'count': 'false'})
+        self.assertNoFullScan('/order/', self.seller, {'count': 'false', 'order_status': 'pending',
+                                                       'start': '2024-01-01'})
+        self.assertNoFullScan('/order/status-counts/', self.seller)
+        self.assertNoFullScan('/order-detail/', self.seller, {'count': 'false'})
+
+
+class OrderInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.customer = User.objects.create(username='customer', avatar='avatar')
+        self.sellers, self.stores = [], []
+        for i in range(2):
+            seller = User.objects.create(username=f'seller{i}', avatar='avatar', role=User.SELLER_ROLE)
+            self.sellers.append(seller)
+            self.stores.append(Store.objects.create(user=seller, store_name=f'Store {i}', description='',
+                                                    wallpaper='wallpaper'))
+        for status, method in [('pending', 'momo'), ('pending', 'paypal'), ('shipped', 'momo')]:
+            Order.objects.create(user=self.customer, store=self.stores[0], total_amount=1000,
+                                 payment_method=method, order_status=status)
+        Order.objects.create(user=self.customer, store=self.stores[1], total_amount=1000, payment_method='momo',
+                             order_status='pending')
+
+    def test_inbox_is_scoped_and_filtered(self):
+        self.client.force_authenticate(self.sellers[0])
+        self.assertEqual(self.client.get('/order/').data['count'], 3)
+        response = self.client.get('/order/', {'order_status': 'pending', 'payment_method': 'momo'})
+        self.assertEqual(response.data['count'], 1)
+        self.assertEqual(self.client.get('/order/', {'order_status': 'lost'}).status_code, 400)
+        other = Order.objects.get(store=self.stores[1])
+        self.assertEqual(self.client.get(f'/order/{other.id}/').status_code, 404)
+
+        # Khách vẫn thấy mọi đơn mình đặt ở các cửa hàng
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/order/').data['count'], 4)
+
+    def test_status_counts_are_cached_until_an_order_changes(self):
+        self.client.force_authenticate(self.sellers[0])
+        response = self.client.get('/order/status-counts/')
+        self.assertEqual(response.data, {'pending': 2, 'processing': 0, 'shipped': 1, 'completed': 0,
+                                         'canceled': 0, 'total': 3})
+        with self.assertNumQueries(1):
+            self.client.get('/order/status-counts/')
+
+        order = Order.objects.filter(store=self.stores[0], order_status='pending').first()
+        order.order_status = 'canceled'
+        order.save()
+        response = self.client.get('/order/status-counts/')
+        self.assertEqual((response.data['pending'], response.data['canceled']), (1, 1))
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create(username='customer', avatar='avatar')
+        self.client.force_authenticate(self.customer)
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.store = Store.objects.create(user=seller, store_name='Store', description='', wallpaper='wallpaper')
+        self.products = [Product.objects.create(store=self.store, product_name=f'Product {i}', price=1000,
+                                                description='', stock=100) for i in range(3)]
+        for product in self.products:
+            ProductImage.objects.create(product=product, image=f'image/upload/v1/{product.id}-a.jpg')
+            ProductImage.objects.create(product=product, image=f'image/upload/v1/{product.id}-b.jpg')
+
+    def place_order(self, quantities):
+        items = [{'product': product.id, 'quantity': quantity} for product, quantity in zip(self.products, quantities)]
+        response = self.client.post('/checkout/', {'items': items, 'payment_method': 'momo'}, format='json')
+        return Order.objects.get(pk=response.data[0]['id'])
+
+    def test_history_embeds_lines_with_fixed_queries(self):
+        self.place_order([1, 2])
+        with self.assertNumQueries(4):
+            self.client.get('/order-by-user/')
+        for _ in range(5):
+            self.place_order([1, 2, 3])
+        # Số truy vấn không đổi theo số đơn và số dòng: COUNT, đơn, dòng, ảnh
+        with self.assertNumQueries(4):
+            response = self.client.get('/order-by-user/')
+        self.assertEqual(response.data['count'], 6)
+        order = response.data['results'][0]
+        self.assertEqual((order['item_count'], order['store_name']), (6, 'Store'))
+        self.assertEqual([item['product_name'] for item in order['items']], ['Product 0', 'Product 1', 'Product 2'])
+        self.assertIn(f'{self.products[0].id}-a', order['items'][0]['thumb_url'])
+        self.assertEqual(order['payment']['amount'], order['total_amount'])
+        self.assertEqual(self.client.get('/order-by-user/', {'order_status': 'shipped'}).data['count'], 0)
+
+    def test_item_count_follows_line_changes(self):
+        order = self.place_order([1, 2])
+        self.assertEqual(order.item_count, 3)
+        detail = order.orderdetail_set.get(product=self.products[0])
+        detail.quantity = 4
+        detail.save()
+        order.orderdetail_set.get(product=self.products[1]).delete()
+        order.refresh_from_db()
+        self.assertEqual(order.item_count, 4)
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create(username='customer', avatar='avatar')
+        self.client.force_authenticate(self.customer)
+        for i in range(2):
+            seller = User.objects.create(username=f'seller{i}', avatar='avatar', role=User.SELLER_ROLE)
+            store = Store.objects.create(user=seller, store_name=f'Store {i}', description='', wallpaper='wallpaper')
+            order = Order.objects.create(user=self.customer, store=store, total_amount=0, payment_method='momo',
+                                         order_status='pending')
+            for j in range(3):
+                product = Product.objects.create(store=store, product_name=f'Product {i}-{j}', price=1000,
+                                                 description='<p>' + 'x' * 1000 + '</p>', stock=j)
+                ProductImage.objects.create(product=product, image=f'image/upload/v1/{product.id}.jpg')
+                OrderDetail.objects.create(order=order, store=store, product=product, quantity=2, price=2000)
+
+    def test_summary_groups_lines_by_store(self):
+        with self.assertNumQueries(3):
+            response = self.client.get('/pending-order-details/summary/')
+        self.assertEqual((response.data['subtotal'], response.data['item_count']), (12000, 12))
+        # Chỉ sản phẩm thứ 3 (stock 2) đủ hàng cho số lượng 2
+        self.assertEqual(response.data['unavailable_count'], 4)
+        store = response.data['stores'][0]
+        self.assertEqual((store['store_name'], store['subtotal'], store['line_count']), ('Store 0', '6000.00', 3))
+        self.assertEqual([item['available'] for item in store['items']], [False, False, True])
+        self.assertNotIn('description', store['items'][0])
+        self.assertTrue(store['items'][0]['thumb_url'])
+
+
+class ReviewFeedTests(TestCase):
+    def setUp(self):
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.store = Store.objects.create(user=seller, store_name='Store', description='', wallpaper='wallpaper')
+        self.product = Product.objects.create(store=self.store, product_name='Phone', price=1000, description='',
+                                              stock=10)
+        self.users = [User.objects.create(username=f'customer{i}', first_name=f'Khách {i}', avatar='avatar')
+                      for i in range(25)]
+        for i, user in enumerate(self.users):
+            Review.objects.create(user=user, product=self.product, rating=i % 5 + 1, comment=f'Review {i}')
+
+    def test_feed_is_paginated_newest_first(self):
+        Review.objects.filter(user=self.users[-1]).update(active=False)
+        # COUNT + trang review (join user), không truy vấn thêm cho tên người viết
+        with self.assertNumQueries(2):
+            response = APIClient().get(f'/review-products/{self.product.id}/')
+        self.assertEqual(response.data['count'], 24)
+        self.assertEqual(len(response.data['results']), 20)
+        self.assertEqual(response.data['results'][0]['comment'], 'Review 23')
+        self.assertEqual(response.data['results'][0]['first_name'], 'Khách 23')
+        self.assertEqual(len(APIClient().get(response.data['next']).data['results']), 4)
+
+    def test_histogram_follows_review_writes(self):
+        url = f'/review-products/{self.product.id}/histogram/'
+        with self.assertNumQueries(1):
+            response = APIClient().get(url)
+        self.assertEqual(response.data['histogram'], {1: 5, 2: 5, 3: 5, 4: 5, 5: 5})
+
+        review = Review.objects.filter(rating=1).first()
+        review.rating = 5
+        review.save()
+        Review.objects.filter(rating=2).first().delete()
+        review = Review.objects.filter(rating=3).first()
+        review.active = False
+        review.save()
+        response = APIClient().get(url)
+        self.assertEqual(response.data['histogram'], {1: 4, 2: 4, 3: 4, 4: 5, 5: 6})
+        self.assertEqual(response.data['count'], 23)
+
+        call_command('rebuild_ratings', stdout=io.StringIO())
+        self.assertEqual(APIClient().get(url).data, response.data)
+
+
+class AsyncReadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        user = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.store = Store.objects.create(user=user, store_name='Store', description='', wallpaper='wallpaper')
+        self.category = Category.objects.create(name='Category', image='category')
+        for i in range(25):
+            product = Product.objects.create(store=self.store, category=self.category, product_name=f'Product {i}',
+                                             price=1000 + i, description='', stock=10)
+            ProductImage.objects.create(product=product, image=f'image-{i}')
+            ProductVariant.objects.create(product=product, size='M', color='Red')
+        self.product = product
+
+    def test_async_views_match_sync_views(self):
+        for url, data in [('/products/', {'expand': 'true', 'ordering': 'price'}),
+                          (f'/products/{self.product.id}/', {'expand': 'true'}),
+                          (f'/products-store/{self.store.id}/', {}),
+                          (f'/products-category/{self.category.id}/', {}),
+                          ('/store/', {}), ('/categories/', {}), (f'/review-products/{self.product.id}/', {})]:
+            expected = self.client.get(url, data).json()
+            response = self.client.get('/async' + url, data)
+            self.assertEqual(response.status_code, 200, url)
+            actual = response.json()
+            if isinstance(expected, dict) and expected.get('next'):
+                self.assertEqual(actual.pop('next').replace('/async/', '/'), expected.pop('next'))
+            self.assertEqual(actual, expected, url)
+
+    def test_async_product_list_query_count(self):
+        # COUNT + trang sản phẩm (join store) + ảnh + biến thể, như bản đồng bộ
+        with self.assertNumQueries(4):
+            response = self.client.get('/async/products/', {'expand': 'true'})
+        self.assertEqual(len(response.json()['results']), 20)
+        self.assertEqual(self.client.get('/async/products/', {'expand': 'true'})['X-Cache'], 'HIT')
+
+    def test_async_detail_not_found(self):
+        response = self.client.get('/async/products/999999/')
+        self.assertEqual(response.status_code, 404)
+
+
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.store = Store.objects.create(user=user, store_name='Store', description='', wallpaper='wallpaper')
+        self.product = Product.objects.create(store=self.store, product_name='Product', price=1000,
+                                              description='', stock=10)
+
+    def test_variants_are_stored_on_save(self):
+        image = ProductImage.objects.create(product=self.product, image='image/upload/v1/shoe.jpg')
+        variants = ProductImage.objects.get(pk=image.pk).image_variants
+        self.assertEqual(variants['source'], 'image/upload/v1/shoe.jpg')
+        self.assertIn('c_fill', variants['thumb'])
+        self.assertIn('f_auto', variants['card'])
+        self.assertEqual(len(variants['srcset']['card'].split(', ')), 3)
+
+        image.image = 'image/upload/v2/boot.jpg'
+        image.save()
+        self.assertIn('boot', ProductImage.objects.get(pk=image.pk).image_variants['thumb'])
+
+    def test_list_serializer_uses_thumbnails(self):
+        ProductImage.objects.create(product=self.product, image='image/upload/v1/shoe.jpg')
+        # bulk_create không qua signal: serializer tự sinh từ URL builder
+        ProductImage.objects.bulk_create([ProductImage(product=self.product, image='image/upload/v1/hat.jpg')])
+        images = APIClient().get(f'/products/{self.product.id}/', {'expand': 'true'}).data['images']
+        self.assertEqual(len(images), 2)
+        for image in images:
+            self.assertIn('w_150', image['thumb_url'])
+            self.assertIn('400w', image['srcset'])
+            self.assertNotIn('w_', image['image_url'])
+
+
+class MediaUploadTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings = override_settings(
+            MEDIA_ROOT=self.tmp.name, MEDIA_UPLOAD_STAGING_DIR=os.path.join(self.tmp.name, 'staging'),
+            MEDIA_UPLOAD_STORAGE='django.core.files.storage.FileSystemStorage',
+            MEDIA_UPLOAD_CONCURRENCY=0, MEDIA_UPLOAD_RETRY_DELAY=0, MEDIA_UPLOAD_MAX_ATTEMPTS=3)
+        self.settings.enable()
+        self.client = APIClient()
+        user = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.client.force_authenticate(user)
+        store = Store.objects.create(user=user, store_name='Store', description='', wallpaper='wallpaper')
+        self.product = Product.objects.create(store=store, product_name='Product', price=1000, description='', stock=1)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmp.cleanup()
+
+    def post_image(self):
+        image = SimpleUploadedFile('shoe.png', b'fake-image', content_type='image/png')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/product-images/', {
+                'product': f'http://testserver/products/{self.product.id}/', 'image': image}, format='multipart')
+        self.assertEqual(response.status_code, 201)
+        # Request trả về ngay với trạng thái pending, worker chạy sau khi commit
+        self.assertEqual(response.data['uploads']['image']['status'], MediaUpload.PENDING)
+        return MediaUpload.objects.get(pk=response.data['uploads']['image']['id'])
+
+    def test_upload_is_staged_then_swapped_in(self):
+        upload = self.post_image()
+        upload.refresh_from_db()
+        self.assertEqual(upload.status, MediaUpload.DONE)
+        self.assertFalse(os.path.exists(upload.staged_path))
+
+        image = ProductImage.objects.get()
+        self.assertEqual(image.image.get_prep_value(), f'image/upload/{upload.result}')
+        self.assertTrue(os.path.exists(os.path.join(self.tmp.name, upload.result)))
+        self.assertEqual(image.image_variants['source'], f'image/upload/{upload.result}')
+        self.assertEqual(self.client.get(f'/media-uploads/{upload.id}/').data['status'], MediaUpload.DONE)
+
+        # Người khác không xem được trạng thái upload
+        self.client.force_authenticate(User.objects.create(username='other', avatar='avatar'))
+        self.assertEqual(self.client.get(f'/media-uploads/{upload.id}/').status_code, 404)
+
+    def test_upload_retries_then_fails(self):
+        with mock.patch('commerce.uploads.push_upload', side_effect=[OSError('timeout'), 'image/shoe.png']):
+            upload = self.post_image()
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.attempts), (MediaUpload.DONE, 2))
+
+        with mock.patch('commerce.uploads.push_upload', side_effect=OSError('down')):
+            upload = self.post_image()
+        upload.refresh_from_db()
+        self.assertEqual((upload.status, upload.attempts, upload.error), (MediaUpload.FAILED, 3, 'down'))
+        self.assertTrue(os.path.exists(upload.staged_path))
+
+
+class ProductImportExportTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.settings = override_settings(PRODUCT_IMPORT_STAGING_DIR=self.tmp.name, PRODUCT_IMPORT_BATCH_SIZE=2)
+        self.settings.enable()
+        self.client = APIClient()
+        user = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.client.force_authenticate(user)
+        self.store = Store.objects.create(user=user, store_name='Store', description='', wallpaper='wallpaper')
+        self.category = Category.objects.create(name='Shoes', image='category')
+        other = User.objects.create(username='other', avatar='avatar', role=User.SELLER_ROLE)
+        other_store = Store.objects.create(user=other, store_name='Other', description='', wallpaper='wallpaper')
+        self.foreign = Product.objects.create(store=other_store, product_name='Foreign', price=1, description='', stock=1)
+
+    def tearDown(self):
+        self.settings.disable()
+        self.tmp.cleanup()
+
+    def upload(self, name, content, **extra):
+        return self.client.post('/product-imports/', {'file': SimpleUploadedFile(name, content.encode('utf-8')),
+                                                       **extra}, format='multipart')
+
+    def test_csv_import_creates_products_and_reports_row_errors(self):
+        response = self.upload('products.csv', (
+            'product_name,category,price,stock,variants,images\n'
+            f'Giày chạy bộ,{self.category.id},500000,10,M:Đỏ|L:Đen,shoe-a|shoe-b\n'
+            'Dép,,abc,5,,\n'
+            'Áo,999,100000,5,,\n'
+            f'Túi,{self.category.id},200000,3,,\n'
+        ))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['status'], ProductImport.DONE)
+        self.assertEqual((response.data['processed_rows'], response.data['created_count'],
+                          response.data['error_count']), (4, 2, 2))
+        self.assertEqual([(error['line'], list(error['errors'])) for error in response.data['errors']],
+                         [(3, ['price']), (4, ['category'])])
+
+        product = Product.objects.get(product_name='Giày chạy bộ')
+        self.assertEqual((product.store, product.category, product.price), (self.store, self.category, 500000))
+        self.assertEqual(list(product.productvariant_set.order_by('pk').values_list('size', 'color')),
+                         [('M', 'Đỏ'), ('L', 'Đen')])
+        self.assertEqual([image.image.get_prep_value() for image in product.images.order_by('pk')],
+                         ['image/upload/shoe-a', 'image/upload/shoe-b'])
+        # bulk_create không qua signal nhưng sản phẩm vẫn tìm được
+        self.assertEqual(self.client.get('/products/', {'search': 'giay'}).data['results'][0]['id'], product.id)
+
+    def test_import_reads_ids_back_by_token_without_bulk_returning(self):
+        # Như MySQL: bulk_create không trả id, id của lô được đọc lại theo import_token
+        with mock.patch.object(type(connection.features), 'can_return_rows_from_bulk_insert', False), \
+                CaptureQueriesContext(connection) as captured:
+            response = self.upload('products.ndjson', '\n'.join(json.dumps(row) for row in [
+                {'product_name': 'Giày', 'price': 500000, 'stock': 10, 'variants': [{'size': 'M', 'color': 'Đỏ'}]},
+                {'product_name': 'Giày', 'price': 200000, 'stock': 3, 'images': ['bag']},
+            ]))
+        self.assertEqual(response.data['created_count'], 2)
+        inserts = [query for query in captured.captured_queries
+                   if query['sql'].startswith('INSERT INTO "commerce_product"')]
+        self.assertEqual(len(inserts), 1)
+        first, second = Product.objects.filter(store=self.store).order_by('price')
+        self.assertEqual((first.price, [image.image.get_prep_value() for image in first.images.all()]),
+                         (200000, ['image/upload/bag']))
+        self.assertEqual(list(second.productvariant_set.values_list('size', 'color')), [('M', 'Đỏ')])
+        self.assertFalse(Product.objects.filter(import_token__isnull=False).exists())
+
+    def test_export_round_trip_updates_in_place(self):
+        self.upload('products.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'product_name': 'Giày', 'price': 500000, 'stock': 10, 'variants': [{'size': 'M', 'color': 'Đỏ'}]},
+            {'product_name': 'Túi', 'price': 200000, 'stock': 3, 'images': ['bag']},
+            {'product_name': 'Mũ', 'price': 50000, 'stock': 0, 'active': False},
+        ]))
+        response = self.client.get('/product-export/')
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(lines[0], 'id,product_name,category,price,stock,active,description,variants,images')
+        self.assertEqual(len(lines), 4)
+        self.assertIn(',M:Đỏ,', lines[1])
+
+        # Sửa giá rồi nhập lại file đã xuất: cập nhật đúng sản phẩm, không tạo trùng, biến thể giữ nguyên
+        lines[1] = lines[1].replace('500000', '450000')
+        lines.append(f'{self.foreign.id},Foreign,,1,1,true,,,')
+        response = self.upload('export.csv', '\n'.join(lines) + '\n')
+        self.assertEqual((response.data['created_count'], response.data['updated_count'],
+                          response.data['error_count']), (0, 3, 1))
+        self.assertEqual(response.data['errors'][0]['errors'], {'id': [f'Product {self.foreign.id} does not exist in this store.']})
+        self.assertEqual(Product.objects.filter(store=self.store).count(), 3)
+        self.assertEqual(Product.objects.get(product_name='Giày').price, 450000)
+        self.assertEqual(ProductVariant.objects.filter(product__store=self.store).count(), 1)
+
+        rows = [json.loads(line) for line in b''.join(
+            self.client.get('/product-export/', {'type': 'ndjson'}).streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([(row['product_name'], row['active'], row['images']) for row in rows],
+                         [('Giày', True, []), ('Túi', True, ['image/upload/bag']), ('Mũ', False, [])])
+
+    def test_large_file_runs_in_background_and_resumes(self):
+        content = 'product_name,price,stock\n' + ''.join(f'Product {i},1000,1\n' for i in range(5))
+        with override_settings(PRODUCT_IMPORT_INLINE_BYTES=10), \
+                mock.patch('commerce.catalog_io.get_executor') as get_executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.upload('products.csv', content)
+        self.assertEqual((response.status_code, response.data['status']), (202, ProductImport.PENDING))
+        job_id = get_executor.return_value.submit.call_args.args[1]
+
+        # Giả lập worker đã commit 2 lô (4 dòng) rồi chết: chạy lại chỉ nhập dòng còn lại
+        Product.objects.bulk_create([Product(store=self.store, product_name=f'Product {i}', price=1000, description='',
+                                             stock=1) for i in range(4)])
+        ProductImport.objects.filter(pk=job_id).update(status=ProductImport.RUNNING, processed_rows=4, created_count=4,
+                                                       updated_at=timezone.now() - timedelta(hours=1))
+        call_command('process_imports', stdout=io.StringIO())
+        job = ProductImport.objects.get(pk=job_id)
+        self.assertEqual((job.status, job.processed_rows, job.created_count), (ProductImport.DONE, 5, 5))
+        self.assertEqual(Product.objects.filter(store=self.store).count(), 5)
+        self.assertFalse(os.path.exists(job.staged_path))
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        self.customer = User.objects.create(username='customer', avatar='avatar')
+        self.store = Store.objects.create(user=seller, store_name='Store', description='', wallpaper='wallpaper')
+        other = Store.objects.create(user=User.objects.create(username='other', avatar='avatar'), store_name='Other',
+                                     description='', wallpaper='wallpaper')
+        self.product = Product.objects.create(store=self.store, product_name='Giày', price=1000, description='', stock=9)
+        self.orders = [self.create_order(self.store, day, 'completed') for day in (1, 2, 3)]
+        self.create_order(other, 2, 'completed')
+        Payment.objects.create(order=self.orders[1], payment_method='momo', amount=2000, transaction_id='tx-2')
+        self.client.force_authenticate(seller)
+
+    def create_order(self, store, day, status):
+        order = Order.objects.create(user=self.customer, store=store, total_amount=2000, payment_method='momo',
+                                     order_status=status)
+        Order.objects.filter(pk=order.pk).update(order_date=timezone.make_aware(timezone.datetime(2024, 3, day, 12)))
+        OrderDetail.objects.create(order=order, store=store, product=self.product, quantity=2, price=2000)
+        return order
+
+    def test_csv_details_scoped_by_store_and_date(self):
+        with override_settings(ORDER_EXPORT_BATCH_SIZE=1):
+            response = self.client.get('/order-export/', {'start': '2024-03-02', 'end': '2024-03-03'})
+            self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+            # Mỗi lô một truy vấn đã join sản phẩm, người mua và thanh toán: 2 lô đầy rồi một lô rỗng
+            with self.assertNumQueries(3):
+                rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([int(row['order_id']) for row in rows], [self.orders[1].id, self.orders[2].id])
+        self.assertEqual((rows[0]['product_name'], rows[0]['username'], rows[0]['price']), ('Giày', 'customer', '2000.00'))
+        self.assertEqual((rows[0]['transaction_id'], rows[0]['payment_amount']), ('tx-2', '2000.00'))
+        self.assertEqual((rows[1]['transaction_id'], rows[1]['payment_date']), ('', ''))
+
+    def test_gzip_ndjson_orders(self):
+        response = self.client.get('/order-export/', {'type': 'ndjson', 'level': 'orders', 'compress': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('orders-', response['Content-Disposition'])
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [order.id for order in self.orders])
+        self.assertEqual(rows[1]['order_date'], '2024-03-02T12:00:00+00:00')
+        self.assertEqual(rows[1]['payment_amount'], '2000.00')
+
+        response = self.client.get('/order-export/', {'start': '2024-03-03', 'end': '2024-03-01'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_admin_export_action(self):
+        admin_user = User.objects.create_superuser(username='admin', password='admin', email='')
+        self.client.force_login(admin_user)
+        response = self.client.post('/admin/commerce/orderdetail/', {
+            'action': 'export_csv', 'select_across': '1', 'index': '0',
+            '_selected_action': [str(self.orders[0].orderdetail_set.get().id)]})
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        lines = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 1 + OrderDetail.objects.count())
+
+
+class AdminChangelistTests(TestCase):
+    """Changelist của admin cho bảng lớn: số truy vấn không tăng theo số dòng, không COUNT(*) cả bảng."""
+    # Session + user + COUNT + trang kết quả (đã JOIN các cột FK), thêm min/max và ngày của date_hierarchy
+    budgets = {'user': 4, 'store': 4, 'product': 4, 'order': 6, 'orderdetail': 6, 'payment': 6, 'review': 4}
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(User.objects.create_superuser(username='admin', password='admin', email=''))
+        self.category = Category.objects.create(name='Category', image='category')
+        self.created = 0
+
+    def create_rows(self, count):
+        for i in range(self.created, self.created + count):
+            seller = User.objects.create(username=f'seller{i}', avatar='avatar', role=User.SELLER_ROLE)
+            customer = User.objects.create(username=f'customer{i}', avatar='avatar')
+            store = Store.objects.create(user=seller, store_name=f'Store {i}', description='', wallpaper='wallpaper')
+            product = Product.objects.create(store=store, category=self.category, product_name=f'Phone {i}',
+                                             price=1000, description='', stock=10)
+            order = Order.objects.create(user=customer, store=store, total_amount=1000, payment_method='momo',
+                                         order_status='pending')
+            OrderDetail.objects.create(order=order, store=store, product=product, quantity=1, price=1000)
+            Payment.objects.create(order=order, payment_method='momo', amount=1000)
+            Review.objects.create(user=customer, product=product, rating=5)
+            Review.objects.create(user=customer, store=store, rating=4)
+        self.created += count
+
+    def changelist_queries(self, model, data=None):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(f'/admin/commerce/{model}/', data)
+        self.assertEqual(response.status_code, 200, model)
+        return len(captured), response
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.create_rows(1)
+        counts = {model: self.changelist_queries(model)[0] for model in self.budgets}
+        self.create_rows(5)
+        for model, budget in self.budgets.items():
+            queries, response = self.changelist_queries(model)
+            self.assertEqual(queries, counts[model], f'{model}: N+1 in changelist')
+            self.assertLessEqual(queries, budget, model)
+        self.assertContains(response, 'Store 5')
+
+    def test_prefix_search_through_subqueries(self):
+        self.create_rows(3)
+        order = Order.objects.get(user__username='customer1')
+        _, response = self.changelist_queries('order', {'q': 'Customer1'})
+        self.assertEqual(list(response.context['cl'].result_list), [order])
+        # Chỉ khớp tiền tố, điều kiện trên bảng liên quan là subquery IN thay vì LIKE qua JOIN
+        _, response = self.changelist_queries('order', {'q': 'ustomer1'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+        where = str(response.context['cl'].queryset.query).split(' WHERE ', 1)[1]
+        self.assertIn('"commerce_order"."user_id" IN (SELECT', where)
+        _, response = self.changelist_queries('order', {'q': str(order.pk)})
+        self.assertEqual(list(response.context['cl'].result_list), [order])
+        _, response = self.changelist_queries('orderdetail', {'q': 'customer1 phone'})
+        self.assertEqual([detail.order_id for detail in response.context['cl'].result_list], [order.pk])
+
+    def test_approximate_count(self):
+        self.create_rows(4)
+        with override_settings(ADMIN_EXACT_COUNT_LIMIT=3):
+            # Bảng lớn không lọc: dùng số dòng ước lượng, không COUNT
+            with mock.patch('commerce.paginators.estimate_table_rows', return_value=50000), \
+                    CaptureQueriesContext(connection) as captured:
+                response = self.client.get('/admin/commerce/order/')
+            self.assertEqual(response.context['cl'].result_count, 50000)
+            self.assertFalse([query for query in captured.captured_queries if 'COUNT(' in query['sql']])
+            # Có lọc: chỉ đếm tới giới hạn
+            _, response = self.changelist_queries('order', {'order_status__exact': 'pending'})
+            self.assertEqual(response.context['cl'].result_count, 3)
+            self.assertContains(response, '3+ orders')
+        _, response = self.changelist_queries('order', {'order_status__exact': 'pending'})
+        self.assertEqual(response.context['cl'].result_count, 4)
+
+    def test_pages_past_count_limit(self):
+        self.create_rows(5)
+        with override_settings(ADMIN_EXACT_COUNT_LIMIT=3), \
+                mock.patch('commerce.admin.OrderAdmin.list_per_page', 2):
+            # Giới hạn 3 dòng = 2 trang theo số đếm, trang 3 vẫn mở được vì còn dòng thứ 5
+            response = self.client.get('/admin/commerce/order/', {'order_status__exact': 'pending', 'p': 2})
+            self.assertEqual(list(response.context['cl'].paginator.get_elided_page_range(2)), [1, 2, 3])
+            response = self.client.get('/admin/commerce/order/', {'order_status__exact': 'pending', 'p': 3})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['cl'].result_list), 1)
+            self.assertEqual(list(response.context['cl'].paginator.get_elided_page_range(3)), [1, 2, 3])
+            # Trang không còn dòng vẫn là trang không hợp lệ
+            response = self.client.get('/admin/commerce/order/', {'order_status__exact': 'pending', 'p': 4})
+            self.assertRedirects(response, '/admin/commerce/order/?e=1', fetch_redirect_response=False)
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create(username='customer', avatar='avatar', first_name='An')
+        self.token = AccessToken.objects.create(user=self.user, token='secret-token', scope='read write',
+                                                expires=timezone.now() + timedelta(hours=1))
+        self.client = APIClient(HTTP_AUTHORIZATION='Bearer secret-token')
+
+    def test_token_is_cached_until_revoked(self):
+        with CaptureQueriesContext(connection) as first:
+            self.assertEqual(self.client.get('/user/current_user/').status_code, 200)
+        # Request thứ hai nạp user vào LRU của process theo phiên bản, từ đó không truy vấn DB nữa
+        with self.assertNumQueries(1):
+            self.client.get('/user/current_user/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/user/current_user/')
+        self.assertEqual(response.data['username'], 'customer')
+        self.assertTrue(any('oauth2_provider_accesstoken' in query['sql'] for query in first.captured_queries))
+
+        # Entry trong cache không chứa token gốc hay hash mật khẩu
+        entry = cache.get(token_cache_key(token_checksum('secret-token')))
+        self.assertEqual(set(entry), {'id', 'user_id', 'application_id', 'scope', 'expires'})
+
+        self.token.revoke()
+        self.assertEqual(self.client.get('/user/current_user/').status_code, 401)
+
+    def test_user_change_and_expiry_invalidate_cache(self):
+        self.client.get('/user/current_user/')
+        self.user.first_name = 'Bình'
+        self.user.save()
+        self.assertEqual(self.client.get('/user/current_user/').data['first_name'], 'Bình')
+
+        # Entry còn trong cache nhưng token đã quá hạn thì không được dùng
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + timedelta(hours=2)):
+            self.assertEqual(self.client.get('/user/current_user/').status_code, 401)
+
+
+class ReservationTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.customer = User.objects.create(username='customer', avatar='avatar')
+        self.client.force_authenticate(self.customer)
+        seller = User.objects.create(username='seller', avatar='avatar', role=User.SELLER_ROLE)
+        store = Store.objects.create(user=seller, store_name='Store', description='', wallpaper='wallpaper')
+        self.product = Product.objects.create(store=store, product_name='Phone', price=1000, description='', stock=5)
+
+    def hold(self, quantity, product=None):
+        items = [{'product': (product or self.product).id, 'quantity': quantity}]
+        return self.client.post('/reservations/', {'items': items}, format='json')
+
+    def stock(self):
+        sync_sharded_stock()
+        return Product.objects.get(pk=self.product.pk).stock
+
+    def test_hold_release_and_expiry(self):
+        response = self.hold(3)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.stock(), 2)
+        self.assertEqual(self.hold(3).status_code, 400)
+
+        self.assertEqual(self.client.delete(f'/reservations/{response.data[0]["id"]}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/reservations/{response.data[0]["id"]}/').status_code, 404)
+        self.assertEqual(self.stock(), 5)
+
+        # Reservation quá hạn chưa được dọn vẫn được trả lại khi lượt giữ hàng mới thiếu hàng
+        held = self.hold(4).data[0]['id']
+        StockReservation.objects.filter(pk=held).update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(self.hold(5).status_code, 201)
+        self.assertEqual(StockReservation.objects.get(pk=held).status, StockReservation.EXPIRED)
+        self.assertEqual(self.stock(), 0)
+
+    def test_sharded_stock_never_oversells(self):
+        call_command('shard_stock', self.product.id, shards=4, stdout=io.StringIO())
+        self.assertEqual(sum(StockShard.objects.values_list('stock', flat=True)), 5)
+        # 5 sản phẩm chia vào 4 shard: lượt giữ 3 phải gom từ nhiều shard
+        self.assertEqual(self.hold(3).status_code, 201)
+        self.assertEqual(self.hold(3).status_code, 400)
+        self.assertEqual(self.hold(2).status_code, 201)
+        self.assertEqual(self.stock(), 0)
+        self.assertFalse(StockShard.objects.filter(stock__lt=0).exists())
+
+        call_command('shard_stock', self.product.id, shards=0, stdout=io.StringIO())
+        self.assertFalse(StockShard.objects.exists())
+        self.assertEqual(Product.objects.get(pk=self.product.pk).stock, 0)
+
+    def test_checkout_commits_reservations(self):
+        reservation = self.hold(2).data[0]['id']
+        response = self.client.post('/checkout/', {'reservations': [reservation], 'payment_method': 'momo'},
+                                    format='json')
+        self.assertEqual(response.status_code, 201)
+        reservation = StockReservation.objects.get(pk=reservation)
+        self.assertEqual(reservation.status, StockReservation.COMMITTED)
+        self.assertEqual(reservation.order.orderdetail_set.get().quantity, 2)
+        # Hàng đã trừ lúc giữ, thanh toán không trừ thêm và không thanh toán lại được
+        self.assertEqual(self.stock(), 3)
+        response = self.client.post('/checkout/', {'reservations': [reservation.pk], 'payment_method': 'momo'},
+                                    format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class MigrationTests(TestCase):
+    def test_migrations_do_not_import_app_code(self):
+        # Backfill trong migration phải là bản sao cố định: code của app đổi về sau không được làm hỏng migrate từ đầu
+        directory = os.path.join(os.path.dirname(__file__), 'migrations')
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py'):
+                with open(os.path.join(directory, name), encoding='utf-8') as f:
+                    source = f.read()
+                self.assertNotRegex(source, r'(?m)^\s*(from|import)\s+(commerce|\.)', name)
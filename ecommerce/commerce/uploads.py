@@ -0,0 +1,190 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+from uuid import uuid4
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.files import File
+from django.core.files.uploadedfile import UploadedFile
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import MediaUpload
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_upload_storage():
+    return import_string(settings.MEDIA_UPLOAD_STORAGE)()
+
+
+def get_executor():
+    # Thread pool dùng chung cho process, số thread = giới hạn upload đồng thời
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.MEDIA_UPLOAD_CONCURRENCY,
+                                           thread_name_prefix='media-upload')
+        return _executor
+
+
+def stage_upload(instance, field, file, user=None):
+    """Ghi file vào thư mục tạm, tạo MediaUpload (pending) và đưa vào hàng đợi sau khi transaction commit."""
+    staging_dir = Path(settings.MEDIA_UPLOAD_STAGING_DIR)
+    staging_dir.mkdir(parents=True, exist_ok=True)
+    path = staging_dir / f'{uuid4().hex}{Path(file.name or "").suffix.lower()}'
+    with open(path, 'wb') as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+
+    upload = MediaUpload.objects.create(user=user, content_type=ContentType.objects.get_for_model(instance),
+                                        object_id=instance.pk, field=field, original_name=(file.name or '')[:255],
+                                        staged_path=str(path))
+    transaction.on_commit(lambda: enqueue(upload.pk))
+    return upload
+
+
+def enqueue(upload_id):
+    if settings.MEDIA_UPLOAD_CONCURRENCY:
+        get_executor().submit(run_in_worker, upload_id)
+    else:
+        process_upload(upload_id)
+
+
+def run_in_worker(upload_id):
+    try:
+        process_upload(upload_id)
+    except Exception:
+        logger.exception('Media upload %s crashed', upload_id)
+    finally:
+        # Thread của worker không đi qua request_finished nên tự đóng kết nối DB
+        close_old_connections()
+
+
+def process_upload(upload_id):
+    # Nhận việc bằng UPDATE có điều kiện để hai worker không cùng xử lý một upload
+    if not set_status(MediaUpload.objects.filter(pk=upload_id, status=MediaUpload.PENDING), MediaUpload.UPLOADING):
+        return None
+    upload = MediaUpload.objects.select_related('content_type').get(pk=upload_id)
+    uploads = MediaUpload.objects.filter(pk=upload.pk)
+
+    delay = settings.MEDIA_UPLOAD_RETRY_DELAY
+    while True:
+        uploads.update(attempts=F('attempts') + 1)
+        upload.attempts += 1
+        try:
+            name = push_upload(upload)
+            break
+        except Exception as error:
+            logger.warning('Media upload %s failed (attempt %s): %s', upload.pk, upload.attempts, error)
+            if upload.attempts >= settings.MEDIA_UPLOAD_MAX_ATTEMPTS:
+                set_status(uploads, MediaUpload.FAILED, error=str(error))
+                return None
+            time.sleep(delay)
+            delay *= 2
+
+    if not swap_in(upload, name):
+        set_status(uploads, MediaUpload.FAILED, result=name, error='Target object was deleted.')
+        return None
+    set_status(uploads, MediaUpload.DONE, result=name, error='')
+    try:
+        os.remove(upload.staged_path)
+    except FileNotFoundError:
+        pass
+    return name
+
+
+def set_status(uploads, status, **fields):
+    return uploads.update(status=status, updated_at=timezone.now(), **fields)
+
+
+def push_upload(upload):
+    storage = get_upload_storage()
+    with open(upload.staged_path, 'rb') as staged:
+        return storage.save(f'{upload.field}/{Path(upload.staged_path).name}', File(staged))
+
+
+def swap_in(upload, name):
+    # Bỏ qua nếu đã có upload mới hơn cho cùng trường, tránh ảnh cũ ghi đè ảnh mới khi worker chạy lệch thứ tự
+    newer = MediaUpload.objects.filter(content_type=upload.content_type, object_id=upload.object_id,
+                                       field=upload.field, pk__gt=upload.pk).exists()
+    target = upload.content_type.model_class().objects.filter(pk=upload.object_id).first()
+    if target is None:
+        return False
+    if not newer:
+        setattr(target, upload.field, name)
+        # save() để signal sinh lại biến thể ảnh và làm mới cache catalog
+        target.save(update_fields=[upload.field])
+    return True
+
+
+def requeue_uploads(retry_failed=False, stale_after=timedelta(minutes=30)):
+    """Trả về id các upload cần chạy lại: pending, uploading bị treo (worker chết) và failed nếu retry_failed."""
+    stale = MediaUpload.objects.filter(status=MediaUpload.UPLOADING, updated_at__lt=timezone.now() - stale_after)
+    set_status(stale, MediaUpload.PENDING)
+    if retry_failed:
+        MediaUpload.objects.filter(status=MediaUpload.FAILED).update(status=MediaUpload.PENDING, attempts=0,
+                                                                     updated_at=timezone.now())
+    return list(MediaUpload.objects.filter(status=MediaUpload.PENDING).order_by('id').values_list('id', flat=True))
+
+
+class StagedUploadMixin:
+    """
+    Cho ModelSerializer: file trong upload_fields không được upload trong request mà được stage_upload,
+    response có thêm "uploads" với trạng thái pending. Khi tạo mới, trường ảnh để trống cho tới khi upload xong.
+    """
+    upload_fields = ()
+
+    def pop_uploads(self, validated_data, creating):
+        files = {}
+        for field in self.upload_fields:
+            if isinstance(validated_data.get(field), UploadedFile):
+                files[field] = validated_data.pop(field)
+                if creating:
+                    validated_data[field] = None
+        return files
+
+    def get_uploader(self, instance):
+        # Đăng ký tài khoản (chưa đăng nhập) thì người tải lên là chính user vừa tạo
+        request = self.context.get('request')
+        if request is not None and request.user.is_authenticated:
+            return request.user
+        return instance if isinstance(instance, get_user_model()) else None
+
+    def stage_uploads(self, instance, files):
+        user = self.get_uploader(instance)
+        self.staged_uploads = {field: stage_upload(instance, field, file, user) for field, file in files.items()}
+
+    def create(self, validated_data):
+        files = self.pop_uploads(validated_data, creating=True)
+        instance = super().create(validated_data)
+        self.stage_uploads(instance, files)
+        return instance
+
+    def update(self, instance, validated_data):
+        files = self.pop_uploads(validated_data, creating=False)
+        instance = super().update(instance, validated_data)
+        self.stage_uploads(instance, files)
+        return instance
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        staged = getattr(self, 'staged_uploads', None)
+        if staged:
+            # Đọc lại trạng thái vì upload có thể đã xong ngay (MEDIA_UPLOAD_CONCURRENCY = 0)
+            statuses = dict(MediaUpload.objects.filter(pk__in=[upload.pk for upload in staged.values()])
+                            .values_list('pk', 'status'))
+            data['uploads'] = {field: {'id': upload.pk, 'status': statuses.get(upload.pk, upload.status)}
+                               for field, upload in staged.items()}
+        return data
@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.urls import path, include
-from . import views
+from . import async_views, views
 from rest_framework.routers import DefaultRouter
 
 
@@ -12,11 +12,17 @@ router.register('store', views.StoreViewSet)
 router.register(r'store-user/(?P<user_id>\d+)', views.StoreByUserViewSet, basename='store-by-user')
 router.register('products', views.ProductViewSet, basename='product')
 router.register('product-images', views.ProductImageViewSet, basename='product-image')
+router.register('product-imports', views.ProductImportViewSet, basename='product-import')
+router.register('product-export', views.ProductExportViewSet, basename='product-export')
 router.register('order', views.OrderViewSet, basename='order')
 router.register(r'order-by-user', views.UserOrderViewSet, basename='order-by-user')
 router.register('order-detail', views.OrderDetailViewSet, basename='order-detail')
+router.register('order-export', views.OrderExportViewSet, basename='order-export')
 router.register(r'pending-order-details', views.PendingOrderDetailViewSet, basename='pending-order-details')
 router.register('payment', views.PaymentViewSet, basename='payment')
+router.register('checkout', views.CheckoutViewSet, basename='checkout')
+router.register('reservations', views.ReservationViewSet, basename='reservation')
+router.register('media-uploads', views.MediaUploadViewSet, basename='media-upload')
 router.register('similar-products', views.SimilarProductViewSet, basename='similar-products')
 router.register('seller-statistics', views.SellerStatisticsViewSet, basename='seller-statistics')
 router.register('categories', views.CategoryViewSet)
@@ -29,6 +35,23 @@ router.register(r'review-products/(?P<product_id>\d+)', views.ReviewsByProductVi
 router.register(r'review-store/(?P<store_id>\d+)', views.ReviewsByStoreViewSet, basename='reviews-by-store')
 router.register(r'product-images/item/(?P<product_id>\d+)', views.ImageByProductId, basename='image-by-product')
 router.register(r'products-store/(?P<store_id>\d+)', views.ProductByStoreViewSet, basename='products-by-store')
+# Bản async của các endpoint đọc nhiều nhất (xem async_views.py), cùng đường dẫn dưới tiền tố async/
+async_urlpatterns = [
+    path('products/', async_views.ProductListView.as_view(), name='async-product-list'),
+    path('products/<int:pk>/', async_views.ProductDetailView.as_view(), name='async-product-detail'),
+    path('products-store/<int:store_id>/', async_views.ProductByStoreView.as_view(), name='async-products-by-store'),
+    path('products-category/<int:category_id>/', async_views.ProductByCategoryView.as_view(),
+         name='async-products-by-category'),
+    path('store/', async_views.StoreListView.as_view(), name='async-store-list'),
+    path('store/<int:pk>/', async_views.StoreDetailView.as_view(), name='async-store-detail'),
+    path('categories/', async_views.CategoryListView.as_view(), name='async-category-list'),
+    path('review-products/<int:product_id>/', async_views.ReviewsByProductView.as_view(),
+         name='async-reviews-by-product'),
+    path('review-store/<int:store_id>/', async_views.ReviewsByStoreView.as_view(), name='async-reviews-by-store'),
+    path('similar-products/', async_views.SimilarProductView.as_view(), name='async-similar-products'),
+]
+
 urlpatterns = [
     path('', include(router.urls)),
+    path('async/', include(async_urlpatterns)),
 ]
\ No newline at end of file
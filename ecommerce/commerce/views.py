@@ -1,15 +1,27 @@
 
-from django.db.models import Q, Sum, Count
-from datetime import datetime
+from django.db.models import Prefetch, Q, Sum, Count
+from decimal import Decimal
 from django.http import HttpResponse
+from django.utils import timezone
 from rest_framework import viewsets, permissions, generics, status
 from rest_framework.decorators import action, api_view
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
 from rest_framework.response import Response
+from rest_framework.exceptions import NotFound, PermissionDenied
 from rest_framework.parsers import MultiPartParser
 
 from .models import *
-from .serializers import UserSerializer, StoreSerializer, CategorySerializer, ProductSerializer, ProductImageSerializer,  ReviewSerializer, OrderSerializer, OrderDetailSerializer, PaymentSerializer, ProductVariantSerializer
+from .caching import CatalogCacheMixin
+from .catalog_io import CONTENT_TYPES, export_products, stage_import, streaming_response
+from .category_tree import build_tree, category_product_counts
+from .checkout import cart_summary, pending_lines, place_orders
+from .exports import ORDER_COLUMNS, ORDER_DETAIL_COLUMNS, export_response, filter_orders
+from .inventory import hold, release_reservations
+from .orders import order_scope, scope_orders, status_counts
+from .paginators import KeysetPagination
+from .ratings import RATING_FIELDS, REVIEW_FEED_FIELDS
+from .search import ProductSearchFilter
+from .serializers import UserSerializer, StoreSerializer, CategorySerializer, ProductSerializer, ProductImageSerializer,  ReviewSerializer, OrderSerializer, OrderDetailSerializer, PaymentSerializer, ProductVariantSerializer, ProductExpandedSerializer, CheckoutSerializer, MediaUploadSerializer, ProductImportSerializer, ProductImportFileSerializer, OrderExportSerializer, HoldSerializer, StockReservationSerializer, OrderFilterSerializer, OrderHistorySerializer, CartStoreSerializer, ReviewFeedSerializer
 
 
 # Create your views here.
@@ -51,9 +63,10 @@ class UserViewSet(viewsets.ViewSet, generics.CreateAPIView, generics.RetrieveAPI
 
 
 
-class StoreViewSet(viewsets.ModelViewSet):
+class StoreViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Store.objects.filter(active=True)
     serializer_class = StoreSerializer
+    cache_scopes = ('store',)
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -81,12 +94,64 @@ class CategoryViewSet(viewsets.ModelViewSet):
     serializer_class = CategorySerializer
 
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductExpandMixin:
+    # ?expand=true: trả kèm ảnh, biến thể, đánh giá, tên cửa hàng với số truy vấn cố định
+    def is_expanded(self):
+        request = getattr(self, 'request', None)
+        return request is not None and request.query_params.get('expand', '').lower() in ('1', 'true', 'yes')
+
+    def get_serializer_class(self):
+        if self.is_expanded():
+            return ProductExpandedSerializer
+        return super().get_serializer_class()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.is_expanded():
+            queryset = queryset.select_related('store').prefetch_related('images', 'productvariant_set')
+        return queryset
+
+
+# Queryset dùng chung với async_views.py để hai bản view không lệch nhau
+
+def filter_min_rating(queryset, request):
+    # ?min_rating=4.5, giá trị không phải số thì bỏ qua
+    min_rating = request.query_params.get('min_rating')
+    if min_rating:
+        try:
+            return queryset.filter(rating_avg__gte=float(min_rating))
+        except ValueError:
+            pass
+    return queryset
+
+
+def include_descendants(request):
+    # Mặc định lấy cả sản phẩm của danh mục con, ?descendants=false để chỉ lấy đúng danh mục
+    return request.query_params.get('descendants', '').lower() not in ('0', 'false', 'no')
+
+
+def category_products(category_id, path, descendants):
+    """path là Category.path của category_id (chỉ cần khi descendants), None nếu danh mục không tồn tại."""
+    if not descendants:
+        return Product.objects.filter(category_id=category_id)
+    if path:
+        return Product.objects.filter(category__path__startswith=path)
+    return Product.objects.none()
+
+
+def review_feed(**filters):
+    return Review.objects.filter(active=True, **filters).select_related('user').only(*REVIEW_FEED_FIELDS)
+
+
+class ProductViewSet(CatalogCacheMixin, ProductExpandMixin, viewsets.ModelViewSet):
     queryset = Product.objects.filter(active=True)
     serializer_class = ProductSerializer
-    filter_backends = [SearchFilter, OrderingFilter]
-    search_fields = ['product_name', 'price', 'store__store_name', 'category__name']
-    ordering_fields = ['product_name', 'price']
+    filter_backends = [ProductSearchFilter, OrderingFilter]
+    ordering_fields = ['product_name', 'price', 'rating_avg', 'rating_count', 'created_at']
+    pagination_class = KeysetPagination
+
+    def get_queryset(self):
+        return filter_min_rating(super().get_queryset(), self.request)
 
     def get_permissions(self):
         if self.action in ['list', 'retrieve']:
@@ -95,8 +160,11 @@ class ProductViewSet(viewsets.ModelViewSet):
         return [permissions.IsAuthenticated()]
 
 
-class ProductByStoreViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductByStoreViewSet(CatalogCacheMixin, ProductExpandMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductSerializer
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['product_name', 'price', 'rating_avg', 'created_at']
+    pagination_class = KeysetPagination
 
     def get_queryset(self):
         store_id = self.kwargs.get('store_id')
@@ -104,29 +172,33 @@ class ProductByStoreViewSet(viewsets.ReadOnlyModelViewSet):
             return Product.objects.filter(store_id=store_id)
         return Product.objects.none()
 
-class ProductByCategoryViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductByCategoryViewSet(CatalogCacheMixin, ProductExpandMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductSerializer
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['product_name', 'price', 'rating_avg', 'created_at']
+    pagination_class = KeysetPagination
+    cache_scopes = ('product', 'category')
 
     def get_queryset(self):
         category_id = self.kwargs.get('category_id')
-        if category_id:
-            return Product.objects.filter(category_id=category_id)
-        return Product.objects.none()
+        if not category_id:
+            return Product.objects.none()
+        descendants = include_descendants(self.request)
+        path = Category.objects.filter(pk=category_id).values_list('path', flat=True).first() if descendants else None
+        return category_products(category_id, path, descendants)
 
 class SimilarProductViewSet(viewsets.ViewSet):
     def list(self, request):
         product_id = request.query_params.get('product_id')
         if product_id:
-            try:
-                product = Product.objects.get(id=product_id)
-                similar_products = Product.objects.filter(
-                    Q(category=product.category) | Q(product_name__icontains=product.product_name)
-                ).exclude(id=product_id)[:5]
-                # Lấy 5 sản phẩm cùng loại hoặc tên gần giống, loại trừ sản phẩm hiện tại
-                serializer_class = ProductSerializer(similar_products, many=True)
+            # Đọc láng giềng đã tính sẵn (compute_similar_products) qua index (product, rank)
+            similar_products = Product.objects.filter(
+                similar_to__product_id=product_id, active=True
+            ).order_by('similar_to__rank')[:5]
+            serializer_class = ProductSerializer(similar_products, many=True)
+            if serializer_class.data or Product.objects.filter(id=product_id).exists():
                 return Response(serializer_class.data)
-            except Product.DoesNotExist:
-                return Response({"message": "Product not found."}, status=404)
+            return Response({"message": "Product not found."}, status=404)
         else:
             return Response({"message": "Product ID is required."}, status=400)
 
@@ -144,11 +216,61 @@ class ProductImageViewSet(viewsets.ModelViewSet):
 
 
 
+class MediaUploadViewSet(viewsets.ViewSet, generics.RetrieveAPIView):
+    # Trạng thái upload ảnh chạy nền (pending -> uploading -> done/failed), id lấy từ "uploads" trong response ghi
+    serializer_class = MediaUploadSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return MediaUpload.objects.filter(user=self.request.user)
+
+
+def get_seller_store(user):
+    store = Store.objects.filter(user=user, active=True).first()
+    if store is None:
+        raise PermissionDenied('Only sellers with an active store can do this.')
+    return store
+
+
+class ProductImportViewSet(viewsets.ViewSet, generics.ListAPIView, generics.RetrieveAPIView):
+    # Nhập sản phẩm hàng loạt từ CSV/NDJSON (xem catalog_io.py): file nhỏ trả về kết quả ngay (201),
+    # file lớn chạy nền (202), theo dõi tiến độ và lỗi theo dòng qua GET /product-imports/<id>/
+    serializer_class = ProductImportSerializer
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser, ]
+
+    def get_queryset(self):
+        return ProductImport.objects.filter(user=self.request.user).order_by('-id')
+
+    def create(self, request):
+        store = get_seller_store(request.user)
+        serializer = ProductImportFileSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        job = stage_import(store, request.user, serializer.validated_data['file'], serializer.validated_data['type'])
+        finished = job.status in (ProductImport.DONE, ProductImport.FAILED)
+        return Response(ProductImportSerializer(job).data,
+                        status=status.HTTP_201_CREATED if finished else status.HTTP_202_ACCEPTED)
+
+
+class ProductExportViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        # Stream toàn bộ sản phẩm của cửa hàng theo lô, ?type=csv (mặc định) hoặc ndjson, cùng định dạng với file nhập
+        store = get_seller_store(request.user)
+        file_format = request.query_params.get('type', ProductImport.CSV)
+        if file_format not in CONTENT_TYPES:
+            return Response({'type': [f'Unknown type "{file_format}", use csv or ndjson.']},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return streaming_response(request, export_products(Product.objects.filter(store=store), file_format),
+                                  CONTENT_TYPES[file_format], f'products-{store.pk}.{file_format}')
+
+
 class ProductVariantViewSet(viewsets.ModelViewSet):
     queryset = ProductVariant.objects.all()
     serializer_class = ProductVariantSerializer
 
-class ProductvariantsByProductViewSet(viewsets.ReadOnlyModelViewSet):
+class ProductvariantsByProductViewSet(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductVariantSerializer
 
     def get_queryset(self):
@@ -158,7 +280,7 @@ class ProductvariantsByProductViewSet(viewsets.ReadOnlyModelViewSet):
         return ProductVariant.objects.none()
 
 
-class ImageByProductId(viewsets.ReadOnlyModelViewSet):
+class ImageByProductId(CatalogCacheMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = ProductImageSerializer
 
     def get_queryset(self):
@@ -168,16 +290,37 @@ class ImageByProductId(viewsets.ReadOnlyModelViewSet):
         return ProductImage.objects.none()
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CatalogCacheMixin, viewsets.ModelViewSet):
     queryset = Category.objects.filter(active=True)
     serializer_class = CategorySerializer
+    cache_scopes = ('category',)
 
     def get_permissions(self):
-        if self.action in ['list', 'retrieve']:
+        if self.action in ['list', 'retrieve', 'tree']:
             return [permissions.AllowAny()]
 
         return [permissions.IsAuthenticated()]
 
+    def with_counts(self):
+        return self.request.query_params.get('counts', '').lower() in ('1', 'true', 'yes')
+
+    def get_cache_scopes(self):
+        if self.action == 'tree' and self.with_counts():
+            return self.cache_scopes + ('product',)
+        return self.cache_scopes
+
+    @action(detail=False, methods=['get'])
+    def tree(self, request):
+        # Toàn bộ cây danh mục trong một truy vấn, ?counts=true để kèm số sản phẩm mỗi nút (tính cả cây con)
+        return self.cached_response(self.build_tree, request)
+
+    def build_tree(self, request):
+        categories = self.get_queryset().order_by('depth', 'name').values('id', 'name', 'parent_id', 'image', 'depth')
+        product_counts = None
+        if self.with_counts():
+            product_counts = category_product_counts(Product.objects.filter(active=True))
+        return Response(build_tree(categories, product_counts))
+
 class ReviewViewSet(viewsets.ModelViewSet):
     queryset = Review.objects.filter(active=True)
     serializer_class = ReviewSerializer
@@ -189,51 +332,188 @@ class ReviewViewSet(viewsets.ModelViewSet):
         return [permissions.IsAuthenticated()]
 
 
-class UserOrderViewSet(viewsets.ViewSet):
+def first_images(lookup):
+    # Cắt [:1] trong Prefetch: mỗi sản phẩm chỉ lấy một ảnh (ROW_NUMBER theo product), đặt vào product.first_images
+    images = ProductImage.objects.only('id', 'product_id', 'image', 'image_variants').order_by('id')[:1]
+    return Prefetch(lookup, queryset=images, to_attr='first_images')
+
+
+class UserOrderViewSet(viewsets.ViewSet, generics.ListAPIView):
+    # Lịch sử đơn của khách theo trang, mỗi đơn kèm dòng sản phẩm (tên, ảnh nhỏ) và thanh toán;
+    # số truy vấn cố định mỗi trang: đơn + cửa hàng + thanh toán, dòng + sản phẩm, ảnh đầu tiên của sản phẩm
+    serializer_class = OrderHistorySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-order_date', '-id')
 
-    def list(self, request):
-        user = request.user
-        orders = Order.objects.filter(user=user)
-        serializer = OrderSerializer(orders, many=True)
-        return Response(serializer.data)
+    def get_queryset(self):
+        params = OrderFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        lines = OrderDetail.objects.select_related('product').only(
+            'id', 'order_id', 'product_id', 'quantity', 'price', 'note', 'product__product_name').order_by('id')
+        orders = Order.objects.filter(user=self.request.user).select_related('store', 'payment').only(
+            'id', 'store_id', 'order_date', 'order_status', 'payment_method', 'total_amount', 'item_count',
+            'store__store_name', 'payment__payment_method', 'payment__amount', 'payment__payment_date',
+            'payment__transaction_id', 'payment__order_id',
+        ).prefetch_related(
+            Prefetch('orderdetail_set', queryset=lines),
+            first_images('orderdetail_set__product__images'),
+        )
+        return filter_orders(orders, **params.validated_data)
+
+class ReviewFeedMixin:
+    # Đánh giá đang hiển thị, mới nhất trước, theo index (product|store, active, created_at); histogram/ đọc
+    # sẵn các cột rating_* của sản phẩm/cửa hàng (cập nhật khi ghi review, xem ratings.py) nên không đếm lại review
+    serializer_class = ReviewFeedSerializer
+    permission_classes = [permissions.AllowAny]
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-created_at', '-id')
+    target_model = None
+    target_field = None
 
-class ReviewsByProductViewSet(viewsets.ViewSet):
-    permission_classes = [permissions.AllowAny]  # Có thể điều chỉnh quyền truy cập ở đây
+    def get_queryset(self):
+        field = f'{self.target_field}_id'
+        return review_feed(**{field: self.kwargs[field]})
 
-    def list(self, request, product_id):
-        reviews = Review.objects.filter(product_id=product_id)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+    @action(detail=False)
+    def histogram(self, request, **kwargs):
+        target = self.target_model.objects.filter(pk=kwargs[f'{self.target_field}_id']).only(*RATING_FIELDS).first()
+        if target is None:
+            raise NotFound()
+        return Response({'average': target.average_rating(), 'count': target.rating_count,
+                         'histogram': target.rating_histogram()})
 
-class ReviewsByStoreViewSet(viewsets.ViewSet):
-    permission_classes = [permissions.AllowAny]  # Có thể điều chỉnh quyền truy cập ở đây
 
-    def list(self, request, store_id):
-        reviews = Review.objects.filter(store_id=store_id)
-        serializer = ReviewSerializer(reviews, many=True)
-        return Response(serializer.data)
+class ReviewsByProductViewSet(ReviewFeedMixin, viewsets.ViewSet, generics.ListAPIView):
+    target_model = Product
+    target_field = 'product'
+
 
-class OrderViewSet(viewsets.ModelViewSet):
+class ReviewsByStoreViewSet(ReviewFeedMixin, viewsets.ViewSet, generics.ListAPIView):
+    target_model = Store
+    target_field = 'store'
+
+class OrderScopeMixin:
+    # Người bán chỉ thấy đơn của cửa hàng mình, khách chỉ thấy đơn mình đặt (xem orders.order_scope);
+    # lọc ?order_status=&payment_method=&start=&end= theo index (store|user, order_status, order_date)
+    order_prefix = ''
+
+    def get_queryset(self):
+        params = OrderFilterSerializer(data=self.request.query_params)
+        params.is_valid(raise_exception=True)
+        queryset = scope_orders(super().get_queryset(), order_scope(self.request.user), prefix=self.order_prefix)
+        return filter_orders(queryset, prefix=self.order_prefix, **params.validated_data)
+
+
+class OrderViewSet(OrderScopeMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = [OrderingFilter]
+    ordering_fields = ['order_date', 'total_amount']
+    pagination_class = KeysetPagination
+    keyset_ordering = ('-order_date', '-id')
 
+    @action(detail=False, url_path='status-counts')
+    def status_counts(self, request):
+        # Badge của app: {pending: n, processing: n, ..., total: n}, không lọc theo query string
+        return Response(status_counts(order_scope(request.user)))
 
-class OrderDetailViewSet(viewsets.ModelViewSet):
-    queryset = OrderDetail.objects.all()
+
+class OrderExportViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def list(self, request):
+        # Stream đơn hàng của cửa hàng cho kế toán: ?type=csv|ndjson&level=orders|details&start=&end=&compress=gzip
+        store = get_seller_store(request.user)
+        params = OrderExportSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        options = params.validated_data
+        if options['level'] == 'orders':
+            queryset, columns, prefix = Order.objects.all(), ORDER_COLUMNS, ''
+        else:
+            queryset, columns, prefix = OrderDetail.objects.all(), ORDER_DETAIL_COLUMNS, 'order__'
+        queryset = filter_orders(queryset, store, options.get('start'), options.get('end'), prefix=prefix,
+                                 order_status=options.get('order_status'),
+                                 payment_method=options.get('payment_method'))
+        return export_response(request, queryset, columns, options['type'], f'{options["level"]}-{store.pk}',
+                               compress=options.get('compress') == 'gzip')
+
+
+class OrderDetailViewSet(OrderScopeMixin, viewsets.ModelViewSet):
+    queryset = OrderDetail.objects.select_related('product')
     serializer_class = OrderDetailSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = KeysetPagination
+    # Theo index (store, order): các dòng của một đơn nằm liền nhau
+    keyset_ordering = ('-order_id', '-id')
+    order_prefix = 'order__'
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        order_id = self.request.query_params.get('order')
+        if order_id and order_id.isdigit():
+            queryset = queryset.filter(order_id=order_id)
+        return queryset
 
 class PendingOrderDetailViewSet(viewsets.ViewSet):
     permission_classes = [permissions.IsAuthenticated]
 
     def list(self, request):
         user = request.user
-        pending_order_details = OrderDetail.objects.filter(order__user=user, order__order_status='pending')
+        pending_order_details = pending_lines(user).select_related('product')
         serializer = OrderDetailSerializer(pending_order_details, many=True)
         return Response(serializer.data)
 
+    @action(detail=False)
+    def summary(self, request):
+        # Màn hình giỏ hàng: dòng gom theo cửa hàng kèm thành tiền, số lượng, tình trạng còn hàng và tổng cả giỏ;
+        # 3 truy vấn: tổng theo cửa hàng, dòng + sản phẩm + cửa hàng (chỉ cột của thẻ), ảnh đầu tiên của sản phẩm
+        lines = pending_lines(request.user).select_related('product', 'store').only(
+            'id', 'order_id', 'store_id', 'product_id', 'quantity', 'price', 'note', 'product__product_name',
+            'product__price', 'store__store_name',
+        ).prefetch_related(first_images('product__images'))
+        stores = cart_summary(request.user, lines)
+        return Response({
+            'stores': CartStoreSerializer(stores, many=True).data,
+            'subtotal': sum((store['subtotal'] for store in stores), Decimal(0)),
+            'item_count': sum(store['item_count'] for store in stores),
+            'unavailable_count': sum(store['unavailable_count'] for store in stores),
+        })
+
+
+class CheckoutViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def create(self, request):
+        # Đặt hàng cả giỏ trong một request: mỗi cửa hàng một Order, tồn kho trừ trong cùng transaction
+        serializer = CheckoutSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        orders = place_orders(request.user, **serializer.validated_data)
+        return Response(OrderSerializer(orders, many=True).data, status=status.HTTP_201_CREATED)
+
+
+class ReservationViewSet(viewsets.ViewSet, generics.ListAPIView):
+    # Giữ hàng trong lúc thanh toán (xem inventory.py): POST trừ tồn kho và trả về các reservation hết hạn sau
+    # RESERVATION_TTL giây, DELETE trả hàng ngay, POST /checkout/ với "reservations" chuyển chúng thành đơn hàng
+    serializer_class = StockReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        return StockReservation.objects.filter(user=self.request.user, status=StockReservation.HELD,
+                                               expires_at__gt=timezone.now()).order_by('id')
+
+    def create(self, request):
+        serializer = HoldSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        reservations = hold(request.user, serializer.validated_data['items'])
+        return Response(StockReservationSerializer(reservations, many=True).data, status=status.HTTP_201_CREATED)
+
+    def destroy(self, request, pk=None):
+        if not release_reservations(StockReservation.objects.filter(pk=pk, user=request.user)):
+            raise NotFound()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
 
 class PaymentViewSet(viewsets.ModelViewSet):
     queryset = Payment.objects.all()
@@ -246,101 +526,64 @@ class SellerStatisticsViewSet(viewsets.ViewSet):
     def list(self, request):
         user = request.user
         store = Store.objects.filter(user=user).first()
-
-        monthly_revenue = self.get_revenue_by_period(store, 'month')
-        monthly_product_stats = self.get_product_stats(store, 'month')
-        highest_revenue_product_month = self.get_highest_revenue_product(store, 'month')
-        lowest_revenue_product_month = self.get_lowest_revenue_product(store, 'month')
-
-        quarterly_revenue = self.get_revenue_by_period(store, 'quarter')
-        quarterly_product_stats = self.get_product_stats(store, 'quarter')
-        highest_revenue_product_quarter = self.get_highest_revenue_product(store, 'quarter')
-        lowest_revenue_product_quarter = self.get_lowest_revenue_product(store, 'quarter')
-
-        yearly_revenue = self.get_revenue_by_period(store, 'year')
-        yearly_product_stats = self.get_product_stats(store, 'year')
-        highest_revenue_product_year = self.get_highest_revenue_product(store, 'year')
-        lowest_revenue_product_year = self.get_lowest_revenue_product(store, 'year')
-
-        response_data = {
-            'monthly_revenue': monthly_revenue,
-            'monthly_product_stats': monthly_product_stats,
-            'highest_revenue_product_month': highest_revenue_product_month,
-            'lowest_revenue_product_month': lowest_revenue_product_month,
-            'quarterly_revenue': quarterly_revenue,
-            'quarterly_product_stats': quarterly_product_stats,
-            'highest_revenue_product_quarter': highest_revenue_product_quarter,
-            'lowest_revenue_product_quarter': lowest_revenue_product_quarter,
-            'yearly_revenue': yearly_revenue,
-            'yearly_product_stats': yearly_product_stats,
-            'highest_revenue_product_year': highest_revenue_product_year,
-            'lowest_revenue_product_year': lowest_revenue_product_year,
-        }
+        ranges = self.get_period_ranges(timezone.localdate())
+
+        # Một truy vấn trên DailySales cho cả 3 kỳ, mỗi kỳ là một cặp SUM có filter
+        aggregates = {}
+        for period, (start, end) in ranges.items():
+            in_period = Q(day__gte=start, day__lt=end)
+            aggregates[f'{period}_sales'] = Sum('quantity', filter=in_period)
+            aggregates[f'{period}_revenue'] = Sum('revenue', filter=in_period)
+        year_start, year_end = ranges['year']
+        rows = list(DailySales.objects.filter(store=store, day__gte=year_start, day__lt=year_end, order_count__gt=0)
+                    .values('product__product_name').annotate(**aggregates).order_by('product__product_name'))
+
+        response_data = {}
+        for period, prefix in [('month', 'monthly'), ('quarter', 'quarterly'), ('year', 'yearly')]:
+            product_stats = [
+                {'product__product_name': row['product__product_name'],
+                 'total_sales': row[f'{period}_sales'],
+                 'total_revenue': row[f'{period}_revenue']}
+                for row in rows if row[f'{period}_sales'] is not None
+            ]
+            response_data[f'{prefix}_revenue'] = self.get_revenue_by_period(product_stats)
+            response_data[f'{prefix}_product_stats'] = product_stats
+            response_data[f'highest_revenue_product_{period}'] = self.get_highest_revenue_product(product_stats)
+            response_data[f'lowest_revenue_product_{period}'] = self.get_lowest_revenue_product(product_stats)
 
         return Response(response_data)
 
-    def get_revenue_by_period(self, store, period):
-        today = datetime.now()
-        filter_params = {'order__order_status': 'completed'}
-        if period == 'month':
-            filter_params['order__order_date__month'] = today.month
-            filter_params['order__order_date__year'] = today.year
-        elif period == 'quarter':
-            quarter = (today.month - 1) // 3 + 1
-            filter_params['order__order_date__quarter'] = quarter
-            filter_params['order__order_date__year'] = today.year
-        elif period == 'year':
-            filter_params['order__order_date__year'] = today.year
-
-        return OrderDetail.objects.filter(store=store, **filter_params).aggregate(total=Sum('price'))['total']
-
-    def get_product_stats(self, store, period):
-        today = datetime.now()
-        filter_params = {'order__order_status': 'completed'}
-        if period == 'month':
-            filter_params['order__order_date__month'] = today.month
-            filter_params['order__order_date__year'] = today.year
-        elif period == 'quarter':
-            quarter = (today.month - 1) // 3 + 1
-            filter_params['order__order_date__quarter'] = quarter
-            filter_params['order__order_date__year'] = today.year
-        elif period == 'year':
-            filter_params['order__order_date__year'] = today.year
-
-        return OrderDetail.objects.filter(store=store, **filter_params).values('product__product_name').annotate(
-            total_sales=Sum('quantity'), total_revenue=Sum('price'))
-
-    def get_highest_revenue_product(self, store, period):
-        today = datetime.now()
-        filter_params = {'order__order_status': 'completed'}
-        if period == 'month':
-            filter_params['order__order_date__month'] = today.month
-            filter_params['order__order_date__year'] = today.year
-        elif period == 'quarter':
-            quarter = (today.month - 1) // 3 + 1
-            filter_params['order__order_date__quarter'] = quarter
-            filter_params['order__order_date__year'] = today.year
-        elif period == 'year':
-            filter_params['order__order_date__year'] = today.year
-
-        return OrderDetail.objects.filter(store=store, **filter_params).values('product__product_name').annotate(
-            total_revenue=Sum('price')).order_by('-total_revenue').first()
-
-    def get_lowest_revenue_product(self, store, period):
-        today = datetime.now()
-        filter_params = {'order__order_status': 'completed'}
-        if period == 'month':
-            filter_params['order__order_date__month'] = today.month
-            filter_params['order__order_date__year'] = today.year
-        elif period == 'quarter':
-            quarter = (today.month - 1) // 3 + 1
-            filter_params['order__order_date__quarter'] = quarter
-            filter_params['order__order_date__year'] = today.year
-        elif period == 'year':
-            filter_params['order__order_date__year'] = today.year
-
-        return OrderDetail.objects.filter(store=store, **filter_params).values('product__product_name').annotate(
-            total_revenue=Sum('price')).order_by('total_revenue').first()
+    def get_period_ranges(self, today):
+        quarter_start_month = (today.month - 1) // 3 * 3 + 1
+        month_start = today.replace(day=1)
+        quarter_start = today.replace(month=quarter_start_month, day=1)
+        year_start = today.replace(month=1, day=1)
+        return {
+            'month': (month_start, self.add_months(month_start, 1)),
+            'quarter': (quarter_start, self.add_months(quarter_start, 3)),
+            'year': (year_start, year_start.replace(year=year_start.year + 1)),
+        }
+
+    def add_months(self, day, months):
+        month = day.month - 1 + months
+        return day.replace(year=day.year + month // 12, month=month % 12 + 1)
+
+    def get_revenue_by_period(self, product_stats):
+        if not product_stats:
+            return None
+        return sum(row['total_revenue'] for row in product_stats)
+
+    def get_highest_revenue_product(self, product_stats):
+        if not product_stats:
+            return None
+        row = max(product_stats, key=lambda row: row['total_revenue'])
+        return {'product__product_name': row['product__product_name'], 'total_revenue': row['total_revenue']}
+
+    def get_lowest_revenue_product(self, product_stats):
+        if not product_stats:
+            return None
+        row = min(product_stats, key=lambda row: row['total_revenue'])
+        return {'product__product_name': row['product__product_name'], 'total_revenue': row['total_revenue']}
 
 
 def index(request):
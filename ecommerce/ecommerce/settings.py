@@ -54,9 +54,42 @@ INSTALLED_APPS = [
 ]
 REST_FRAMEWORK = {'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
                   'PAGE_SIZE': 20,
-                  'DEFAULT_AUTHENTICATION_CLASSES': ('oauth2_provider.contrib.rest_framework.OAuth2Authentication',)
+                  'DEFAULT_AUTHENTICATION_CLASSES': ('commerce.authentication.CachedOAuth2Authentication',)
                   }
 
+# Access token OAuth2 đã kiểm tra được cache tới khi hết hạn, tối đa OAUTH2_TOKEN_CACHE_TIMEOUT giây
+# (xem commerce/authentication.py). Cache cục bộ (LocMemCache) nhanh hơn nhưng signal thu hồi token chỉ xoá được
+# entry trong process hiện tại, process khác vẫn chấp nhận token tới hết OAUTH2_TOKEN_CACHE_TIMEOUT.
+OAUTH2_TOKEN_CACHE = 'default'
+OAUTH2_TOKEN_CACHE_TIMEOUT = 300
+# Số user giữ trong bộ nhớ của mỗi process cho token đã cache
+OAUTH2_USER_CACHE_SIZE = 1000
+
+# Cache dùng chung giữa các worker. Môi trường production nên chuyển sang Redis/Memcached
+# (django.core.cache.backends.redis.RedisCache): incr nguyên tử và không phải liệt kê thư mục.
+# FileBasedCache liệt kê cả thư mục ở mỗi lần set và khi vượt MAX_ENTRIES (mặc định chỉ 300) thì xoá ngẫu nhiên
+# 1/CULL_FREQUENCY entry, nên khai báo rõ và tách body response (nhiều, dễ tạo lại) khỏi 'default', nơi giữ
+# phiên bản catalog, token OAuth2 và số đơn theo trạng thái.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'default',
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+    'catalog': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'catalog',
+        'OPTIONS': {'MAX_ENTRIES': 5000, 'CULL_FREQUENCY': 4},
+    },
+}
+# Alias cache chứa body response của catalog (xem commerce/caching.py)
+CATALOG_RESPONSE_CACHE = 'catalog'
+
+# 'commerce.search.TermIndexBackend' (chỉ mục đảo, mặc định) hoặc 'commerce.search.MySQLFullTextBackend'
+SEARCH_BACKEND = 'commerce.search.TermIndexBackend'
+# Bằng innodb_ft_min_token_size của MySQL: term ngắn hơn không có trong FULLTEXT index (MySQLFullTextBackend)
+SEARCH_FULLTEXT_MIN_TOKEN_SIZE = 3
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -153,6 +186,35 @@ CLOUDINARY_STORAGE = {
 
 DEFAULT_FILE_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
 
+# Upload ảnh chạy nền (xem commerce/uploads.py): file được lưu tạm ở MEDIA_UPLOAD_STAGING_DIR, request trả về ngay
+# với trạng thái pending, worker đẩy lên MEDIA_UPLOAD_STORAGE rồi gán public_id vào model.
+# Dùng 'django.core.files.storage.FileSystemStorage' để chạy offline; MEDIA_UPLOAD_CONCURRENCY = 0 xử lý ngay trong request.
+MEDIA_UPLOAD_STORAGE = 'cloudinary_storage.storage.MediaCloudinaryStorage'
+MEDIA_UPLOAD_STAGING_DIR = BASE_DIR / 'media-staging'
+MEDIA_UPLOAD_CONCURRENCY = 4
+MEDIA_UPLOAD_MAX_ATTEMPTS = 3
+MEDIA_UPLOAD_RETRY_DELAY = 2
+
+# Nhập/xuất sản phẩm hàng loạt (xem commerce/catalog_io.py): file nhỏ hơn PRODUCT_IMPORT_INLINE_BYTES xử lý ngay
+# trong request, file lớn chạy nền; mỗi lô PRODUCT_IMPORT_BATCH_SIZE dòng được kiểm tra và bulk_create trong một transaction.
+PRODUCT_IMPORT_STAGING_DIR = BASE_DIR / 'import-staging'
+PRODUCT_IMPORT_INLINE_BYTES = 256 * 1024
+PRODUCT_IMPORT_BATCH_SIZE = 1000
+PRODUCT_IMPORT_CONCURRENCY = 1
+PRODUCT_IMPORT_MAX_ERRORS = 1000
+# Số dòng mỗi truy vấn khi stream file xuất đơn hàng (xem commerce/exports.py)
+ORDER_EXPORT_BATCH_SIZE = 5000
+# Số đơn theo trạng thái (GET /order/status-counts/) được cache tới khi có đơn thay đổi, tối đa N giây
+# để bù cho các cập nhật bằng update()/bulk_create không qua signal (xem commerce/orders.py)
+ORDER_STATUS_COUNTS_TIMEOUT = 300
+# Giữ hàng khi thanh toán (xem commerce/inventory.py): hàng bị trừ ngay, trả lại nếu không thanh toán trong
+# RESERVATION_TTL giây (lệnh expire_reservations dọn định kỳ). Giữ/trả hàng không làm mới cache catalog;
+# tồn kho hiển thị của sản phẩm chia shard được đồng bộ mỗi lượt expire_reservations.
+RESERVATION_TTL = 10 * 60
+# Changelist của admin trên bảng lớn (xem commerce/admin.py): đếm chính xác tối đa N dòng, bảng lớn hơn
+# mà không lọc thì dùng số dòng ước lượng từ thống kê của DB
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 